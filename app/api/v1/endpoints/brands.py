@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from typing import List
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Query
 
-from app.core.auth import verify_admin_token
+from app.core.auth import verify_admin_token, get_optional_current_user
+from app.core.etag import conditional_get
+from app.core.responses import cached_json, response_shape
 
 from app.db.database import get_db
 
-from app.schemas.brands import Brand, BrandCreate, BrandUpdate
+from app.schemas.brands import Brand, BrandBatch, BrandCreate, BrandUpdate
 from app.schemas.energies import EnergiesByBrand
 
 from app.services.brands import (
@@ -22,7 +24,11 @@ from app.services.brands import (
     get_total_energies_by_brand,
     get_total_brands_admin,
     get_brands_admin_select,
+    get_brands_by_ids,
 )
+from app.services.data_versions import BRANDS, ENERGIES, REVIEWS
+from app.services.rated_cache import annotate_rated_by_me
+from app.services.batch import parse_ids
 
 # Создаём маршрутизатор для эндпоинтов брендов
 router = APIRouter()
@@ -31,16 +37,36 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify")
 
 # =============== READ ALL ===============
-@router.get("/", response_model=List[Brand])
-def read_brands(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+@router.get("/", response_model=List[Brand], dependencies=[Depends(conditional_get(BRANDS))])
+def read_brands(request: Request, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
     """
     Эндпоинт для получения списка всех брендов с пагинацией.
     Доступен всем пользователям.
     """
-    return get_brands(db, skip=skip, limit=limit)
+    return cached_json(request, List[Brand], lambda: get_brands(db, skip=skip, limit=limit))
+
+# =============== READ BATCH ===============
+# Объявлен до /{brand_id}, иначе "batch" будет разобран как id
+@router.get("/batch", response_model=BrandBatch, dependencies=[Depends(conditional_get(BRANDS, ENERGIES, REVIEWS))])
+def read_brands_batch(
+    # Параметр запроса: id брендов через запятую
+    ids: str = Query(..., max_length=2000),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт для получения нескольких брендов по списку id (ids=3,1,2) одним запросом.
+    Бренды возвращаются в порядке ids, ненайденные id перечислены в missing.
+    Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
+    """
+    try:
+        brand_ids = parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_brands_by_ids(db, brand_ids)
 
 # =============== READ ONE ===============
-@router.get("/{brand_id}", response_model=Brand)
+@router.get("/{brand_id}", response_model=Brand, dependencies=[Depends(conditional_get(BRANDS, ENERGIES, REVIEWS))])
 def read_brand(
     # Параметр пути: ID бренда
     brand_id: int,
@@ -62,27 +88,46 @@ def read_brand(
     return db_brand
 
 # =============== READ ALL ENERGIES ONE BRAND===============
-@router.get("/{brand_id}/energies", response_model=List[EnergiesByBrand])
+@router.get("/{brand_id}/energies", response_model=List[EnergiesByBrand], dependencies=[Depends(conditional_get(BRANDS, ENERGIES, REVIEWS, per_user=True))])
 def read_energies_by_brand(
+    request: Request,
     # Параметр пути: ID бренда
     brand_id: int,
     # Параметр запроса: смещение для пагинации
     offset: int = Query(0, ge=0),
     # Параметр запроса: лимит записей
     limit: int = Query(10, ge=1, le=10),
+    # Параметр запроса: формат ответа, rows (по умолчанию) или columnar
+    format: str = Query(None),
+    # Параметр запроса: выборочные поля, например "name,average_rating"
+    fields: str = Query(None, max_length=500),
     # Зависимость: сессия базы данных
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    # Зависимость: пользователь, если передан токен (для отметки rated_by_me)
+    current_user: dict = Depends(get_optional_current_user)
 ):
     """
     Эндпоинт для получения списка энергетиков, принадлежащих определенному бренду,
     с пагинацией и сортировкой по рейтингу.
+    Авторизованному пользователю дополнительно отмечает энергетики, на которые у него есть отзыв.
+    С format=columnar строки отдаются параллельными массивами, fields ограничивает набор полей.
     Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
     """
-    # Вызываем функцию для получения списка энергетиков бренда
-    return get_energies_by_brand(db, brand_id=brand_id, skip=offset, limit=limit)
+    try:
+        shape = response_shape(EnergiesByBrand, format, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def build():
+        # Вызываем функцию для получения списка энергетиков бренда
+        energies = get_energies_by_brand(db, brand_id=brand_id, skip=offset, limit=limit)
+        # Отмечаем энергетики, на которые у пользователя есть отзыв
+        return annotate_rated_by_me(db, current_user and current_user["user_id"], energies)
+
+    return cached_json(request, List[EnergiesByBrand], build, shape)
 
 # =============== READ TOTAL ENERGIES COUNT FOR BRAND ===============
-@router.get("/{brand_id}/energies/count/")
+@router.get("/{brand_id}/energies/count/", dependencies=[Depends(conditional_get(BRANDS, ENERGIES))])
 def get_total_energies_by_brand_endpoint(
     brand_id: int,
     db: Session = Depends(get_db)
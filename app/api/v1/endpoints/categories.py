@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from typing import List
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.auth import verify_admin_token
+from app.core.etag import conditional_get
+from app.core.responses import cached_json
 
 from app.db.database import get_db
 
 from app.schemas.categories import Category, CategoryCreate, CategoryUpdate
 
 from app.services.categories import get_categories, get_categories_admin, create_category, update_category, get_category_by_name
+from app.services.data_versions import CATEGORIES
 
 # Создаём маршрутизатор для эндпоинтов категорий
 router = APIRouter()
@@ -18,8 +21,9 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify")
 
 # =============== READ ALL ===============
-@router.get("/", response_model=List[Category])
+@router.get("/", response_model=List[Category], dependencies=[Depends(conditional_get(CATEGORIES))])
 def read_categories(
+    request: Request,
     # Параметр запроса: смещение для пагинации
     skip: int = 0,
     # Параметр запроса: лимит записей
@@ -32,18 +36,19 @@ def read_categories(
     Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
     """
     # Вызываем функцию для получения списка категорий
-    return get_categories(db, skip=skip, limit=limit)
+    return cached_json(request, List[Category], lambda: get_categories(db, skip=skip, limit=limit))
 
 # =============== READ ALL FOR SELECT ===============
-@router.get("/select", response_model=List[Category])
+@router.get("/select", response_model=List[Category], dependencies=[Depends(conditional_get(CATEGORIES))])
 def read_categories_select(
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """
     Эндпоинт для получения списка всех категорий для выпадающих списков.
     Доступен всем пользователям.
     """
-    return get_categories_admin(db)
+    return cached_json(request, List[Category], lambda: get_categories_admin(db))
     
 # =============== ONLY ADMINS ===============
 
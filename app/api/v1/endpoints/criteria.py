@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from typing import List
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.auth import verify_admin_token
+from app.core.etag import conditional_get
+from app.core.responses import cached_json
 
 from app.db.database import get_db
 
 from app.schemas.criteria import Criteria, CriteriaUpdate
 
 from app.services.criteria import get_all_criteria, update_criteria
+from app.services.data_versions import CRITERIA
 
 # Создаём маршрутизатор для эндпоинтов критериев
 router = APIRouter()
@@ -18,8 +21,9 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify")
 
 # =============== READ ALL ===============
-@router.get("/", response_model=List[Criteria])
+@router.get("/", response_model=List[Criteria], dependencies=[Depends(conditional_get(CRITERIA))])
 def read_all_criteria(
+    request: Request,
     # Параметр запроса: смещение для пагинации
     skip: int = 0,
     # Параметр запроса: лимит записей
@@ -32,7 +36,7 @@ def read_all_criteria(
     Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
     """
     # Вызываем функцию для получения списка критериев
-    return get_all_criteria(db, skip=skip, limit=limit)
+    return cached_json(request, List[Criteria], lambda: get_all_criteria(db, skip=skip, limit=limit))
 
 # =============== ONLY ADMINS ===============
 
@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
+from functools import partial
 from typing import List
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Query
-import os
 
-from app.core.auth import verify_admin_token
+from app.core.auth import verify_admin_token, get_optional_current_user
 from app.core.config import UPLOAD_DIR_ENERGY
 from app.core.file_utils import validate_file, upload_file
+from app.core.storage import storage
+from app.core.etag import conditional_get
 
 from app.db.database import get_db
 
-from app.schemas.energies import Energy, EnergyCreate, EnergyUpdate
+from app.schemas.energies import Energy, EnergyBatch, EnergyPage, EnergyCreate, EnergyUpdate, EnergyStats, SimilarEnergy, RankHistoryPoint
 from app.schemas.reviews import ReviewWithRatings
 
 from app.services.energies import (
@@ -24,7 +26,16 @@ from app.services.energies import (
     get_reviews_by_energy, 
     get_total_reviews_by_energy,
     get_total_energies_admin,
+    energy_exists,
+    get_energies_by_ids,
+    get_energy_page,
 )
+from app.services.energy_stats import get_energy_stats
+from app.services.similar import get_similar_energies
+from app.services.data_versions import BRANDS, CATEGORIES, CRITERIA, ENERGIES, RANK_HISTORY, REVIEWS
+from app.services.rank_history import get_rank_history
+from app.services.batch import parse_ids
+from app.services.stored_images import register_upload
 
 # Создаём маршрутизатор для эндпоинтов энергетиков
 router = APIRouter()
@@ -49,8 +60,28 @@ def read_energies(
     # Вызываем функцию для получения списка энергетиков
     return get_energies(db, skip=skip, limit=limit)
 
+# =============== READ BATCH ===============
+# Объявлен до /{energy_id}, иначе "batch" будет разобран как id
+@router.get("/batch", response_model=EnergyBatch, dependencies=[Depends(conditional_get(ENERGIES, BRANDS, CATEGORIES, CRITERIA, REVIEWS))])
+def read_energies_batch(
+    # Параметр запроса: id энергетиков через запятую
+    ids: str = Query(..., max_length=2000),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт для получения нескольких энергетиков по списку id (ids=3,1,2) одним запросом.
+    Энергетики возвращаются в порядке ids, ненайденные id перечислены в missing.
+    Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
+    """
+    try:
+        energy_ids = parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_energies_by_ids(db, energy_ids)
+
 # =============== READ ONE ===============
-@router.get("/{energy_id}", response_model=Energy)
+@router.get("/{energy_id}", response_model=Energy, dependencies=[Depends(conditional_get(ENERGIES, BRANDS, CATEGORIES, CRITERIA, REVIEWS))])
 def read_energy(
     # Параметр пути: ID энергетика
     energy_id: int,
@@ -71,6 +102,93 @@ def read_energy(
     # Возвращаем объект энергетика
     return db_energy
 
+# =============== READ ENERGY PAGE ===============
+@router.get("/{energy_id}/page", response_model=EnergyPage)
+def read_energy_page(
+    # Параметр пути: ID энергетика
+    energy_id: int,
+    # Параметр запроса: количество первых отзывов
+    limit: int = Query(10, ge=1, le=10),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db),
+    # Зависимость: текущий пользователь, если передан токен
+    current_user: dict = Depends(get_optional_current_user)
+):
+    """
+    Эндпоинт для получения всех данных страницы энергетика одним запросом:
+    карточка, первые отзывы, общее количество отзывов и отзыв текущего пользователя.
+    Заменяет запросы к /{energy_id}, /{energy_id}/reviews, /{energy_id}/reviews/count/.
+    Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
+    """
+    page = get_energy_page(
+        db,
+        energy_id=energy_id,
+        user_id=current_user["user_id"] if current_user else None,
+        limit=limit
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Energy not found")
+    return page
+
+# =============== READ ENERGY STATS ===============
+@router.get("/{energy_id}/stats", response_model=EnergyStats, dependencies=[Depends(conditional_get(ENERGIES, CRITERIA, REVIEWS))])
+def read_energy_stats(
+    # Параметр пути: ID энергетика
+    energy_id: int,
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт для получения средних оценок по критериям и гистограмм оценок энергетика.
+    Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
+    """
+    # Проверяем, существует ли энергетик
+    if not energy_exists(db, energy_id=energy_id):
+        raise HTTPException(status_code=404, detail="Energy not found")
+    # Возвращаем предагрегированную статистику
+    return get_energy_stats(db, energy_id=energy_id)
+
+# =============== READ SIMILAR ENERGIES ===============
+@router.get("/{energy_id}/similar", response_model=List[SimilarEnergy])
+def read_similar_energies(
+    # Параметр пути: ID энергетика
+    energy_id: int,
+    # Параметр запроса: сколько похожих вернуть
+    limit: int = Query(10, ge=1, le=50),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт для получения похожих энергетиков (по оценкам критериев и общим авторам отзывов).
+    Список предрасчитан пакетной задачей build_similar_energies.
+    Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
+    """
+    # Проверяем, существует ли энергетик
+    if not energy_exists(db, energy_id=energy_id):
+        raise HTTPException(status_code=404, detail="Energy not found")
+    # Возвращаем готовый список соседей
+    return get_similar_energies(db, energy_id=energy_id, limit=limit)
+
+# =============== READ RANK HISTORY ===============
+@router.get("/{energy_id}/rank-history", response_model=List[RankHistoryPoint], dependencies=[Depends(conditional_get(ENERGIES, RANK_HISTORY, period=86400))])
+def read_energy_rank_history(
+    # Параметр пути: ID энергетика
+    energy_id: int,
+    # Параметр запроса: за сколько последних дней вернуть историю
+    days: int = Query(90, ge=1, le=730),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт для получения истории мест энергетика в общем топе по дням (для графика).
+    Доступен всем пользователям (гостям, зарегистрированным пользователям и администраторам).
+    """
+    # Проверяем, существует ли энергетик
+    if not energy_exists(db, energy_id=energy_id):
+        raise HTTPException(status_code=404, detail="Energy not found")
+    # Возвращаем дневные снимки от старых к новым
+    return get_rank_history(db, energy_id=energy_id, days=days)
+
 # =============== READ ALL REVIEWS ONE ENERGY ===============
 @router.get("/{energy_id}/reviews", response_model=List[ReviewWithRatings])
 def read_energy_reviews(
@@ -108,7 +226,8 @@ def get_total_reviews_by_energy_endpoint(
 @router.post("/upload-image/")
 async def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     verify_admin_token(token, db)
-    return await upload_file(file, UPLOAD_DIR_ENERGY)
+    # Фото попадает в индекс загрузок: если запись на него не сошлется, его удалит очистка
+    return await upload_file(file, UPLOAD_DIR_ENERGY, register=partial(register_upload, db))
 
 # =============== CREATE ===============
 @router.post("/", response_model=Energy, status_code=status.HTTP_201_CREATED)
@@ -122,7 +241,7 @@ def create_new_energy(
     Доступен только администраторам.
     """
     verify_admin_token(token, db)
-    if energy.image_url and not os.path.exists(energy.image_url):
+    if energy.image_url and not storage.exists(energy.image_url):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Указанный файл изображения не существует"
@@ -159,7 +278,7 @@ def update_existing_energy(
     Доступен только администраторам.
     """
     verify_admin_token(token, db)
-    if energy_update.image_url and not os.path.exists(energy_update.image_url):
+    if energy_update.image_url and not storage.exists(energy_update.image_url):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Указанный файл изображения не существует"
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from app.core.file_utils import is_content_name
+from app.core.media import get_media, MEDIA_FORMATS
+from app.core.static_files import file_response
+
+# Создаём маршрутизатор для изображений по запросу
+router = APIRouter()
+
+# =============== READ RESIZED IMAGE ===============
+@router.get("/{kind}/{name}")
+async def read_media(
+    request: Request,
+    # Тип изображения: energy, reviews, suggestion или users
+    kind: str,
+    # Имя файла оригинала (как в image_url)
+    name: str,
+    # Нужная ширина; округляется вверх до разрешенной (MEDIA_WIDTHS)
+    w: int = Query(..., ge=1),
+    # Формат выдачи
+    fmt: str = Query("webp", pattern="^(webp|jpeg)$")
+):
+    """
+    Эндпоинт для получения уменьшенной копии загруженного изображения.
+    Копия строится при первом запросе и хранится в дисковом кэше.
+    Копии фото с именем по хэшу содержимого кэшируются на клиенте без ограничения срока
+    (поддерживаются Range и условные запросы с ответом 304).
+    Доступен всем пользователям.
+    """
+    path = await get_media(kind, name, w, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        # Варианты старых фото со случайными именами могут быть перестроены под тем же адресом
+        return file_response(
+            path, request.headers, media_type=MEDIA_FORMATS[fmt][1], immutable=is_content_name(name)
+        )
+    except FileNotFoundError:
+        # Копию вытеснил из кэша другой процесс между построением и отдачей
+        raise HTTPException(status_code=404, detail="Image not found")
@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from sqlalchemy.orm import Session
+from functools import partial
 from typing import List
 from fastapi.security import OAuth2PasswordBearer
-import os
 
 from app.core.auth import verify_token, verify_admin_token, get_current_user
 from app.core.config import UPLOAD_DIR_REVIEW
 from app.core.file_utils import upload_file
+from app.core.storage import storage
 
 from app.db.database import get_db
 
@@ -17,6 +18,7 @@ from app.services.ratings import get_ratings_by_review
 from app.services.users import get_user, get_review_by_user_and_energy
 from app.services.energies import get_energy
 from app.services.blacklist import get_blacklist_entry
+from app.services.stored_images import register_upload
 
 # Создаём маршрутизатор для эндпоинтов отзывов
 router = APIRouter()
@@ -80,7 +82,7 @@ def create_review(
             status_code=400,
             detail="Оценки обязательны для создания отзыва!"
         )
-    if review.image_url and not os.path.exists(review.image_url):
+    if review.image_url and not storage.exists(review.image_url):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Указанный файл изображения не существует"
@@ -111,7 +113,7 @@ def update_review_endpoint(
     # Проверяем, что пользователь редактирует свой отзыв
     if db_review.user_id != current_user["user_id"]:
         raise HTTPException(status_code=403, detail="Пожалуйста, перезапустите бота и зайдите заново в приложение!")
-    if review_update.image_url and not os.path.exists(review_update.image_url):
+    if review_update.image_url and not storage.exists(review_update.image_url):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Указанный файл изображения не существует"
@@ -153,7 +155,8 @@ def delete_review_endpoint(
 # =============== UPLOAD REVIEW IMAGE ===============
 @router.post("/upload-image/")
 async def upload_review_image(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    return await upload_file(file, UPLOAD_DIR_REVIEW)
+    # Фото попадает в индекс загрузок: если запись на него не сошлется, его удалит очистка
+    return await upload_file(file, UPLOAD_DIR_REVIEW, register=partial(register_upload, db))
 
 # =============== ONLY ADMINS ===============
 
@@ -7,6 +7,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from functools import partial
 
 from app.core.auth import get_current_user, verify_admin_token
 from app.core.config import UPLOAD_DIR_SUGGESTION
@@ -28,6 +29,7 @@ from app.services.suggestions import (
     reject_suggestion,
     delete_suggestion,
 )
+from app.services.stored_images import register_upload
 
 # Создаём маршрутизатор для эндпоинтов предложок
 router = APIRouter()
@@ -43,7 +45,8 @@ async def upload_suggestion_image(
     user: dict = Depends(get_current_user),
 ):
     """Загрузка фото для предложки."""
-    return await upload_file(file, UPLOAD_DIR_SUGGESTION)
+    # Фото попадает в индекс загрузок: если запись на него не сошлется, его удалит очистка
+    return await upload_file(file, UPLOAD_DIR_SUGGESTION, register=partial(register_upload, db))
 
 # =============== CREATE ===============
 @router.post("/", response_model=SuggestionOut, status_code=status.HTTP_201_CREATED)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+
+from app.schemas.sync import SyncResponse
+
+from app.services.sync import get_catalog_changes
+
+# Создаём маршрутизатор для синхронизации каталога
+router = APIRouter()
+
+# =============== READ CATALOG CHANGES ===============
+@router.get("", response_model=SyncResponse)
+def sync_catalog(
+    # Версия каталога, которая уже есть у клиента (0 — полная загрузка)
+    since: int = Query(0, ge=0),
+    # Максимальное количество изменений в ответе
+    limit: int = Query(1000, ge=1, le=5000),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт инкрементальной синхронизации каталога (категории, бренды, энергетики).
+    Возвращает только строки, созданные, измененные или удаленные после версии since.
+    Изменения отдаются через SYNC_SAFETY_LAG секунд после записи, чтобы курсор клиента
+    не перескочил через еще не зафиксированные транзакции.
+    Доступен всем пользователям.
+    """
+    return get_catalog_changes(db, since=since, limit=limit)
@@ -1,19 +1,28 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Union
 
 from app.db.database import get_db
 
-from app.schemas.top import EnergyTop, BrandTop
+from app.core.auth import get_optional_current_user
+from app.core.config import TRENDING_WINDOW_HOURS
+from app.core.etag import conditional_get
+from app.core.responses import cached_json, response_shape
 
-from app.services.top import get_top_energies, get_top_brands, get_total_energies, get_total_brands
+from app.schemas.top import EnergyTop, BrandTop, EnergyTrending, EnergyTopWithFacets
+
+from app.services.top import get_top_energies, get_top_brands, get_total_energies, get_total_brands, get_energy_facets
+from app.services.trending import get_trending_energies, get_total_trending_energies
+from app.services.rated_cache import annotate_rated_by_me
+from app.services.data_versions import ALL_DATA, BRANDS, CATEGORIES, CRITERIA, ENERGIES, REVIEWS
 
 # Создаём маршрутизатор для эндпоинтов топов
 router = APIRouter()
 
 # =============== READ ENERGY CHART ===============
-@router.get("/energies/", response_model=List[EnergyTop])
+@router.get("/energies/", response_model=Union[List[EnergyTop], EnergyTopWithFacets], dependencies=[Depends(conditional_get(*ALL_DATA, per_user=True, period=86400))])
 def get_top_energies_endpoint(
+    request: Request,
     # Зависимость: сессия базы данных
     db: Session = Depends(get_db),
     limit: int = Query(10, ge=1, le=100),           # Ограничиваем количество записей на страницу
@@ -22,29 +31,91 @@ def get_top_energies_endpoint(
     min_rating: float = Query(None, ge=0, le=10),   # Минимальный рейтинг
     max_rating: float = Query(None, ge=0, le=10),   # Максимальный рейтинг
     category_id: int = Query(None, ge=1),           # Фильтр по категории
+    criteria_id: int = Query(None, ge=1),           # Рейтинг по одному критерию
+    weights: str = Query(None, max_length=500),     # Веса критериев, например "Вкус:2,Стоимость:1"
+    facets: bool = Query(False),                    # Вернуть вместе со страницей фасеты фильтров
+    format: str = Query(None),                      # rows (по умолчанию) или columnar
+    fields: str = Query(None, max_length=500),      # Выборочные поля, например "name,average_rating"
+    # Зависимость: пользователь, если передан токен (для отметки rated_by_me)
+    current_user: dict = Depends(get_optional_current_user),
 ):
     """
     Эндпоинт для получения топа энергетиков с наивысшим 
     средним рейтингом с фильтрацией по названию, рейтингу и категории.
+    С criteria_id топ строится по средней оценке выбранного критерия,
+    с weights — по взвешенному среднему критериев (критерий задается названием или id).
+    С facets=true ответ имеет вид {"items": [...], "facets": {...}}: количество
+    по категориям и корзинам рейтинга при текущем поиске, посчитанное одним запросом.
+    С format=columnar строки отдаются параллельными массивами, а бренды и категории —
+    один раз в словаре refs; fields ограничивает набор полей.
     Доступен всем пользователям (гостям, зарегистрированным 
     пользователям и администраторам).
     """
-    # Вызываем функцию для получения топа энергетиков
-    results = get_top_energies(
-        db,
-        limit=limit,
-        offset=offset,
-        search_query=search_query,
-        min_rating=min_rating,
-        max_rating=max_rating,
-        category_id=category_id
-    )
-    # Возвращаем результаты
-    return results
+    try:
+        shape = response_shape(EnergyTop, format, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def build():
+        # Вызываем функцию для получения топа энергетиков
+        try:
+            results = get_top_energies(
+                db,
+                limit=limit,
+                offset=offset,
+                search_query=search_query,
+                min_rating=min_rating,
+                max_rating=max_rating,
+                category_id=category_id,
+                criteria_id=criteria_id,
+                weights=weights
+            )
+            # Отмечаем энергетики, на которые у пользователя есть отзыв
+            annotate_rated_by_me(db, current_user and current_user["user_id"], results)
+            if facets:
+                # Страница и панель фильтров за один запрос клиента
+                return {
+                    "items": results,
+                    "facets": get_energy_facets(
+                        db, search_query, min_rating, max_rating, category_id, criteria_id, weights
+                    ),
+                }
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Возвращаем результаты
+        return results
+
+    # Строки топа собраны сервисом, поэтому сериализуются без повторной валидации
+    return cached_json(request, EnergyTopWithFacets if facets else List[EnergyTop], build, shape)
+
+# =============== READ TRENDING CHART ===============
+@router.get("/energies/trending", response_model=List[EnergyTrending], dependencies=[Depends(conditional_get(ENERGIES, BRANDS, CATEGORIES, REVIEWS, per_user=True, period=3600))])
+def get_trending_energies_endpoint(
+    request: Request,
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100),                           # Ограничиваем количество записей на страницу
+    offset: int = Query(0, ge=0),                                   # Смещение для пагинации
+    hours: int = Query(TRENDING_WINDOW_HOURS, ge=1, le=TRENDING_WINDOW_HOURS),  # Окно трендов в часах
+    category_id: int = Query(None, ge=1),                           # Фильтр по категории
+    # Зависимость: пользователь, если передан токен (для отметки rated_by_me)
+    current_user: dict = Depends(get_optional_current_user),
+):
+    """
+    Эндпоинт для получения топа трендов: энергетики с наибольшим числом отзывов
+    за последние hours часов (по умолчанию неделя).
+    Доступен всем пользователям.
+    """
+    def build():
+        results = get_trending_energies(db, limit=limit, offset=offset, hours=hours, category_id=category_id)
+        return annotate_rated_by_me(db, current_user and current_user["user_id"], results)
+
+    return cached_json(request, List[EnergyTrending], build)
 
 # =============== READ BRAND CHART ===============
-@router.get("/brands/", response_model=List[BrandTop])
+@router.get("/brands/", response_model=List[BrandTop], dependencies=[Depends(conditional_get(ENERGIES, BRANDS, CATEGORIES, REVIEWS))])
 def get_top_brands_endpoint(
+    request: Request,
     # Зависимость: сессия базы данных
     db: Session = Depends(get_db),
     limit: int = Query(10, ge=1, le=100),           # Ограничиваем количество записей на страницу
@@ -52,36 +123,60 @@ def get_top_brands_endpoint(
     search_query: str = Query(None),                # Поиск по названию бренда
     min_rating: float = Query(None, ge=0, le=10),   # Минимальный рейтинг
     max_rating: float = Query(None, ge=0, le=10),   # Максимальный рейтинг
+    format: str = Query(None),                      # rows (по умолчанию) или columnar
+    fields: str = Query(None, max_length=500),      # Выборочные поля, например "name,average_rating"
 ):
     """
     Эндпоинт для получения топа брендов с фильтрацией по названию и рейтингу.
+    С format=columnar строки отдаются параллельными массивами, fields ограничивает набор полей.
     """
+    try:
+        shape = response_shape(BrandTop, format, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     # Вызываем функцию для получения топа брендов
-    return get_top_brands(
+    return cached_json(request, List[BrandTop], lambda: get_top_brands(
         db,
         limit=limit,
         offset=offset,
         search_query=search_query,
         min_rating=min_rating,
         max_rating=max_rating
-    )
+    ), shape)
 
 # =============== READ TOTAL ENERGY COUNT ===============
-@router.get("/energies/count/")
+@router.get("/energies/count/", dependencies=[Depends(conditional_get(ENERGIES, BRANDS, CATEGORIES, CRITERIA, REVIEWS))])
 def get_total_energies_endpoint(
     db: Session = Depends(get_db),
     search_query: str = Query(None),
     min_rating: float = Query(None, ge=0, le=10),
     max_rating: float = Query(None, ge=0, le=10),
     category_id: int = Query(None, ge=1),
+    criteria_id: int = Query(None, ge=1),
+    weights: str = Query(None, max_length=500),
 ):
     """
     Эндпоинт для получения общего количества энергетиков с учетом фильтров.
     """
-    return {"total": get_total_energies(db, search_query, min_rating, max_rating, category_id)}
+    try:
+        return {"total": get_total_energies(db, search_query, min_rating, max_rating, category_id, criteria_id, weights)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# =============== READ TOTAL TRENDING COUNT ===============
+@router.get("/energies/trending/count/", dependencies=[Depends(conditional_get(ENERGIES, CATEGORIES, REVIEWS, period=3600))])
+def get_total_trending_energies_endpoint(
+    db: Session = Depends(get_db),
+    hours: int = Query(TRENDING_WINDOW_HOURS, ge=1, le=TRENDING_WINDOW_HOURS),
+    category_id: int = Query(None, ge=1),
+):
+    """
+    Эндпоинт для получения количества энергетиков в топе трендов.
+    """
+    return {"total": get_total_trending_energies(db, hours=hours, category_id=category_id)}
 
 # =============== READ TOTAL BRAND COUNT ===============
-@router.get("/brands/count/")
+@router.get("/brands/count/", dependencies=[Depends(conditional_get(ENERGIES, BRANDS, CATEGORIES, REVIEWS))])
 def get_total_brands_endpoint(
     db: Session = Depends(get_db),
     search_query: str = Query(None),
@@ -1,17 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Header
 from sqlalchemy.orm import Session
+from functools import partial
 from typing import List, Optional
 from fastapi.security import OAuth2PasswordBearer
 
-from app.core.auth import verify_token, verify_admin_token, get_current_user, get_user_role, create_access_token
+from app.core.auth import verify_token, verify_admin_token, get_current_user, get_user_role, create_access_token, optional_oauth2_scheme
 from app.core.config import UPLOAD_DIR_USER, BOT_API_KEY, TG_ADMIN_IDS
 from app.core.file_utils import upload_file
 
 from app.db.database import get_db
 
-from app.schemas.users import User, UserCreate, UserProfile, UserReviews, UserUpdate
+from app.schemas.users import User, UserBatch, UserCreate, UserProfile, UserReviews, UserUpdate
 
-from app.services.users import get_user, create_user, get_user_profile, get_user_reviews, update_user, get_all_users, delete_user, get_total_reviews, get_total_users_admin
+from app.services.users import get_user, create_user, get_user_profile, get_user_reviews, update_user, get_all_users, delete_user, get_total_reviews, get_total_users_admin, get_users_by_ids
+from app.services.batch import parse_ids
+from app.services.stored_images import register_upload
 
 # Создаём маршрутизатор для эндпоинтов пользователей
 router = APIRouter()
@@ -19,6 +22,34 @@ router = APIRouter()
 # Настройка OAuth2 для проверки JWT-токена
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify")
 
+# =============== READ BATCH ===============
+# Объявлен до /{user_id}, иначе "batch" будет разобран как id
+@router.get("/batch", response_model=UserBatch)
+def read_users_batch(
+    # Параметр запроса: id пользователей через запятую
+    ids: str = Query(..., max_length=2000),
+    # Заголовок с API-ключом бота
+    x_api_key: Optional[str] = Header(None),
+    # JWT-токен администратора, необязательный при запросе от бота
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    # Зависимость: сессия базы данных
+    db: Session = Depends(get_db)
+):
+    """
+    Эндпоинт для получения нескольких пользователей по списку id (ids=3,1,2) одним запросом.
+    Пользователи возвращаются в порядке ids, ненайденные id перечислены в missing.
+    Доступен администраторам и боту (X-API-Key).
+    """
+    if not (x_api_key and x_api_key == BOT_API_KEY):
+        if not token:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        verify_admin_token(token, db)
+    try:
+        user_ids = parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_users_by_ids(db, user_ids)
+
 # =============== READ ONE ===============
 @router.get("/{user_id}", response_model=User)
 def read_user(
@@ -147,7 +178,8 @@ def get_user_role_endpoint(
 # =============== UPLOAD USER IMAGE ===============
 @router.post("/upload-image/")
 async def upload_user_image(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    return await upload_file(file, UPLOAD_DIR_USER)
+    # Фото попадает в индекс загрузок: если запись на него не сошлется, его удалит очистка
+    return await upload_file(file, UPLOAD_DIR_USER, register=partial(register_upload, db))
 
 # =============== ONLY ADMINS ===============
 
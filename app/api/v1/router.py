@@ -23,6 +23,10 @@ from app.api.v1.endpoints import auth
 from app.api.v1.endpoints import blacklist
 # Импортируем маршруты для предложок
 from app.api.v1.endpoints import suggestions
+# Импортируем маршруты для синхронизации каталога
+from app.api.v1.endpoints import sync
+# Импортируем маршруты для изображений по запросу
+from app.api.v1.endpoints import media
 
 # Создаём маршрутизатор для версии v1
 api_router = APIRouter()
@@ -136,3 +140,23 @@ api_router.include_router(
     # Устанавливаем тег для документации
     tags=["suggestions"]
 )
+
+# Подключаем маршруты для синхронизации каталога
+api_router.include_router(
+    # Указываем маршрутизатор синхронизации
+    sync.router,
+    # Устанавливаем префикс для маршрутов
+    prefix="/sync",
+    # Устанавливаем тег для документации
+    tags=["sync"]
+)
+
+# Подключаем маршруты для изображений по запросу
+api_router.include_router(
+    # Указываем маршрутизатор изображений
+    media.router,
+    # Устанавливаем префикс для маршрутов
+    prefix="/media",
+    # Устанавливаем тег для документации
+    tags=["media"]
+)
@@ -0,0 +1,58 @@
+"""
+Скрипт для построения снимков топа энергетиков и брендов.
+
+Обычно снимки строит сам backend (процесс-лидер) раз в CHART_SNAPSHOT_INTERVAL секунд,
+если данные изменились.
+Скрипт позволяет построить их вручную, например сразу после загрузки данных
+или из cron, если фоновое построение в процессах API не нужно.
+"""
+
+import argparse
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import DATABASE_URL, CHART_SNAPSHOT_DIR, CHART_SNAPSHOT_INTERVAL
+
+from app.services.top import build_chart_snapshots
+
+# Создаём движок и сессию БД
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Построение снимков топа энергетиков и брендов"
+    )
+    parser.add_argument(
+        "--loop",
+        action="store_true",
+        help=f"Перестраивать снимки каждые CHART_SNAPSHOT_INTERVAL ({CHART_SNAPSHOT_INTERVAL}) секунд"
+    )
+    args = parser.parse_args()
+
+    if not CHART_SNAPSHOT_DIR:
+        print("CHART_SNAPSHOT_DIR не задан, снимки выключены")
+        return
+
+    while True:
+        with SessionLocal() as db:
+            built = build_chart_snapshots(db)
+        if built:
+            print(f"Снимки топа записаны в {CHART_SNAPSHOT_DIR}")
+        else:
+            print("Снимки топа уже построены на текущих данных")
+        if not args.loop:
+            break
+        time.sleep(CHART_SNAPSHOT_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Скрипт для построения уменьшенных вариантов ранее загруженных изображений.
+
+Новые загрузки сразу получают варианты thumb, card и full в WebP
+(см. app.core.images). Скрипт создает недостающие варианты для фото,
+загруженных раньше. Уже существующие варианты не пересоздаются,
+поэтому скрипт можно запускать повторно.
+"""
+
+import argparse
+import os
+from PIL import Image
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import (
+    UPLOAD_DIR_ENERGY,
+    UPLOAD_DIR_REVIEW,
+    UPLOAD_DIR_SUGGESTION,
+    UPLOAD_DIR_USER,
+)
+from app.core.file_utils import is_content_name
+from app.core.images import is_variant, save_variants, variant_paths
+from app.core.storage import storage, IMMUTABLE_CACHE_CONTROL
+
+
+def build_variants(upload_dir: str, force: bool = False) -> tuple:
+    """Создает варианты для оригиналов в директории. Возвращает (создано, пропущено, ошибок)."""
+    created = skipped = failed = 0
+    # Список файлов читается заранее: новые варианты не должны попасть в обход
+    paths = [path for path, _, _ in storage.iter_files(upload_dir)]
+    existing = set(paths)
+
+    for path in paths:
+        if is_variant(path) or path.endswith(".tmp"):
+            continue
+        if not force and all(variant in existing for variant in variant_paths(path)):
+            skipped += 1
+            continue
+        try:
+            cache_control = IMMUTABLE_CACHE_CONTROL if is_content_name(os.path.basename(path)) else None
+            with storage.open(path) as file, Image.open(file) as img:
+                save_variants(img, path, cache_control=cache_control)
+            created += 1
+        except Exception as e:
+            print(f"  {path}: ошибка: {e}")
+            failed += 1
+    return created, skipped, failed
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Построение уменьшенных вариантов загруженных изображений"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Пересоздать варианты, даже если они уже есть"
+    )
+    args = parser.parse_args()
+
+    for upload_dir in [UPLOAD_DIR_ENERGY, UPLOAD_DIR_REVIEW, UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_USER]:
+        created, skipped, failed = build_variants(upload_dir, force=args.force)
+        print(f"{upload_dir}: создано {created}, уже было {skipped}, ошибок {failed}")
+
+
+if __name__ == "__main__":
+    main()
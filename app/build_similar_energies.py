@@ -0,0 +1,54 @@
+"""
+Скрипт для пересчета похожих энергетиков.
+
+Строит векторы средних оценок по критериям и совместных отзывов пользователей,
+считает косинусное сходство и сохраняет лучших соседей каждого энергетика
+в таблицу energy_similarities. Запускается периодически (например, по cron),
+эндпоинт /energies/{id}/similar только читает готовый результат.
+"""
+
+import argparse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import DATABASE_URL, SIMILAR_TOP_K, SIMILAR_CORATING_WEIGHT
+
+from app.services.similar import build_similar_energies
+
+# Создаём движок и сессию БД
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Пересчет похожих энергетиков"
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=SIMILAR_TOP_K,
+        help=f"Сколько соседей хранить для каждого энергетика (по умолчанию {SIMILAR_TOP_K})"
+    )
+    parser.add_argument(
+        "--corating-weight",
+        type=float,
+        default=SIMILAR_CORATING_WEIGHT,
+        help=f"Доля совместных отзывов в сходстве, от 0 до 1 (по умолчанию {SIMILAR_CORATING_WEIGHT})"
+    )
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        count = build_similar_energies(db, top_k=args.top_k, corating_weight=args.corating_weight)
+
+    print(f"Похожие энергетики пересчитаны: {count} пар")
+
+
+if __name__ == "__main__":
+    main()
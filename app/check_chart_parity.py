@@ -0,0 +1,145 @@
+"""
+Скрипт для проверки совпадения топа из движка в памяти (NumPy) с SQL-топом.
+
+Строит движок по текущей БД и сравнивает с SQL-топом для одних и тех же фильтров
+(поиск, рейтинг, категория, пагинация): порядок энергетиков, средний рейтинг,
+количество отзывов и абсолютную позицию. Энергетики с одинаковым рейтингом
+сравниваются в том же порядке, поэтому проверяется и разрешение равенства.
+Топ по одному критерию сравнивается со взвешенным топом движка с единственным весом.
+
+Запускается после изменения расчета топа в движке или в SQL. Код выхода 1 — есть расхождения.
+"""
+
+import argparse
+import sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import DATABASE_URL
+
+from app.db.models import Energy, Brand, Category, Criteria
+from app.services.top import get_top_energies_sql
+from app.services.top_engine import ChartEngine, is_available
+
+# Создаём движок и сессию БД
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def chart_key(items: list) -> list:
+    """Сравниваемые поля позиции топа."""
+    return [
+        (item["id"], round(float(item["average_rating"]), 4), item["review_count"], item["absolute_rank"])
+        for item in items
+    ]
+
+
+def filter_sets(db: Session, limit: int) -> list:
+    """Наборы фильтров для сравнения, построенные по данным БД."""
+    filters = [
+        {},
+        {"offset": limit // 2},
+        {"min_rating": 0},
+        {"min_rating": 5},
+        {"max_rating": 5},
+        {"min_rating": 3, "max_rating": 7},
+    ]
+    brand = db.query(Brand.name).order_by(Brand.id).first()
+    if brand:
+        filters.append({"search_query": brand.name.split()[0]})
+    energy = db.query(Energy.name).order_by(Energy.id).first()
+    if energy:
+        filters.append({"search_query": energy.name.split()[0]})
+    # Символы шаблонов LIKE в запросе ищутся буквально, как в движке
+    filters.append({"search_query": "%"})
+    filters.append({"search_query": "_"})
+    filters.append({"search_query": "a%b"})
+    category = db.query(Category.id).order_by(Category.id).first()
+    if category:
+        filters.append({"category_id": category.id})
+        filters.append({"category_id": category.id, "min_rating": 5})
+    return filters
+
+
+def _sql_total(db: Session, filters: dict, criteria_id: int = None) -> int:
+    """Количество энергетиков по SQL-топу (get_total_energies может отдать его из снимка или движка)."""
+    return len(get_top_energies_sql(db, limit=None, criteria_id=criteria_id, **filters))
+
+
+def compare(label: str, expected: list, actual: list, expected_total: int, actual_total: int) -> bool:
+    """Выводит первое расхождение, возвращает True при совпадении."""
+    expected, actual = chart_key(expected), chart_key(actual)
+    if expected == actual and expected_total == actual_total:
+        # Группы с одинаковым рейтингом и количеством отзывов проверяют порядок при равенстве
+        ties = len(expected) - len({(rating, count) for _, rating, count, _ in expected})
+        print(f"  OK    {label}: {len(expected)} позиций, из них при равенстве: {ties}")
+        return True
+    print(f"  FAIL  {label}: всего SQL {expected_total}, движок {actual_total}")
+    for position, (sql_item, engine_item) in enumerate(zip(expected, actual), start=1):
+        if sql_item != engine_item:
+            print(f"        позиция {position}: SQL {sql_item}, движок {engine_item}")
+            break
+    else:
+        print(f"        длина: SQL {len(expected)}, движок {len(actual)}")
+    return False
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Проверка совпадения топа из движка в памяти с SQL-топом"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=1000,
+        help="Размер сравниваемой страницы топа (по умолчанию 1000)"
+    )
+    args = parser.parse_args()
+
+    if not is_available():
+        print("NumPy не установлен, движок в памяти недоступен")
+        return
+
+    ok = True
+    with SessionLocal() as db:
+        # Отдельный экземпляр: проверка не зависит от CHART_ENGINE и состояния процесса
+        chart_engine = ChartEngine()
+
+        print("Общий топ:")
+        for filters in filter_sets(db, args.limit):
+            filters = {"limit": args.limit, "offset": 0, **filters}
+            count_filters = {k: v for k, v in filters.items() if k not in ("limit", "offset")}
+            ok &= compare(
+                str(count_filters or "без фильтров") + (f", offset={filters['offset']}" if filters["offset"] else ""),
+                get_top_energies_sql(db, **filters),
+                chart_engine.top_energies(db, **filters),
+                _sql_total(db, count_filters),
+                chart_engine.total_energies(db, **count_filters),
+            )
+
+        print("Топ по одному критерию:")
+        for criteria_id, name in db.query(Criteria.id, Criteria.name).order_by(Criteria.id):
+            weights = {str(criteria_id): 1.0}
+            for filters in ({}, {"min_rating": 5}):
+                ok &= compare(
+                    f"{name} {filters or ''}".strip(),
+                    get_top_energies_sql(db, limit=args.limit, criteria_id=criteria_id, **filters),
+                    chart_engine.top_weighted_energies(db, weights, limit=args.limit, **filters),
+                    _sql_total(db, filters, criteria_id),
+                    chart_engine.total_weighted_energies(db, weights, **filters),
+                )
+
+    if not ok:
+        print("\nЕсть расхождения между движком и SQL-топом")
+        sys.exit(1)
+    print("\nДвижок совпадает с SQL-топом")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Скрипт для проверки S3-хранилища фото (S3Storage) на настоящем сервере.
+
+Проверяет все операции интерфейса Storage на бакете из настроек S3_*: сохранение
+(обычное и по частям), чтение, размер, копирование, перечисление, ссылку для клиента
+и удаление. Файлы создаются под отдельным префиксом и удаляются в конце проверки.
+
+Для локальной проверки подходит MinIO из docker-compose-server.yml:
+    docker compose -f docker-compose-server.yml --profile minio up -d minio
+    S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET=energy python -m app.check_storage --create-bucket
+
+Код выхода 1 — есть ошибки.
+"""
+
+import argparse
+import io
+import sys
+import urllib.request
+import uuid
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import (
+    S3_BUCKET, S3_ENDPOINT_URL, S3_REGION, S3_ACCESS_KEY, S3_SECRET_KEY,
+    S3_PUBLIC_URL, S3_MULTIPART_THRESHOLD,
+)
+
+from app.core.storage import S3Storage, IMMUTABLE_CACHE_CONTROL
+
+
+def check(label: str, ok: bool, details: str = "") -> bool:
+    """Выводит результат одной проверки."""
+    print(f"  {'OK  ' if ok else 'FAIL'}  {label}" + (f": {details}" if details and not ok else ""))
+    return ok
+
+
+def run_checks(storage: S3Storage, prefix: str) -> bool:
+    """Проверяет операции хранилища на файлах под prefix. Возвращает True, если все прошли."""
+    small_key = f"{prefix}/small.jpg"
+    large_key = f"{prefix}/large.jpg"
+    copy_key = f"{prefix}/copy/small.jpg"
+    missing_key = f"{prefix}/missing.jpg"
+    small = uuid.uuid4().bytes * 64
+    # Больше порога: загружается по частям
+    large = b"\xab" * (S3_MULTIPART_THRESHOLD + 1)
+
+    ok = True
+    storage.save(small_key, small, content_type="image/jpeg", cache_control=IMMUTABLE_CACHE_CONTROL)
+    ok &= check("save/exists", storage.exists(small_key))
+    stat = storage.stat(small_key)
+    ok &= check("stat", stat is not None and stat[0] == len(small), str(stat))
+    with storage.open(small_key) as f:
+        ok &= check("open", f.read() == small)
+
+    storage.save(large_key, io.BytesIO(large))
+    stat = storage.stat(large_key)
+    ok &= check("save по частям", stat is not None and stat[0] == len(large), str(stat))
+
+    storage.copy(small_key, copy_key)
+    with storage.open(copy_key) as f:
+        ok &= check("copy", f.read() == small)
+
+    keys = sorted(key for key, _, _ in storage.iter_files(prefix))
+    ok &= check("iter_files", keys == sorted([small_key, large_key, copy_key]), str(keys))
+
+    url = storage.url(small_key)
+    try:
+        with urllib.request.urlopen(url) as response:
+            body = response.read()
+            cache_control = response.headers.get("Cache-Control")
+        ok &= check("url", body == small)
+        ok &= check("Cache-Control", cache_control == IMMUTABLE_CACHE_CONTROL, str(cache_control))
+    except OSError as e:
+        ok &= check("url", False, f"{url}: {e}")
+
+    ok &= check("stat отсутствующего", storage.stat(missing_key) is None)
+    try:
+        storage.open(missing_key)
+        ok &= check("open отсутствующего", False, "нет FileNotFoundError")
+    except FileNotFoundError:
+        ok &= check("open отсутствующего", True)
+
+    # Отсутствующий ключ в списке не мешает удалению остальных
+    storage.delete([small_key, large_key, copy_key, missing_key])
+    ok &= check("delete", not storage.exists(small_key) and not list(storage.iter_files(prefix)))
+    return ok
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Проверка S3-хранилища фото на бакете из настроек S3_*"
+    )
+    parser.add_argument(
+        "--create-bucket",
+        action="store_true",
+        help="Создать бакет S3_BUCKET, если его нет (для нового MinIO)"
+    )
+    args = parser.parse_args()
+
+    storage = S3Storage(
+        S3_BUCKET,
+        endpoint_url=S3_ENDPOINT_URL,
+        region=S3_REGION,
+        access_key=S3_ACCESS_KEY,
+        secret_key=S3_SECRET_KEY,
+        public_url=S3_PUBLIC_URL,
+    )
+    if args.create_bucket:
+        buckets = {bucket["Name"] for bucket in storage.client.list_buckets().get("Buckets", [])}
+        if S3_BUCKET not in buckets:
+            storage.client.create_bucket(Bucket=S3_BUCKET)
+            print(f"Создан бакет {S3_BUCKET}")
+
+    prefix = f"uploads/_check_storage/{uuid.uuid4().hex}"
+    print(f"Проверяем {S3_ENDPOINT_URL or 'AWS S3'}, бакет {S3_BUCKET}, префикс {prefix}:")
+    try:
+        ok = run_checks(storage, prefix)
+    finally:
+        # Не оставляем файлы проверки и при ошибке
+        storage.delete([key for key, _, _ in storage.iter_files(prefix)])
+
+    if not ok:
+        print("\nЕсть ошибки в работе хранилища")
+        sys.exit(1)
+    print("\nХранилище работает")
+
+
+if __name__ == "__main__":
+    main()
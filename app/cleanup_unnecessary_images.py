@@ -1,177 +1,173 @@
 """
 Скрипт для очистки ненужных фотографий, которые не используются в БД.
 
-Сканирует директории загрузок и удаляет файлы, на которые нет ссылок
-в таблицах: energetics, reviews, suggestions, users.
+Загруженные фото учитываются в индексе stored_images (путь, размер, время загрузки
+или изменения счетчика ссылок): загрузка добавляет фото в индекс, а записи увеличивают
+и уменьшают счетчик ссылок.
+Скрипт не сканирует хранилище и не загружает ссылки в память: ненужные фото
+выбираются в БД пачками по --batch-size (строки индекса, на которые не ссылается
+ни одна запись в energetics, reviews, suggestions, users), после чего строки индекса
+удаляются, а файлы с вариантами удаляются из хранилища в --workers потоков.
+
+Фото, загруженные или получившие ссылку меньше --grace-hours часов назад, не трогаются:
+клиент мог загрузить фото и еще не успеть создать запись.
+
+Очистка инкрементальная: следующий запуск рассматривает только фото, которые
+загружались или теряли ссылку (release_image) после предыдущего прохода.
+Ссылки, убранные в обход счетчика (правка image_url прямо в БД, сбой удаления файла),
+инкрементальный проход не заметит: периодически (например, раз в неделю) запускайте
+очистку с --full, чтобы рассмотреть весь индекс заново.
+Прерванный проход продолжается с последней обработанной пачки (файл состояния).
+
+Фото, загруженные до появления индекса (или оставшиеся после сбоев), добавляются
+в него одним обходом хранилища: --reindex.
 
 Безопасность:
 - Использует ORM SQLAlchemy (параметризованные запросы) - защита от SQL-инъекций
-- Только чтение из БД, никаких модификаций
+- Изменяет в БД только индекс фото stored_images
 - Работает только с указанными директориями загрузок
 - Режим dry-run по умолчанию (требуется --execute для удаления)
 """
 
+import argparse
+import json
 import os
-import sys
-from pathlib import Path
+import posixpath
+import time
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects.postgresql import insert
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
 load_dotenv()
 
 # Импортируем конфигурацию
-from app.core.config import (
-    DATABASE_URL,
-    UPLOAD_DIR_ENERGY,
-    UPLOAD_DIR_REVIEW,
-    UPLOAD_DIR_SUGGESTION,
-    UPLOAD_DIR_USER,
-)
+from app.core.config import DATABASE_URL, UPLOAD_DIR_ENERGY
+
+from app.core.file_utils import UPLOAD_DIRS
+from app.core.images import is_variant, variant_paths
+from app.core.storage import storage
 
 # Импортируем модели для безопасного ORM-доступа
-from app.db.models import Energy, Review, Suggestion, User
+from app.db.models import StoredImage
+from app.services.stored_images import find_orphan_images, delete_orphan_images
 
 # Создаём движок и сессию БД
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Файл состояния по умолчанию: рядом с директориями загрузок
+DEFAULT_STATE_FILE = os.path.join(
+    os.path.dirname(os.path.normpath(UPLOAD_DIR_ENERGY)), ".cleanup_images.json"
+)
+
+
+def load_state(path: str) -> dict:
+    """Читает состояние очистки: время прошлого полного прохода и место остановки текущего."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
 
-def get_used_images_from_db() -> set:
+def save_state(path: str, state: dict) -> None:
+    """Сохраняет состояние через временный файл, чтобы прерывание не испортило его."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def reindex(db: Session, batch_size: int) -> int:
     """
-    Получает все пути к изображениям, которые используются в БД.
-    Использует ORM SQLAlchemy для безопасного доступа к данным.
+    Добавляет в индекс оригиналы из хранилища, которых в нем нет (варианты учитываются
+    вместе с оригиналом). У уже проиндексированных фото обновляется только размер.
+    Возвращает количество обработанных файлов.
     """
-    used_images = set()
-    
-    with SessionLocal() as db:
-        # Получаем изображения из таблицы energetics
-        for energy in db.query(Energy.image_url).filter(Energy.image_url.isnot(None)).all():
-            if energy.image_url:
-                used_images.add(energy.image_url)
-        
-        # Получаем изображения из таблицы reviews
-        for review in db.query(Review.image_url).filter(Review.image_url.isnot(None)).all():
-            if review.image_url:
-                used_images.add(review.image_url)
-        
-        # Получаем изображения из таблицы suggestions
-        for suggestion in db.query(Suggestion.image_url).filter(Suggestion.image_url.isnot(None)).all():
-            if suggestion.image_url:
-                used_images.add(suggestion.image_url)
-        
-        # Получаем изображения из таблицы users
-        for user in db.query(User.image_url).filter(User.image_url.isnot(None)).all():
-            if user.image_url:
-                used_images.add(user.image_url)
-    
-    return used_images
-
-
-def get_files_in_directory(directory: str) -> set:
-    """Получает все файлы в директории (рекурсивно)."""
-    files = set()
-    dir_path = Path(directory)
-    
-    if not dir_path.exists():
-        print(f"Директория {directory} не существует, пропускаем...")
-        return files
-    
-    for file_path in dir_path.rglob("*"):
-        if file_path.is_file():
-            files.add(str(file_path))
-    
-    return files
-
-
-def normalize_path(path: str) -> str:
-    """Нормализует путь для сравнения (убирает ./ и нормализует слеши)."""
-    return str(Path(path))
-
-
-def find_orphan_images(upload_dirs: list, used_images: set) -> list:
-    """Находит файлы, которые есть на диске, но нет в БД."""
-    all_files = set()
-    
-    # Собираем все файлы из всех директорий загрузок
-    for upload_dir in upload_dirs:
-        files = get_files_in_directory(upload_dir)
-        all_files.update(files)
-    
-    # Нормализуем пути в used_images для сравнения
-    normalized_used = {normalize_path(img) for img in used_images}
-    
-    # Находим "сирот" - файлы, которых нет в БД
-    orphan_files = []
-    for file_path in all_files:
-        normalized_path = normalize_path(file_path)
-        if normalized_path not in normalized_used:
-            orphan_files.append(file_path)
-    
-    return orphan_files
-
-
-def delete_orphan_images(orphan_files: list, dry_run: bool = True) -> None:
-    """Удаляет или выводит список "сирот" файлов."""
-    if not orphan_files:
-        print("Ненужных файлов не найдено!")
-        return
-    
-    action = "Будут удалены" if dry_run else "Удаляем"
-    print(f"\n{action} {len(orphan_files)} файлов:")
-    print("-" * 60)
-    
-    total_size = 0
-    for file_path in orphan_files:
-        file_size = os.path.getsize(file_path)
-        total_size += file_size
-        size_mb = file_size / (1024 * 1024)
-        print(f"  {file_path} ({size_mb:.2f} MB)")
-        
-        if not dry_run:
-            try:
-                os.remove(file_path)
-                print(f"    -> Удалено")
-            except Exception as e:
-                print(f"    -> Ошибка удаления: {e}")
-    
-    print("-" * 60)
-    total_size_mb = total_size / (1024 * 1024)
-    print(f"Общий размер: {total_size_mb:.2f} MB")
-    
-    # Удаляем пустые директории
-    if not dry_run:
-        cleanup_empty_dirs()
-
-
-def cleanup_empty_dirs() -> None:
-    """Удаляет пустые директории после очистки файлов."""
-    upload_dirs = [
-        UPLOAD_DIR_ENERGY,
-        UPLOAD_DIR_REVIEW,
-        UPLOAD_DIR_SUGGESTION,
-        UPLOAD_DIR_USER,
-    ]
-    
-    for upload_dir in upload_dirs:
-        dir_path = Path(upload_dir)
-        if dir_path.exists():
-            for root, dirs, files in os.walk(str(dir_path), topdown=False):
-                for dir_name in dirs:
-                    full_path = Path(root) / dir_name
-                    try:
-                        if not any(full_path.iterdir()):
-                            full_path.rmdir()
-                            print(f"Удалена пустая директория: {full_path}")
-                    except Exception:
-                        pass
+    total = 0
+    rows = []
+
+    def flush():
+        stmt = insert(StoredImage).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[StoredImage.path],
+            set_={"size": stmt.excluded.size}
+        ))
+        db.commit()
+
+    for upload_dir in UPLOAD_DIRS:
+        for path, size, mtime in storage.iter_files(upload_dir):
+            # Варианты учитываются вместе с оригиналом, .tmp — недописанные файлы LocalStorage.save
+            if is_variant(path) or path.endswith(".tmp"):
+                continue
+            rows.append({
+                "path": posixpath.normpath(path),
+                "ref_count": 0,
+                "size": size,
+                "mtime": int(mtime),
+            })
+            if len(rows) >= batch_size:
+                flush()
+                total += len(rows)
+                rows = []
+                print(f"  проиндексировано {total} файлов")
+    if rows:
+        flush()
+        total += len(rows)
+    return total
+
+
+def delete_files(pool: ThreadPoolExecutor, workers: int, paths: list) -> None:
+    """Удаляет фото с вариантами из хранилища, разделив их между потоками."""
+    keys = [key for path in paths for key in (path, *variant_paths(path))]
+    chunk_size = max(1, -(-len(keys) // workers))
+    chunks = [keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size)]
+    # list() дожидается всех потоков и пробрасывает первую ошибку
+    list(pool.map(storage.delete, chunks))
+
+
+def cleanup(db: Session, state: dict, state_file: str, batch_size: int,
+            workers: int, dry_run: bool) -> tuple:
+    """
+    Проходит по фото без ссылок пачками и удаляет их (или только выводит в режиме dry-run).
+    Строки индекса удаляются в той же транзакции, которая фиксируется после удаления
+    файлов: при сбое пачка останется в индексе и будет обработана при следующем запуске.
+    Загрузка того же фото в это время дождется фиксации и запишет файл заново (register_upload).
+    Возвращает (количество файлов, общий размер).
+    """
+    cutoff, since, after = state["cutoff"], state.get("since"), state.get("after")
+    total_files = total_size = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            if dry_run:
+                batch = find_orphan_images(db, cutoff, after, since, batch_size)
+            else:
+                batch = sorted(delete_orphan_images(db, cutoff, after, since, batch_size))
+            if not batch:
+                return total_files, total_size
+
+            for path, size in batch:
+                size = size or 0
+                total_size += size
+                print(f"  {path} ({size / (1024 * 1024):.2f} MB)")
+            total_files += len(batch)
+            after = batch[-1][0]
+
+            if not dry_run:
+                try:
+                    delete_files(pool, workers, [path for path, _ in batch])
+                except Exception:
+                    db.rollback()
+                    raise
+                db.commit()
+                state["after"] = after
+                save_state(state_file, state)
 
 
 def main() -> None:
     """Основная функция."""
-    import argparse
-    
     parser = argparse.ArgumentParser(
         description="Очистка ненужных фотографий, не используемых в БД"
     )
@@ -181,48 +177,90 @@ def main() -> None:
         help="Фактически удалить файлы (по умолчанию только показать)"
     )
     parser.add_argument(
-        "--verbose",
+        "--reindex",
+        action="store_true",
+        help="Перед очисткой добавить в индекс фото из хранилища, которых в нем нет"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Рассмотреть весь индекс, а не только фото, загруженные или потерявшие ссылку после прошлой очистки"
+    )
+    parser.add_argument(
+        "--grace-hours",
+        type=float,
+        default=24,
+        help="Не трогать фото, загруженные меньше стольких часов назад (по умолчанию 24)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Количество фото в одной пачке (по умолчанию 500)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Потоков для удаления файлов (по умолчанию 8)"
+    )
+    parser.add_argument(
+        "--state-file",
+        default=DEFAULT_STATE_FILE,
+        help="Файл состояния для продолжения прерванной очистки"
+    )
+    parser.add_argument(
+        "--restart",
         action="store_true",
-        help="Показать все используемые изображения"
+        help="Начать проход заново, не учитывая место остановки прошлого"
     )
-    
+
     args = parser.parse_args()
-    
+    dry_run = not args.execute
+
     print("=" * 60)
     print("Скрипт очистки ненужных фотографий")
     print("=" * 60)
-    
-    # Получаем используемые изображения из БД
-    print("\nПолучаем данные из БД...")
-    used_images = get_used_images_from_db()
-    print(f"Найдено {len(used_images)} изображений в БД")
-    
-    if args.verbose:
-        print("\nИспользуемые изображения:")
-        for img in sorted(used_images):
-            print(f"  {img}")
-    
-    # Директории для сканирования
-    upload_dirs = [
-        UPLOAD_DIR_ENERGY,
-        UPLOAD_DIR_REVIEW,
-        UPLOAD_DIR_SUGGESTION,
-        UPLOAD_DIR_USER,
-    ]
-    
-    # Находим "сирот"
-    print("\nСканируем директории...")
-    orphan_files = find_orphan_images(upload_dirs, used_images)
-    
-    # Удаляем или показываем
-    dry_run = not args.execute
-    if dry_run and orphan_files:
-        print("\n[DRY RUN] Для фактического удаления запустите с флагом --execute")
-    
-    delete_orphan_images(orphan_files, dry_run=dry_run)
-    
+
+    state = load_state(args.state_file)
+    if args.restart or args.reindex:
+        # После переиндексации в индексе есть старые фото: проход начинается заново
+        state = {"since": state.get("since")}
+    if args.full or args.reindex:
+        state["since"] = None
+    if "cutoff" not in state:
+        state["cutoff"] = int(time.time() - args.grace_hours * 3600)
+    else:
+        print(f"\nПродолжаем прерванную очистку после {state.get('after')}")
+
+    with SessionLocal() as db:
+        if args.reindex:
+            print("\nИндексируем хранилище...")
+            print(f"Проиндексировано {reindex(db, args.batch_size)} файлов")
+            # Старые фото попали в индекс: до завершения полного прохода рассматривается весь индекс
+            save_state(args.state_file, {"since": None})
+
+        action = "Будут удалены" if dry_run else "Удаляем"
+        print(f"\n{action} файлы без ссылок в БД:")
+        print("-" * 60)
+        total_files, total_size = cleanup(
+            db, state, args.state_file, args.batch_size, args.workers, dry_run
+        )
+        print("-" * 60)
+
+    if not total_files:
+        print("Ненужных файлов не найдено!")
+    else:
+        print(f"Файлов: {total_files}, общий размер: {total_size / (1024 * 1024):.2f} MB")
+    if dry_run:
+        if total_files:
+            print("\n[DRY RUN] Для фактического удаления запустите с флагом --execute")
+    else:
+        # Следующий запуск рассмотрит только фото, загруженные или потерявшие ссылку после этого прохода
+        save_state(args.state_file, {"since": state["cutoff"]})
+
     print("\nГотово!")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -21,6 +21,9 @@ if not all([BACKEND_SECRET_KEY, BACKEND_ALGORITHM, BOT_TOKEN]):
 # Настройка OAuth2 для проверки JWT-токена с указанием URL для получения токена
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify")
 
+# Та же схема без ошибки при отсутствии токена, для эндпоинтов, открытых гостям
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/verify", auto_error=False)
+
 # Функция для получения текущего пользователя на основе JWT-токена
 def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     """
@@ -39,6 +42,21 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     # Возвращаем словарь с user_id и ролью (по умолчанию "user", если роль не указана)
     return {"user_id": int(user_id), "role": payload.get("role", "user")}
 
+# Функция для получения текущего пользователя, если он авторизован
+def get_optional_current_user(token: str = Depends(optional_oauth2_scheme)) -> dict | None:
+    """
+    Возвращает данные пользователя для публичных эндпоинтов.
+    Без токена или с недействительным токеном запрос обрабатывается как от гостя.
+    :param token: JWT-токен, необязательный
+    :return: Словарь с user_id и ролью или None
+    """
+    if not token:
+        return None
+    try:
+        return get_current_user(token)
+    except HTTPException:
+        return None
+
 # Функция для получения роли пользователя по его ID
 def get_user_role(db: Session, user_id: int) -> str:
     """
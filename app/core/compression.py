@@ -0,0 +1,149 @@
+"""
+Сжатие ответов gzip и brotli.
+
+CompressionMiddleware сжимает текстовые ответы (JSON, HTML, текст) размером
+от COMPRESSION_MIN_SIZE байт, если клиент указал подходящий Accept-Encoding.
+brotli используется, если установлен пакет brotli, иначе gzip.
+Изображения и другие уже сжатые форматы отдаются как есть.
+Потоковые ответы (StreamingResponse, text/event-stream) тоже пропускаются как есть:
+сжатие целиком задержало бы их до конца потока.
+
+Ответы из кэша готовых байтов (app.core.responses) сжимаются там же один раз
+на запись кэша и получают Content-Encoding заранее — такие ответы middleware
+пропускает без повторного сжатия.
+"""
+
+import gzip
+
+from app.core.config import COMPRESSION_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:  # brotli необязательный, без него используется только gzip
+    brotli = None
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "text/",
+    "image/svg+xml",
+)
+# Потоковые типы: клиент ждет события по мере отправки, сжимать целиком нельзя
+STREAMING_TYPES = (
+    "text/event-stream",
+)
+
+# Уровни сжатия: для ответов "на лету" — быстрые, для кэша — плотные (платим один раз)
+GZIP_LEVEL = 6
+GZIP_LEVEL_CACHED = 9
+BROTLI_QUALITY = 4
+BROTLI_QUALITY_CACHED = 9
+
+
+# =============== HELPERS ===============
+def choose_encoding(accept_encoding: str):
+    """Выбирает br или gzip по заголовку Accept-Encoding (значения с q=0 не учитываются)."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = (content_type or "").lower()
+    if any(content_type.startswith(streaming) for streaming in STREAMING_TYPES):
+        return False
+    return any(content_type.startswith(allowed) for allowed in COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    """Сжимает тело ответа выбранным алгоритмом."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY_CACHED if cached else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL_CACHED if cached else GZIP_LEVEL, mtime=0)
+
+
+def _add_vary(headers: list) -> list:
+    """Добавляет Accept-Encoding в заголовок Vary, сохраняя уже перечисленные значения."""
+    for index, (name, value) in enumerate(headers):
+        if name.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[index] = (name, value + b", Accept-Encoding")
+            return headers
+    headers.append((b"vary", b"Accept-Encoding"))
+    return headers
+
+
+# =============== MIDDLEWARE ===============
+class CompressionMiddleware:
+    """ASGI middleware: сжимает текстовые ответы от minimum_size байт."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        # Ответ на HEAD не содержит тела, его Content-Length не трогаем
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope["headers"])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                # Уже сжатые ответы и неподходящие типы пропускаем как есть
+                if b"content-encoding" in headers or not is_compressible(content_type):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            # Тело из нескольких частей — потоковый ответ: отдаем как есть, не дожидаясь конца
+            if message.get("more_body", False):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            # Тело одной частью сжимается целиком
+            body = message.get("body", b"")
+            headers = [
+                (name, value) for name, value in start_message.get("headers", [])
+                if name.lower() != b"content-length"
+            ]
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                _add_vary(headers)
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
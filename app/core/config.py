@@ -33,4 +33,56 @@ UPLOAD_DIR_REVIEW = os.getenv("UPLOAD_DIR_REVIEW", "uploads/reviews/")
 UPLOAD_DIR_SUGGESTION = os.getenv("UPLOAD_DIR_SUGGESTION", "uploads/suggestion/")
 UPLOAD_DIR_USER = os.getenv("UPLOAD_DIR_USER", "uploads/users/")
 ALLOWED_EXTENSIONS = set(os.getenv("ALLOWED_EXTENSIONS", ".jpg,.jpeg,.png,.heif").split(","))
-MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10 * 1024 * 1024))  # 10 MB
\ No newline at end of file
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10 * 1024 * 1024))  # 10 MB
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000))  # Максимум пикселей в загружаемом изображении (защита от "бомб")
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", 12000))  # Максимальная ширина или высота загружаемого изображения
+
+# =============== Топ энергетиков в памяти ===============
+CHART_ENGINE = os.getenv("CHART_ENGINE", "sql")  # sql | numpy
+
+# =============== Снимок топа для всех процессов ===============
+CHART_SNAPSHOT_DIR = os.getenv("CHART_SNAPSHOT_DIR", "")  # Пусто — снимки выключены
+CHART_SNAPSHOT_INTERVAL = int(os.getenv("CHART_SNAPSHOT_INTERVAL", 30))  # Период перестроения, в секундах
+
+# =============== Похожие энергетики ===============
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", 20))  # Сколько соседей хранить для каждого энергетика
+SIMILAR_CORATING_WEIGHT = float(os.getenv("SIMILAR_CORATING_WEIGHT", 0.3))  # Доля совместных оценок в сходстве (0..1)
+
+# =============== Тренды ===============
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", 168))  # Длина окна трендов в часах (по умолчанию неделя)
+
+# =============== Отметки "оценено мной" ===============
+RATED_CACHE_SIZE = int(os.getenv("RATED_CACHE_SIZE", 10000))  # Сколько пользователей держать в кэше процесса
+RATED_CACHE_TTL = int(os.getenv("RATED_CACHE_TTL", 60))  # Перечитывать карту пользователя раз в N секунд
+
+# =============== Пакетное получение по id ===============
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", 100))  # Максимум id в одном запросе /batch
+
+# =============== Синхронизация каталога ===============
+SYNC_SAFETY_LAG = int(os.getenv("SYNC_SAFETY_LAG", 30))  # Изменения моложе N секунд не отдаются в /sync (транзакции могут быть еще не зафиксированы)
+
+# =============== Кэш готовых ответов ===============
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 512))  # Сколько сериализованных ответов держать в процессе (0 — выключен)
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 30))  # Максимальное время жизни готового ответа, в секундах
+
+# =============== Сжатие ответов ===============
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # Ответы меньше этого размера (в байтах) не сжимаются
+
+# =============== Изображения по запросу (/media) ===============
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "uploads/cache/")  # Директория дискового кэша уменьшенных копий
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 512 * 1024 * 1024))  # Предельный размер кэша в байтах (старые копии вытесняются)
+MEDIA_WIDTHS = sorted(int(width) for width in os.getenv("MEDIA_WIDTHS", "160,320,480,640,960,1280").split(","))  # Разрешенные ширины
+MEDIA_RESIZE_WORKERS = int(os.getenv("MEDIA_RESIZE_WORKERS", 2))  # Потоков для уменьшения изображений
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "").rstrip("/")  # Внутренний location прокси для X-Accel-Redirect (пусто — файлы отдает приложение)
+
+# =============== Хранилище файлов ===============
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")  # local (диск) или s3 (S3-совместимое хранилище)
+S3_BUCKET = os.getenv("S3_BUCKET", "")  # Бакет для фото
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None  # Адрес S3-совместимого хранилища (пусто — AWS S3)
+S3_REGION = os.getenv("S3_REGION") or None  # Регион бакета
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY") or None  # Ключ доступа
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY") or None  # Секретный ключ
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL", "").rstrip("/")  # Публичный адрес бакета или CDN (пусто — подписанные ссылки)
+S3_URL_EXPIRES = int(os.getenv("S3_URL_EXPIRES", 3600))  # Срок действия подписанной ссылки, в секундах
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))  # Файлы больше загружаются по частям
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))  # Размер части при загрузке по частям
\ No newline at end of file
@@ -0,0 +1,55 @@
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+import hashlib
+import time
+
+from app.core.auth import get_optional_current_user
+from app.db.database import get_db
+from app.services.data_versions import get_data_versions
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (список ETag через запятую или *)."""
+    if if_none_match.strip() == "*":
+        return True
+    # Слабое сравнение: префикс W/ не учитывается
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+# Фабрика зависимостей для условных GET-запросов
+def conditional_get(*data: str, per_user: bool = False, period: int = None):
+    """
+    Возвращает зависимость, которая строит слабый ETag из версий групп данных
+    и отвечает 304 Not Modified на совпадающий If-None-Match до выполнения эндпоинта.
+    :param data: группы данных, от которых зависит ответ (см. app.services.data_versions)
+    :param per_user: ответ зависит от пользователя (например, rated_by_me)
+    :param period: ответ зависит от времени — ETag меняется раз в period секунд
+    """
+    def dependency(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db),
+        current_user: dict = Depends(get_optional_current_user),
+    ):
+        versions = get_data_versions(db, data)
+        parts = [f"{name}:{versions[name]}" for name in data]
+        if per_user:
+            parts.append(f"user:{current_user['user_id'] if current_user else 0}")
+        if period:
+            parts.append(f"period:{int(time.time()) // period}")
+        etag = 'W/"' + hashlib.blake2b("|".join(parts).encode(), digest_size=8).hexdigest() + '"'
+
+        headers = {"ETag": etag}
+        if per_user:
+            headers["Vary"] = "Authorization"
+        # ETag используется как ключ кэша готовых ответов (см. app.core.responses)
+        request.state.etag = etag
+        request.state.etag_headers = headers
+        # Данные не изменились: ни основной запрос, ни сериализация не нужны
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
@@ -1,15 +1,23 @@
+import hashlib
+import mimetypes
 import os
-import uuid
 from fastapi import HTTPException, status, UploadFile
-from PIL import Image
+from starlette.concurrency import run_in_threadpool
+from PIL import Image, ImageOps
 import io
-from app.core.config import UPLOAD_DIR_ENERGY, UPLOAD_DIR_REVIEW, UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_USER, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+from app.core.config import UPLOAD_DIR_ENERGY, UPLOAD_DIR_REVIEW, UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_USER, ALLOWED_EXTENSIONS, MAX_FILE_SIZE, MAX_IMAGE_PIXELS, MAX_IMAGE_SIDE
+from app.core.images import render_variants, store_variants, strip_metadata, variant_paths
+from app.core.storage import storage, IMMUTABLE_CACHE_CONTROL
 
-# Создание директорий
-os.makedirs(UPLOAD_DIR_ENERGY, exist_ok=True)
-os.makedirs(UPLOAD_DIR_REVIEW, exist_ok=True)
-os.makedirs(UPLOAD_DIR_SUGGESTION, exist_ok=True)
-os.makedirs(UPLOAD_DIR_USER, exist_ok=True)
+# Создание директорий (для хранения на диске)
+if storage.serves_locally:
+    os.makedirs(UPLOAD_DIR_ENERGY, exist_ok=True)
+    os.makedirs(UPLOAD_DIR_REVIEW, exist_ok=True)
+    os.makedirs(UPLOAD_DIR_SUGGESTION, exist_ok=True)
+    os.makedirs(UPLOAD_DIR_USER, exist_ok=True)
+
+# Все директории загрузок: одинаковые фото в разных директориях не копируются повторно
+UPLOAD_DIRS = (UPLOAD_DIR_ENERGY, UPLOAD_DIR_REVIEW, UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_USER)
 
 def validate_file(file: UploadFile):
     """Валидация загружаемого файла: проверка формата и размера."""
@@ -24,45 +32,170 @@ def validate_file(file: UploadFile):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Файл слишком большой. Максимальный размер: 10 МБ"
         )
+    return ext
+
+def _invalid_image(e: Exception) -> HTTPException:
+    """Ошибка 400 для файла, который не удалось разобрать как изображение."""
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Невалидный файл изображения: {str(e)}"
+    )
+
+def open_image(data: bytes):
+    """
+    Открывает изображение, читая только заголовок (без декодирования),
+    и проверяет его размеры до декодирования — защита от "бомб" с огромным числом пикселей.
+    """
     try:
-        img = Image.open(file.file)
-        img.verify()  # Проверяем, что это валидное изображение
-        file.file.seek(0)  # Сбрасываем указатель файла
-        return ext
+        img = Image.open(io.BytesIO(data))
     except Exception as e:
+        raise _invalid_image(e)
+    width, height = img.size
+    if width > MAX_IMAGE_SIDE or height > MAX_IMAGE_SIDE or width * height > MAX_IMAGE_PIXELS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Невалидный файл изображения: {str(e)}"
+            detail=f"Изображение слишком большое: {width}x{height} пикселей"
         )
+    return img
+
+def _reencode(img: Image.Image, ext: str) -> tuple:
+    """Перекодирует изображение без метаданных (когда вырезать их из файла нельзя). Возвращает (байты, изображение)."""
+    # EXIF не сохраняется, поэтому поворот по ориентации применяется к пикселям
+    img = ImageOps.exif_transpose(img)
+    output = io.BytesIO()
+    
+    if ext in [".jpg", ".jpeg"]:
+        # Сохраняем JPEG без метаданных
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(output, format="JPEG", quality=95, icc_profile=img.info.get("icc_profile"))
+    elif ext in [".heif"]:
+        # Сохраняем HEIC/HEIF без метаданных
+        img.save(output, format="HEIF")
+    else:
+        # Сохраняем PNG без метаданных
+        img.save(output, format="PNG")
+
+    return output.getvalue(), img
 
-async def upload_file(file: UploadFile, upload_dir: str):
-    """Загрузка файла на сервер без конвертации с удалением метаданных."""
+def content_name(content: bytes, ext: str) -> str:
+    """Имя файла по содержимому: SHA-256 сохраняемых байтов и расширение (.jpeg приводится к .jpg)."""
+    ext = ".jpg" if ext == ".jpeg" else ext
+    return f"{hashlib.sha256(content).hexdigest()}{ext}"
+
+def shard_path(upload_dir: str, file_name: str) -> str:
+    """
+    Путь файла в двухуровневой структуре директорий по первым символам имени:
+    uploads/energy/ab/cd/abcd...jpg. В одной директории остается не больше
+    нескольких сотен файлов даже при миллионах загрузок.
+    """
+    return os.path.join(upload_dir, file_name[0:2], file_name[2:4], file_name)
+
+def find_image(upload_dir: str, file_name: str):
+    """
+    Путь существующего файла в директории загрузок: в подкаталогах или, для загруженных
+    до разбиения на подкаталоги, прямо в директории. None, если файла нет.
+    """
+    for path in (shard_path(upload_dir, file_name), os.path.join(upload_dir, file_name)):
+        if storage.exists(path):
+            return path
+    return None
+
+def is_content_name(file_name: str) -> bool:
+    """Назван ли файл (оригинал или вариант) по хэшу содержимого."""
+    digest = file_name.split(".", 1)[0]
+    return len(digest) == 64 and all(char in "0123456789abcdef" for char in digest)
+
+def _save_image(file: UploadFile, ext: str, upload_dir: str) -> str:
+    """
+    Сохраняет оригинал без метаданных и его уменьшенные варианты в WebP за один разбор файла
+    и возвращает путь оригинала. Файл называется по хэшу содержимого: если такое же фото
+    уже загружено в эту директорию, повторно ничего не пишется, а если в другую — оно
+    копируется внутри хранилища (на диске — жесткой ссылкой). JPEG и PNG сохраняются без перекодирования (метаданные
+    вырезаются из байтов), а варианты строятся из JPEG, декодированного сразу в уменьшенном масштабе.
+    Файлы раскладываются по подкаталогам (см. shard_path).
+    """
+    data = file.file.read()
+    img = open_image(data)
+    try:
+        content = strip_metadata(data, img)
+        if content is None:
+            content, img = _reencode(img, ext)
+    except (OSError, SyntaxError, ValueError) as e:
+        # Заголовок прочитался, но сами данные изображения повреждены
+        raise _invalid_image(e)
+    file_name = content_name(content, ext)
+    file_path = shard_path(upload_dir, file_name)
+
+    # Такое фото уже есть: место в хранилище и запись не нужны
+    existing_path = find_image(upload_dir, file_name)
+    if existing_path:
+        return existing_path
+    for other_dir in UPLOAD_DIRS:
+        other_path = find_image(other_dir, file_name) if other_dir != upload_dir else None
+        if other_path:
+            link_image(other_path, file_path)
+            return file_path
+
+    # Пиксели декодируются до записи: ошибка хранилища ниже — это не ошибка файла (500, а не 400)
+    try:
+        variants = render_variants(img)
+    except (OSError, SyntaxError, ValueError) as e:
+        raise _invalid_image(e)
+    try:
+        # Уменьшенные копии для списков и карточек; оригинал появляется последним,
+        # поэтому его наличие означает, что варианты уже записаны
+        store_variants(variants, file_path, cache_control=IMMUTABLE_CACHE_CONTROL)
+        storage.save(
+            file_path, content,
+            content_type=mimetypes.guess_type(file_path)[0],
+            cache_control=IMMUTABLE_CACHE_CONTROL
+        )
+    except Exception:
+        # Не оставляем варианты без оригинала
+        if not storage.exists(file_path):
+            delete_image(file_path)
+        raise
+    return file_path
+
+async def upload_file(file: UploadFile, upload_dir: str, register=None):
+    """
+    Загрузка файла на сервер без конвертации с удалением метаданных.
+    register(path) добавляет фото в индекс загрузок и возвращает False, если файла
+    после этого нет (его удалила очистка): тогда файл записывается заново.
+    """
     ext = validate_file(file)
-    file_name = f"{uuid.uuid4()}{ext}"
-    file_path = os.path.join(upload_dir, file_name)
 
     try:
-        img = Image.open(file.file)
-        output = io.BytesIO()
-        
-        if ext in [".jpg", ".jpeg"]:
-            # Сохраняем JPEG без метаданных
-            img.save(output, format="JPEG", quality=100, exif=b"")
-        elif ext in [".heif"]:
-            # Сохраняем HEIC/HEIF без метаданных
-            img.save(output, format="HEIF")
-        else:
-            # Сохраняем PNG без метаданных
-            img.save(output, format="PNG")
-
-        content = output.getvalue()
-        
-        # Сохраняем файл
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Декодирование и сжатие не блокируют цикл событий
+        file_path = await run_in_threadpool(_save_image, file, ext, upload_dir)
+        if register is not None and not await run_in_threadpool(register, file_path):
+            # Строка индекса уже обновлена, очистка файл больше не тронет
+            file.file.seek(0)
+            file_path = await run_in_threadpool(_save_image, file, ext, upload_dir)
+            await run_in_threadpool(register, file_path)
         return {"image_url": file_path}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при загрузке файла: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+def delete_image(image_path: str):
+    """Удаляет изображение вместе с его вариантами, если они существуют."""
+    if not image_path:
+        return
+    storage.delete([image_path, *variant_paths(image_path)])
+
+def link_image(src_path: str, dst_path: str):
+    """
+    Делает изображение с вариантами доступным по второму пути без передачи байтов
+    через приложение (на диске — жесткая ссылка, в S3 — копирование на стороне хранилища).
+    Исходный файл остается на месте.
+    """
+    for src_variant, dst_variant in zip(variant_paths(src_path), variant_paths(dst_path)):
+        if storage.exists(src_variant):
+            storage.copy(src_variant, dst_variant)
+    storage.copy(src_path, dst_path)
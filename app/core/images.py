@@ -0,0 +1,200 @@
+"""
+Производные изображения (варианты) для загруженных фото.
+
+При загрузке рядом с оригиналом сохраняются уменьшенные копии в WebP
+по корзинам ширины: thumb — для списков и топов, card — для карточек,
+full — для детального просмотра. Имя варианта выводится из пути оригинала
+(uploads/energy/<имя>.jpg -> uploads/energy/<имя>.thumb.webp), поэтому
+хранить варианты в БД не нужно: схемы ответов строят ссылки из image_url.
+
+Метаданные оригинала (EXIF с геопозицией, XMP, IPTC, комментарии) удаляются
+без перекодирования: из файла JPEG или PNG вырезаются соответствующие
+сегменты, а сжатые данные изображения копируются как есть.
+"""
+
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from app.core.storage import storage
+
+# Корзины ширины вариантов, в пикселях (от большей к меньшей)
+IMAGE_VARIANTS = {
+    "full": 1280,
+    "card": 480,
+    "thumb": 160,
+}
+
+# Качество WebP для вариантов
+WEBP_QUALITY = 80
+
+# Тег EXIF с ориентацией снимка
+EXIF_ORIENTATION = 0x0112
+
+# Сегменты JPEG с метаданными: APP1 (EXIF, XMP), APP13 (IPTC), COM (комментарий)
+JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+
+# Чанки PNG с метаданными
+PNG_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+# =============== PATHS ===============
+def variant_path(image_path: str, variant: str) -> str:
+    """Путь варианта изображения: рядом с оригиналом, с суффиксом варианта и расширением .webp."""
+    return f"{os.path.splitext(image_path)[0]}.{variant}.webp"
+
+
+def variant_paths(image_path: str) -> list:
+    """Пути всех вариантов изображения."""
+    return [variant_path(image_path, variant) for variant in IMAGE_VARIANTS]
+
+
+def image_variant_urls(image_url: str):
+    """Ссылки на варианты изображения {thumb, card, full} или None, если изображения нет."""
+    if not image_url:
+        return None
+    return {variant: variant_path(image_url, variant) for variant in reversed(IMAGE_VARIANTS)}
+
+
+def is_variant(path: str) -> bool:
+    """Является ли файл вариантом, а не оригиналом."""
+    stem, ext = os.path.splitext(path)
+    return ext == ".webp" and os.path.splitext(stem)[1][1:] in IMAGE_VARIANTS
+
+
+# =============== METADATA ===============
+def _orientation_segment(orientation: int) -> bytes:
+    """Сегмент APP1 с EXIF, в котором есть только ориентация снимка."""
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = orientation
+    payload = exif.tobytes()
+    return b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+
+
+def _strip_jpeg(data: bytes, orientation: int) -> bytes:
+    """
+    Копирует JPEG без сегментов метаданных. Ориентация сохраняется в новом
+    минимальном EXIF, чтобы снимок не приходилось поворачивать и перекодировать.
+    Данные после конца изображения (дополнительные кадры MPF у телефонов) отбрасываются.
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG stream")
+    parts = [data[:2]]
+    if orientation not in (None, 1):
+        parts.append(_orientation_segment(orientation))
+    pos = 2
+    while True:
+        if data[pos] != 0xFF:
+            raise ValueError("broken JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # байт-заполнитель перед маркером
+            pos += 1
+            continue
+        if marker == 0xDA:  # SOS: дальше сжатые данные до конца изображения
+            end = data.find(b"\xff\xd9", pos)
+            if end < 0:
+                raise ValueError("JPEG without EOI")
+            parts.append(data[pos:end + 2])
+            return b"".join(parts)
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # маркеры без длины
+            parts.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        segment = data[pos:pos + 2 + length]
+        if length < 2 or len(segment) != length + 2:
+            raise ValueError("truncated JPEG segment")
+        is_mpf = marker == 0xE2 and segment[4:8] == b"MPF\x00"
+        if marker not in JPEG_METADATA_MARKERS and not is_mpf:
+            parts.append(segment)
+        pos += length + 2
+
+
+def _strip_png(data: bytes) -> bytes:
+    """Копирует PNG без текстовых чанков, EXIF и времени изменения."""
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("not a PNG stream")
+    parts = [data[:8]]
+    pos = 8
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        chunk_type = data[pos + 4:pos + 8]
+        end = pos + length + 12
+        if end > len(data):
+            raise ValueError("truncated PNG chunk")
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            parts.append(data[pos:end])
+        pos = end
+        if chunk_type == b"IEND":
+            return b"".join(parts)
+    raise ValueError("PNG without IEND")
+
+
+def strip_metadata(data: bytes, img: Image.Image):
+    """
+    Возвращает байты изображения без метаданных, не декодируя его,
+    или None, если для формата это невозможно и нужно перекодирование.
+    img — изображение, открытое из data (используется только его заголовок).
+    """
+    orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    try:
+        if img.format == "JPEG":
+            return _strip_jpeg(data, orientation)
+        if img.format == "PNG" and orientation == 1:
+            return _strip_png(data)
+    except (ValueError, IndexError):
+        return None
+    return None
+
+
+# =============== SAVE ===============
+def prepare_image(img: Image.Image) -> Image.Image:
+    """Поворачивает изображение по EXIF и приводит его к режиму, поддерживаемому WebP."""
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    return img
+
+
+def render_variants(img: Image.Image) -> list:
+    """
+    Строит варианты изображения в WebP: [(вариант, байты)]. Здесь декодируются пиксели,
+    поэтому поврежденные данные изображения обнаруживаются до записи в хранилище.
+    Варианты уменьшаются последовательно от большего к меньшему: каждый следующий
+    строится из предыдущего, а не из полного размера. Изображения меньше корзины не увеличиваются.
+    Если img еще не декодировано, JPEG сразу декодируется в уменьшенном масштабе
+    (draft) — не меньше самой большой корзины по обеим сторонам.
+    """
+    largest = max(IMAGE_VARIANTS.values())
+    img.draft("RGB", (largest, largest))
+    current = prepare_image(img)
+    variants = []
+    for variant, width in IMAGE_VARIANTS.items():
+        if current.width > width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.LANCZOS)
+        output = io.BytesIO()
+        current.save(output, format="WEBP", quality=WEBP_QUALITY, method=4)
+        variants.append((variant, output.getvalue()))
+    return variants
+
+
+def store_variants(variants: list, image_path: str, cache_control: str = None) -> list:
+    """Сохраняет построенные варианты (render_variants) рядом с оригиналом и возвращает их пути."""
+    paths = []
+    for variant, content in variants:
+        path = variant_path(image_path, variant)
+        storage.save(path, content, content_type="image/webp", cache_control=cache_control)
+        paths.append(path)
+    return paths
+
+
+def save_variants(img: Image.Image, image_path: str, cache_control: str = None) -> list:
+    """
+    Сохраняет варианты изображения рядом с оригиналом (в хранилище, см. app.core.storage)
+    и возвращает их пути.
+    """
+    return store_variants(render_variants(img), image_path, cache_control)
@@ -0,0 +1,213 @@
+"""
+Изображения нужного размера по запросу: /media/{kind}/{name}?w=...&fmt=webp.
+
+Уменьшенная копия строится из оригинала в хранилище (app.core.storage) при первом запросе
+в отдельном пуле потоков (MEDIA_RESIZE_WORKERS) и сохраняется в дисковый кэш
+MEDIA_CACHE_DIR на диске узла. Общий размер кэша ограничен MEDIA_CACHE_MAX_BYTES: при
+превышении удаляются копии, к которым дольше всего не обращались (время
+последнего обращения хранится в mtime файла). Ширина округляется вверх
+до ближайшей из MEDIA_WIDTHS, поэтому число копий одного изображения ограничено.
+Если фото хранятся на диске и запрошенная копия совпадает с вариантом,
+сохраненным при загрузке (см. app.core.images), отдается сам вариант.
+"""
+
+import asyncio
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import (
+    UPLOAD_DIR_ENERGY, UPLOAD_DIR_REVIEW, UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_USER,
+    ALLOWED_EXTENSIONS, MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES, MEDIA_WIDTHS, MEDIA_RESIZE_WORKERS,
+)
+from app.core.file_utils import find_image
+from app.core.images import IMAGE_VARIANTS, WEBP_QUALITY, prepare_image, variant_path
+from app.core.storage import storage
+
+# Типы изображений: совпадают с путями /uploads/{kind}
+MEDIA_KINDS = {
+    "energy": UPLOAD_DIR_ENERGY,
+    "reviews": UPLOAD_DIR_REVIEW,
+    "suggestion": UPLOAD_DIR_SUGGESTION,
+    "users": UPLOAD_DIR_USER,
+}
+
+# Форматы выдачи: формат Pillow и тип содержимого
+MEDIA_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+JPEG_QUALITY = 85
+
+# Время последнего обращения обновляется не чаще, чем раз в столько секунд
+TOUCH_INTERVAL = 60
+
+# После вытеснения в кэше остается не больше этой доли от предела
+EVICT_TO_RATIO = 0.9
+
+
+# =============== PARAMS ===============
+def snap_width(width: int) -> int:
+    """Округляет ширину вверх до ближайшей разрешенной (больше максимальной — до максимальной)."""
+    for allowed in MEDIA_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return MEDIA_WIDTHS[-1]
+
+
+def source_path(kind: str, name: str):
+    """Путь оригинала в UPLOAD_DIR_* (в подкаталогах или прямо в директории) или None, если его нет."""
+    directory = MEDIA_KINDS.get(kind)
+    if directory is None or name != os.path.basename(name) or name.startswith("."):
+        return None
+    if os.path.splitext(name)[1].lower() not in ALLOWED_EXTENSIONS:
+        return None
+    return find_image(directory, name)
+
+
+# =============== DISK CACHE ===============
+class DiskLRUCache:
+    """
+    Дисковый кэш файлов с вытеснением давно не использованных по суммарному размеру.
+    Текущий размер считается приблизительно (каждый процесс видит только свои записи)
+    и уточняется полным обходом директории при каждом вытеснении.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def path(self, *parts) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def get(self, path: str) -> bool:
+        """Есть ли файл в кэше; отмечает обращение к нему."""
+        try:
+            modified = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        now = time.time()
+        if now - modified > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:  # файл вытеснен другим процессом
+                return False
+        return True
+
+    def put(self, path: str, data: bytes):
+        """Атомарно записывает файл в кэш и вытесняет старые записи при превышении предела."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict(keep=path)
+
+    def _entries(self) -> list:
+        """Все файлы кэша: (время обращения, размер, путь)."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self, keep: str = None):
+        """Удаляет давно не использованные файлы; только что записанный файл keep не удаляется."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * EVICT_TO_RATIO
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+# Единственный экземпляр на процесс
+media_cache = DiskLRUCache(MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_BYTES)
+
+# Пул потоков для уменьшения: Pillow отпускает GIL при декодировании и масштабировании
+_resize_pool = ThreadPoolExecutor(max_workers=MEDIA_RESIZE_WORKERS, thread_name_prefix="media-resize")
+
+# Копии, которые строятся прямо сейчас: одинаковые запросы ждут одну задачу
+_in_progress = {}
+_in_progress_lock = threading.Lock()
+
+
+# =============== RESIZE ===============
+def _render(source: str, target: str, width: int, fmt: str) -> str:
+    """Строит уменьшенную копию оригинала и кладет ее в кэш."""
+    pil_format, _ = MEDIA_FORMATS[fmt]
+    with storage.open(source) as file, Image.open(file) as img:
+        # JPEG декодируется сразу в уменьшенном масштабе (не меньше width по обеим сторонам)
+        img.draft("RGB", (width, width))
+        img = prepare_image(img)
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        output = io.BytesIO()
+        if pil_format == "JPEG":
+            img.convert("RGB").save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            img.save(output, format="WEBP", quality=WEBP_QUALITY, method=4)
+    media_cache.put(target, output.getvalue())
+    return target
+
+
+def _submit(source: str, target: str, width: int, fmt: str):
+    with _in_progress_lock:
+        future = _in_progress.get(target)
+        if future is None:
+            future = _in_progress[target] = _resize_pool.submit(_render, source, target, width, fmt)
+            future.add_done_callback(lambda _: _in_progress.pop(target, None))
+        return future
+
+
+async def get_media(kind: str, name: str, width: int, fmt: str):
+    """
+    Возвращает путь к копии изображения нужной ширины и формата или None,
+    если оригинал не найден. Копия строится в пуле потоков, если ее еще нет в кэше.
+    """
+    # Проверка в хранилище может быть сетевым запросом (S3), поэтому выполняется вне цикла событий
+    source = await run_in_threadpool(source_path, kind, name)
+    # Оригинал проверяется всегда: копии удаленного фото не отдаются, даже если остались в кэше
+    if source is None:
+        return None
+    width = snap_width(width)
+
+    # Вариант, сохраненный при загрузке, подходит без пересчета
+    if fmt == "webp" and storage.serves_locally:
+        for variant, variant_width in IMAGE_VARIANTS.items():
+            if variant_width == width and os.path.isfile(variant_path(source, variant)):
+                return variant_path(source, variant)
+
+    target = media_cache.path(kind, f"{os.path.splitext(name)[0]}.w{width}.{fmt}")
+    if media_cache.get(target):
+        return target
+    return await asyncio.wrap_future(_submit(source, target, width, fmt))
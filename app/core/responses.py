@@ -0,0 +1,304 @@
+"""
+Быстрая выдача JSON-ответов.
+
+FastJSONResponse кодирует ответы через orjson (если установлен, иначе
+стандартным json) и используется приложением по умолчанию.
+
+Для списков, которые сервисы собирают сами (топы, справочники), есть
+"доверенный" путь cached_json: данные раскладываются по полям схемы
+без повторной валидации pydantic, а готовые байты ответа кэшируются
+по ETag (см. app.core.etag). Пока версии данных не изменились,
+повторный запрос не выполняет ни запросов к БД, ни сериализации.
+Там же строится компактный колоночный формат (format=columnar) и выборка полей (fields=).
+Вместе с байтами ответа в кэше хранятся их сжатые варианты (gzip, br),
+поэтому сжатие выполняется один раз на запись кэша, а не на каждый запрос.
+Кэш свой у каждого процесса uvicorn, его размер ограничен RESPONSE_CACHE_SIZE.
+Записи живут не дольше RESPONSE_CACHE_TTL секунд: топ в памяти и снимок топа
+других процессов догоняют изменения с задержкой, и ответ, собранный
+из них сразу после изменения, не должен жить до следующей смены версии.
+"""
+
+import json
+import threading
+import time
+import typing
+from collections import OrderedDict
+from types import SimpleNamespace
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+from app.core.compression import choose_encoding, compress
+from app.core.config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, COMPRESSION_MIN_SIZE
+
+try:
+    import orjson
+except ImportError:  # orjson необязательный, без него используется стандартный json
+    orjson = None
+
+
+# =============== ENCODING ===============
+def _default(value):
+    """Типы, которые JSON-кодировщики не умеют сериализовать сами."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Кодирует данные в JSON-байты в том же виде, что и FastAPI (UTF-8, без пробелов)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ, закодированный через orjson (или стандартный json без него)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# =============== TRUSTED DUMP ===============
+def _dump_decimal(value):
+    # pydantic сериализует Decimal строкой, а float приводит к Decimal через str
+    if isinstance(value, float):
+        value = Decimal(str(value))
+    return str(value)
+
+
+def _dump_as_is(value):
+    return value
+
+
+@lru_cache(maxsize=None)
+def _converter(annotation):
+    """
+    Строит функцию, раскладывающую значение по аннотации схемы в простые типы JSON.
+    Функции кэшируются, поэтому поля схемы разбираются один раз за процесс.
+    """
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _converter(args[0])
+    if origin in (list, typing.List):
+        item = _converter(args[0]) if args else _dump_as_is
+        return lambda value: None if value is None else [item(element) for element in value]
+    if origin is typing.Union:
+        variants = [arg for arg in args if arg is not type(None)]
+        # Для Optional[X] используется X; другие объединения отдаются как есть
+        return _converter(variants[0]) if len(variants) == 1 else _dump_as_is
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _model_converter(annotation)
+    if annotation is Decimal:
+        return lambda value: None if value is None else _dump_decimal(value)
+    return _dump_as_is
+
+
+def _model_converter(model):
+    fields = []
+    for name, field in model.model_fields.items():
+        default = None if field.default is PydanticUndefined else field.default
+        fields.append((name, _converter(field.annotation), default))
+    # Вычисляемые поля (например, image_variants) считаются по уже разложенным полям
+    computed = [
+        (name, info.wrapped_property.fget, _converter(info.return_type))
+        for name, info in model.model_computed_fields.items()
+    ]
+
+    def convert(value):
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            result = {name: dump(value.get(name, default)) for name, dump, default in fields}
+        else:
+            result = {name: dump(getattr(value, name, default)) for name, dump, default in fields}
+        if computed:
+            view = SimpleNamespace(**result)
+            for name, getter, dump in computed:
+                result[name] = dump(getter(view))
+        return result
+
+    return convert
+
+
+def trusted_dump(schema, data):
+    """
+    Раскладывает данные (словари или ORM-объекты) по полям схемы без валидации.
+    Используется только для данных, которые собрали наши сервисы.
+    """
+    return _converter(schema)(data)
+
+
+# =============== COLUMNAR FORMAT ===============
+def _field_annotations(model) -> dict:
+    """Аннотации обычных и вычисляемых полей модели в порядке выдачи."""
+    annotations = {name: field.annotation for name, field in model.model_fields.items()}
+    annotations.update({name: info.return_type for name, info in model.model_computed_fields.items()})
+    return annotations
+
+
+def _nested_model(annotation):
+    """Модель вложенного объекта поля (brand, category) или None для простых полей."""
+    if typing.get_origin(annotation) is typing.Union:
+        variants = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        annotation = variants[0] if len(variants) == 1 else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel) and "id" in annotation.model_fields:
+        return annotation
+    return None
+
+
+def parse_fields(fields: str, model) -> list:
+    """
+    Разбирает список полей вида "name,average_rating" для выборочной выдачи.
+    Поле id добавляется всегда. Неизвестные поля — ошибка ValueError.
+    """
+    result = ["id"]
+    for name in fields.split(","):
+        name = name.strip()
+        if not name or name in result:
+            continue
+        if name not in _field_annotations(model):
+            raise ValueError(f"Неизвестное поле '{name}'")
+        result.append(name)
+    return result
+
+
+def response_shape(model, format: str = None, fields: str = None):
+    """
+    Возвращает функцию, приводящую разложенные строки модели model к запрошенному виду,
+    или None, если нужен обычный ответ.
+    format="columnar" — параллельные массивы по полям вместо списка объектов:
+    {"count": n, "columns": {"id": [...], "brand": [id, ...]}, "refs": {"brand": {id: {...}}}}.
+    Вложенные объекты с id (бренд, категория) заменяются на id, а сами объекты
+    один раз попадают в словарь refs. fields — выборочная выдача полей в любом формате.
+    Ответ вида {"items": [...], ...} (топ с фасетами) преобразуется только в items.
+    """
+    if format not in (None, "rows", "columnar"):
+        raise ValueError("Параметр format может быть rows или columnar")
+    annotations = _field_annotations(model)
+    selected = parse_fields(fields, model) if fields else list(annotations)
+    columnar = format == "columnar"
+    if not columnar and not fields:
+        return None
+    nested = {name for name in selected if _nested_model(annotations[name])}
+
+    def shape_rows(rows):
+        if not columnar:
+            return [{name: row[name] for name in selected} for row in rows]
+        columns = {name: [] for name in selected}
+        refs = {name: {} for name in nested}
+        for row in rows:
+            for name in selected:
+                value = row[name]
+                if name in nested and value is not None:
+                    refs[name].setdefault(value["id"], value)
+                    value = value["id"]
+                columns[name].append(value)
+        return {"count": len(rows), "columns": columns, "refs": refs}
+
+    def shape(payload):
+        if isinstance(payload, dict):
+            return {**payload, "items": shape_rows(payload["items"])}
+        return shape_rows(payload)
+
+    return shape
+
+
+# =============== RESPONSE CACHE ===============
+class CachedBody:
+    """Готовые байты ответа и их сжатые варианты, которые создаются при первом запросе."""
+
+    __slots__ = ("body", "variants")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.variants = {}
+
+    def encoded(self, encoding: str):
+        """Возвращает (байты, Content-Encoding) для выбранного клиентом сжатия."""
+        if encoding is None or len(self.body) < COMPRESSION_MIN_SIZE:
+            return self.body, None
+        body = self.variants.get(encoding)
+        if body is None:
+            body = self.variants[encoding] = compress(self.body, encoding, cached=True)
+        return body, encoding
+
+
+class ResponseCache:
+    """LRU-кэш готовых ответов (CachedBody) по ключу (путь, параметры запроса, ETag)."""
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return cached
+
+    def set(self, key, cached: CachedBody):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (cached, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Единственный экземпляр на процесс
+response_cache = ResponseCache()
+
+
+def cached_json(request: Request, schema, build, shape=None) -> Response:
+    """
+    Возвращает JSON-ответ по схеме schema из данных build() без повторной валидации.
+    shape — необязательное преобразование разложенных данных (см. response_shape).
+    Если для маршрута вычислен ETag (зависимость conditional_get), байты ответа
+    кэшируются, и повторный запрос с теми же параметрами и версиями данных
+    не вызывает build() вовсе. Закэшированный ответ сразу отдается в сжатом виде,
+    если клиент его принимает; несжатые ответы сжимает CompressionMiddleware.
+    """
+    etag = getattr(request.state, "etag", None)
+    headers = dict(getattr(request.state, "etag_headers", None) or {})
+    key = (request.url.path, str(request.query_params), etag) if etag else None
+
+    cached = response_cache.get(key) if key else None
+    if cached is None:
+        payload = trusted_dump(schema, build())
+        body = dumps(shape(payload) if shape else payload)
+        if not key:
+            return Response(content=body, media_type="application/json", headers=headers)
+        cached = CachedBody(body)
+        response_cache.set(key, cached)
+
+    body, encoding = cached.encoded(choose_encoding(request.headers.get("accept-encoding")))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if len(cached.body) >= COMPRESSION_MIN_SIZE:
+        headers["Vary"] = ", ".join(filter(None, [headers.get("Vary"), "Accept-Encoding"]))
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,160 @@
+"""
+Раздача загруженных фото из UPLOAD_DIR_*.
+
+При хранении на диске (STORAGE_BACKEND=local) файлы отдает UploadStaticFiles.
+Файлы, названные по хэшу содержимого (см. app.core.file_utils), по одному
+адресу никогда не меняются, поэтому отдаются с неизменяемыми заголовками
+кэширования. Для старых файлов со случайными именами заголовки обычные:
+их варианты могут быть перестроены под тем же именем (build_image_variants --force).
+
+При хранении в S3 байты через приложение не проходят: UploadRedirect
+перенаправляет клиента на ссылку хранилища (см. Storage.url).
+
+Новые файлы лежат в подкаталогах (uploads/energy/ab/cd/<имя>, см. shard_path),
+но старые ссылки без подкаталогов (/uploads/energy/<имя>) продолжают работать:
+если файла нет прямо в директории, он ищется в подкаталоге по имени.
+
+Файлы с диска (и копии /media) отдает MediaFileResponse: поддерживаются
+запросы диапазонов (Range) и условные запросы (If-None-Match, If-Modified-Since → 304).
+Если задан MEDIA_ACCEL_REDIRECT, приложение отвечает только заголовками с X-Accel-Redirect,
+а файл (вместе с Range и sendfile) отдает nginx из внутреннего location.
+"""
+
+import os
+import posixpath
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette._utils import get_route_path
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+
+from app.core.config import S3_URL_EXPIRES, MEDIA_ACCEL_REDIRECT
+from app.core.file_utils import is_content_name, shard_path
+from app.core.storage import storage, IMMUTABLE_CACHE_CONTROL
+
+
+# =============== FILE RESPONSE ===============
+def accel_redirect_path(path: str):
+    """Внутренний адрес файла для X-Accel-Redirect или None, если выключено или файл вне рабочей директории."""
+    if not MEDIA_ACCEL_REDIRECT:
+        return None
+    relative_path = os.path.relpath(path)
+    if relative_path.startswith(".."):
+        return None
+    return quote(f"{MEDIA_ACCEL_REDIRECT}/{relative_path.replace(os.sep, '/')}")
+
+
+class MediaFileResponse(FileResponse):
+    """
+    FileResponse для фото: отдача через X-Accel-Redirect, если он включен,
+    иначе чтение файла крупными блоками.
+    """
+
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope, receive, send):
+        accel_path = accel_redirect_path(self.path)
+        if accel_path is None:
+            await super().__call__(scope, receive, send)
+            return
+        # Тело, диапазоны и sendfile — на стороне nginx; длина ответа приложения нулевая
+        headers = [
+            (name, value) for name, value in self.raw_headers
+            if name not in (b"content-length", b"accept-ranges")
+        ]
+        headers += [(b"content-length", b"0"), (b"x-accel-redirect", accel_path.encode("latin-1"))]
+        await send({"type": "http.response.start", "status": self.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def is_not_modified(response_headers, request_headers) -> bool:
+    """Можно ли ответить 304: If-None-Match проверяется первым, If-Modified-Since — только без него."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or response_headers.get("etag") in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def file_response(path: str, request_headers, stat_result=None, media_type: str = None,
+                  immutable: bool = False, status_code: int = 200) -> Response:
+    """
+    Ответ с файлом с диска или 304, если у клиента уже есть актуальная копия.
+    immutable — содержимое по этому адресу никогда не меняется: ответ кэшируется
+    без срока, а ETag — имя файла, одинаковое на всех узлах и для жестких ссылок.
+    """
+    if stat_result is None:
+        stat_result = os.stat(path)
+    headers = {}
+    if immutable:
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        headers["ETag"] = f'"{os.path.basename(path)}"'
+    response = MediaFileResponse(
+        path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result
+    )
+    if is_not_modified(response.headers, request_headers):
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+# =============== UPLOADS ===============
+class UploadStaticFiles(StaticFiles):
+    """StaticFiles с кэшированием без срока для имен по хэшу содержимого и поиском старых путей в подкаталогах."""
+
+    def lookup_path(self, path: str):
+        full_path, stat_result = super().lookup_path(path)
+        # Старый путь без подкаталогов: файл мог быть перенесен командой migrate_upload_layout
+        if stat_result is None and path and os.path.dirname(path) == "":
+            full_path, stat_result = super().lookup_path(shard_path("", path))
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        return file_response(
+            full_path,
+            Headers(scope=scope),
+            stat_result=stat_result,
+            immutable=is_content_name(os.path.basename(full_path)),
+            status_code=status_code,
+        )
+
+
+class UploadRedirect:
+    """ASGI-приложение: перенаправляет запрос файла на его ссылку во внешнем хранилище."""
+
+    def __init__(self, directory: str):
+        self.directory = posixpath.normpath(directory)
+
+    async def __call__(self, scope, receive, send):
+        path = posixpath.normpath(get_route_path(scope).lstrip("/"))
+        if scope["method"] not in ("GET", "HEAD") or path in (".", "") or path.startswith(".."):
+            await Response(status_code=404)(scope, receive, send)
+            return
+        key = posixpath.join(self.directory, path)
+        # Старый путь без подкаталогов: после переноса файл лежит в подкаталоге
+        if "/" not in path and not await run_in_threadpool(storage.exists, key):
+            key = shard_path(self.directory, path)
+        # Подписанная ссылка действует S3_URL_EXPIRES секунд, перенаправление кэшируется на половину срока
+        response = RedirectResponse(
+            storage.url(key),
+            status_code=307,
+            headers={"Cache-Control": f"public, max-age={S3_URL_EXPIRES // 2}"},
+        )
+        await response(scope, receive, send)
+
+
+def upload_files(directory: str):
+    """Приложение для раздачи директории загрузок в зависимости от хранилища."""
+    if storage.serves_locally:
+        return UploadStaticFiles(directory=directory)
+    return UploadRedirect(directory)
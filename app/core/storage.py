@@ -0,0 +1,270 @@
+"""
+Хранилище загруженных фото.
+
+Ключ файла — тот же путь, что хранится в image_url (uploads/energy/ab/cd/<имя>.jpg),
+поэтому записи в БД не зависят от выбранного хранилища, а переход между ними —
+это перенос файлов с сохранением путей.
+
+LocalStorage держит файлы на диске узла, /uploads/... отдаются через StaticFiles.
+S3Storage держит файлы в бакете S3-совместимого хранилища (AWS S3, MinIO):
+байты фото через API не проходят, /uploads/... перенаправляет клиента
+на подписанную ссылку (или на публичный адрес, если задан S3_PUBLIC_URL),
+поэтому узлы API взаимозаменяемы. Хранилище выбирается STORAGE_BACKEND.
+"""
+
+import abc
+import io
+import os
+import posixpath
+import shutil
+import uuid
+
+from app.core.config import (
+    STORAGE_BACKEND, S3_BUCKET, S3_ENDPOINT_URL, S3_REGION, S3_ACCESS_KEY, S3_SECRET_KEY,
+    S3_PUBLIC_URL, S3_URL_EXPIRES, S3_MULTIPART_THRESHOLD, S3_MULTIPART_CHUNK_SIZE,
+)
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 нужен только для STORAGE_BACKEND=s3
+    boto3 = None
+
+# Заголовок кэширования для файлов, содержимое которых по адресу не меняется
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Размер блока при потоковом копировании
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+# =============== INTERFACE ===============
+class Storage(abc.ABC):
+    """
+    Интерфейс хранилища файлов. Все методы принимают ключи вида uploads/<тип>/...
+    Хранилище, не реализующее какой-либо метод, не создается (TypeError).
+    """
+
+    # Файлы лежат на диске этого узла и отдаются через StaticFiles
+    serves_locally = False
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        """Есть ли файл в хранилище."""
+
+    @abc.abstractmethod
+    def stat(self, key: str):
+        """(размер, время изменения) файла или None, если его нет."""
+
+    @abc.abstractmethod
+    def open(self, key: str):
+        """Открывает файл для чтения (объект поддерживает seek). FileNotFoundError, если файла нет."""
+
+    @abc.abstractmethod
+    def save(self, key: str, data, content_type: str = None, cache_control: str = None):
+        """
+        Сохраняет файл целиком: другие запросы не видят его недописанным.
+        data — байты или файловый объект, который читается потоково.
+        """
+
+    @abc.abstractmethod
+    def copy(self, src_key: str, dst_key: str):
+        """Копирует файл внутри хранилища, не пропуская байты через приложение, если это возможно."""
+
+    @abc.abstractmethod
+    def delete(self, keys):
+        """Удаляет файлы; отсутствующие файлы пропускаются."""
+
+    @abc.abstractmethod
+    def url(self, key: str) -> str:
+        """Ссылка, по которой клиент получает файл напрямую из хранилища."""
+
+    @abc.abstractmethod
+    def iter_files(self, prefix: str):
+        """Перебирает файлы с ключом, начинающимся с prefix: (ключ, размер, время изменения)."""
+
+
+# =============== LOCAL ===============
+class LocalStorage(Storage):
+    """Файлы на диске узла; ключ — путь относительно рабочей директории."""
+
+    serves_locally = True
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(key)
+
+    def stat(self, key: str):
+        try:
+            stat = os.stat(key)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def open(self, key: str):
+        return open(key, "rb")
+
+    def save(self, key: str, data, content_type: str = None, cache_control: str = None):
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        temp_path = f"{key}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f, COPY_CHUNK_SIZE)
+        os.replace(temp_path, key)
+
+    def copy(self, src_key: str, dst_key: str):
+        # Жесткая ссылка вместо копии: одинаковые фото занимают место один раз
+        os.makedirs(os.path.dirname(dst_key), exist_ok=True)
+        try:
+            os.link(src_key, dst_key)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Другая файловая система или ссылки не поддерживаются
+            shutil.copyfile(src_key, dst_key)
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(key)
+            except FileNotFoundError:
+                pass
+
+    def url(self, key: str) -> str:
+        return "/" + posixpath.normpath(key).lstrip("/")
+
+    def iter_files(self, prefix: str):
+        for root, _, files in os.walk(prefix):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+
+# =============== S3 ===============
+class S3Storage(Storage):
+    """
+    Файлы в бакете S3-совместимого хранилища. Большие файлы загружаются
+    по частям (multipart) потоково, копирование выполняется на стороне хранилища.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, region: str = None,
+                 access_key: str = None, secret_key: str = None,
+                 public_url: str = "", url_expires: int = S3_URL_EXPIRES):
+        if boto3 is None:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 нужен пакет boto3")
+        if not bucket:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 нужно указать S3_BUCKET")
+        self.bucket = bucket
+        self.public_url = public_url
+        self.url_expires = url_expires
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            # Свои хранилища (MinIO) обычно доступны только по адресам вида host/bucket/key
+            config=BotoConfig(
+                signature_version="s3v4",
+                s3={"addressing_style": "path" if endpoint_url else "auto"},
+            ),
+        )
+        self.transfer = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+        )
+
+    @staticmethod
+    def _key(key: str) -> str:
+        # uploads/reviews//x.jpg и ./uploads/... — один и тот же объект
+        return posixpath.normpath(key).lstrip("/")
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def stat(self, key: str):
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["ContentLength"], response["LastModified"].timestamp()
+
+    def open(self, key: str):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(key)
+            raise
+        # Pillow читает файл с перемещениями, поэтому тело загружается в память
+        return io.BytesIO(response["Body"].read())
+
+    def save(self, key: str, data, content_type: str = None, cache_control: str = None):
+        if isinstance(data, (bytes, bytearray)):
+            data = io.BytesIO(data)
+        extra_args = {}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        if cache_control:
+            extra_args["CacheControl"] = cache_control
+        self.client.upload_fileobj(
+            data, self.bucket, self._key(key), ExtraArgs=extra_args, Config=self.transfer
+        )
+
+    def copy(self, src_key: str, dst_key: str):
+        self.client.copy(
+            {"Bucket": self.bucket, "Key": self._key(src_key)},
+            self.bucket, self._key(dst_key), Config=self.transfer
+        )
+
+    def delete(self, keys):
+        keys = [self._key(key) for key in keys]
+        # За один запрос удаляется не больше 1000 объектов
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True},
+            )
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{self._key(key)}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=self.url_expires,
+        )
+
+    def iter_files(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix) + "/"):
+            for item in page.get("Contents", []):
+                yield item["Key"], item["Size"], item["LastModified"].timestamp()
+
+
+# =============== FACTORY ===============
+def _create_storage() -> Storage:
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(
+            S3_BUCKET,
+            endpoint_url=S3_ENDPOINT_URL,
+            region=S3_REGION,
+            access_key=S3_ACCESS_KEY,
+            secret_key=S3_SECRET_KEY,
+            public_url=S3_PUBLIC_URL,
+        )
+    if STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Неизвестное хранилище STORAGE_BACKEND={STORAGE_BACKEND}")
+    return LocalStorage()
+
+
+# Единственный экземпляр на процесс
+storage = _create_storage()
@@ -10,4 +10,12 @@ from .suggestion import Suggestion
 from .review import Review
 from .rating import Rating
 from .blacklist import Blacklist
-from .user_role import UserRole
\ No newline at end of file
+from .user_role import UserRole
+from .energy_criteria_stat import EnergyCriteriaStat
+from .energy_rating_bucket import EnergyRatingBucket
+from .energy_similarity import EnergySimilarity
+from .energy_trend_bucket import EnergyTrendBucket
+from .energy_rank_history import EnergyRankHistory
+from .catalog_tombstone import CatalogTombstone
+from .data_version import DataVersion
+from .stored_image import StoredImage
\ No newline at end of file
@@ -0,0 +1,29 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, Integer, BigInteger, String, Index
+# Импортируем time для работы с временными метками
+import time
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+from app.db.models.catalog_version import catalog_version_seq
+
+# Определяем класс модели CatalogTombstone
+# Запись об удалении строки каталога, чтобы клиенты синхронизации удалили ее у себя
+class CatalogTombstone(Base):
+    # Указываем имя таблицы
+    __tablename__ = "catalog_tombstones"
+    # Индекс для выборки удалений после версии клиента
+    __table_args__ = (
+        Index("ix_catalog_tombstones_version", "version"),
+    )
+
+    # Определяем поле id как первичный ключ
+    id = Column(Integer, primary_key=True)
+    # Тип удаленной сущности: energy, brand или category
+    entity = Column(String(20), nullable=False)
+    # ID удаленной строки
+    entity_id = Column(Integer, nullable=False)
+    # Версия удаления из общей последовательности каталога
+    version = Column(BigInteger, nullable=False, server_default=catalog_version_seq.next_value())
+    # Время удаления (Unix timestamp в секундах)
+    deleted_at = Column(BigInteger, default=lambda: int(time.time()))
@@ -0,0 +1,31 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, BigInteger, Sequence
+# Импортируем time для работы с временными метками
+import time
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Общая последовательность версий каталога (категории, бренды, энергетики и их удаления).
+# Каждая вставка или изменение строки получает новое значение, по нему работает /sync?since=
+catalog_version_seq = Sequence("catalog_version_seq", metadata=Base.metadata)
+
+
+# Поле версии строки: заполняется последовательностью при вставке и при каждом изменении
+def version_column():
+    return Column(
+        BigInteger,
+        nullable=False,
+        index=True,
+        server_default=catalog_version_seq.next_value(),
+        onupdate=catalog_version_seq.next_value(),
+    )
+
+
+# Поле времени последнего изменения (Unix timestamp в секундах)
+def updated_at_column():
+    return Column(
+        BigInteger,
+        nullable=True,
+        default=lambda: int(time.time()),
+        onupdate=lambda: int(time.time()),
+    )
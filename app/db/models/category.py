@@ -4,6 +4,8 @@ from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
 # Импортируем базовый класс
 from app.db.models.base import Base
+# Импортируем поля отслеживания изменений каталога
+from app.db.models.catalog_version import version_column, updated_at_column
 
 # Определяем класс модели Category
 class Category(Base):
@@ -14,6 +16,10 @@ class Category(Base):
     id = Column(Integer, primary_key=True, index=True)
     # Определяем поле name как уникальное строковое
     name = Column(String(100), unique=True, nullable=False)
+    # Версия строки для синхронизации каталога
+    version = version_column()
+    # Время последнего изменения
+    updated_at = updated_at_column()
 
     # Связь: одна категория -> много энергетиков
     energies = relationship("Energy", back_populates="category")
@@ -0,0 +1,17 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, String, BigInteger
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели DataVersion
+# Счетчик изменений группы данных (energies, brands, reviews, ...), увеличивается сервисами при записи.
+# По счетчикам строятся ETag ответов, поэтому они общие для всех процессов и хранятся в БД
+class DataVersion(Base):
+    # Указываем имя таблицы
+    __tablename__ = "data_versions"
+
+    # Название группы данных
+    name = Column(String(50), primary_key=True)
+    # Номер версии, растет при каждом изменении
+    version = Column(BigInteger, nullable=False, default=0)
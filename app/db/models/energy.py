@@ -4,6 +4,8 @@ from sqlalchemy import Column, Integer, String, ForeignKey, Text
 from sqlalchemy.orm import relationship
 # Импортируем базовый класс
 from app.db.models.base import Base
+# Импортируем поля отслеживания изменений каталога
+from app.db.models.catalog_version import version_column, updated_at_column
 
 # Определяем класс модели Energy
 class Energy(Base):
@@ -23,11 +25,30 @@ class Energy(Base):
     # Определяем поле ingredients как текстовое
     ingredients = Column(Text, nullable=True)
     # Определяем поле image_url как строковое
-    image_url = Column(String(255), nullable=True)
+    image_url = Column(String(255), nullable=True, index=True)
+    # Версия строки для синхронизации каталога
+    version = version_column()
+    # Время последнего изменения
+    updated_at = updated_at_column()
 
     # Определяем связь с брендом
     brand = relationship("Brand", back_populates="energies")
     # Определяем связь с категорией
     category = relationship("Category", back_populates="energies")
     # Определяем связь один-ко-многим с отзывами
-    reviews = relationship("Review", back_populates="energy", cascade="all, delete-orphan")
\ No newline at end of file
+    reviews = relationship("Review", back_populates="energy", cascade="all, delete-orphan")
+    # Определяем связь с агрегатами оценок по критериям
+    criteria_stats = relationship("EnergyCriteriaStat", back_populates="energy", cascade="all, delete-orphan")
+    # Определяем связь с корзинами гистограммы оценок
+    rating_buckets = relationship("EnergyRatingBucket", back_populates="energy", cascade="all, delete-orphan")
+    # Определяем связь со счетчиками трендов по часам
+    trend_buckets = relationship("EnergyTrendBucket", back_populates="energy", cascade="all, delete-orphan")
+    # Определяем связь с дневной историей мест в топе
+    rank_history = relationship("EnergyRankHistory", back_populates="energy", cascade="all, delete-orphan")
+    # Определяем связь с предрасчитанными похожими энергетиками
+    similarities = relationship(
+        "EnergySimilarity",
+        foreign_keys="EnergySimilarity.energy_id",
+        back_populates="energy",
+        cascade="all, delete-orphan"
+    )
\ No newline at end of file
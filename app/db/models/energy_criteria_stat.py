@@ -0,0 +1,39 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, Integer, ForeignKey, Numeric, Index
+# Импортируем relationship для определения связей
+from sqlalchemy.orm import relationship
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели EnergyCriteriaStat
+# Агрегаты оценок энергетика по одному критерию, обновляются инкрементально при записи оценок
+class EnergyCriteriaStat(Base):
+    # Указываем имя таблицы
+    __tablename__ = "energy_criteria_stats"
+    # Индекс для топа по одному критерию: фильтр по критерию и сортировка по средней оценке
+    __table_args__ = (
+        Index(
+            "ix_energy_criteria_stats_criteria_rating",
+            "criteria_id",
+            "rating_avg",
+            "rating_count",
+            "energy_id",
+        ),
+    )
+
+    # Определяем поле energy_id как часть составного первичного ключа
+    energy_id = Column(Integer, ForeignKey("energetics.id", ondelete="CASCADE"), primary_key=True)
+    # Определяем поле criteria_id как часть составного первичного ключа
+    criteria_id = Column(Integer, ForeignKey("criteria.id", ondelete="CASCADE"), primary_key=True)
+    # Сумма всех оценок по критерию
+    rating_sum = Column(Numeric(12, 1), nullable=False, default=0)
+    # Количество оценок по критерию
+    rating_count = Column(Integer, nullable=False, default=0)
+    # Средняя оценка по критерию (4 знака после запятой), хранится для сортировки без пересчета
+    rating_avg = Column(Numeric(6, 4), nullable=False, default=0)
+
+    # Определяем связь с энергетиком
+    energy = relationship("Energy", back_populates="criteria_stats")
+    # Определяем связь с критерием
+    criteria = relationship("Criteria")
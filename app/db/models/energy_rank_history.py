@@ -0,0 +1,31 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, Integer, Date, ForeignKey, Numeric, Index
+# Импортируем relationship для определения связей
+from sqlalchemy.orm import relationship
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели EnergyRankHistory
+# Дневной снимок места энергетика в общем топе, строки только добавляются
+class EnergyRankHistory(Base):
+    # Указываем имя таблицы
+    __tablename__ = "energy_rank_history"
+    # Индекс для выборки всех мест за дату (изменение места в топе)
+    __table_args__ = (
+        Index("ix_energy_rank_history_snapshot_date", "snapshot_date"),
+    )
+
+    # Определяем поле energy_id как часть составного первичного ключа
+    energy_id = Column(Integer, ForeignKey("energetics.id", ondelete="CASCADE"), primary_key=True)
+    # Дата снимка (UTC), часть составного первичного ключа
+    snapshot_date = Column(Date, primary_key=True)
+    # Абсолютное место в общем топе на дату снимка
+    absolute_rank = Column(Integer, nullable=False)
+    # Средний рейтинг на дату снимка
+    average_rating = Column(Numeric(6, 4), nullable=False)
+    # Количество отзывов на дату снимка
+    review_count = Column(Integer, nullable=False)
+
+    # Определяем связь с энергетиком
+    energy = relationship("Energy", back_populates="rank_history")
@@ -0,0 +1,25 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, Integer, SmallInteger, ForeignKey
+# Импортируем relationship для определения связей
+from sqlalchemy.orm import relationship
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели EnergyRatingBucket
+# Одна корзина гистограммы оценок энергетика по критерию (bucket 0 = [0, 1), ..., 9 = [9, 10])
+class EnergyRatingBucket(Base):
+    # Указываем имя таблицы
+    __tablename__ = "energy_rating_buckets"
+
+    # Определяем поле energy_id как часть составного первичного ключа
+    energy_id = Column(Integer, ForeignKey("energetics.id", ondelete="CASCADE"), primary_key=True)
+    # Определяем поле criteria_id как часть составного первичного ключа
+    criteria_id = Column(Integer, ForeignKey("criteria.id", ondelete="CASCADE"), primary_key=True)
+    # Номер корзины гистограммы
+    bucket = Column(SmallInteger, primary_key=True)
+    # Количество оценок, попавших в корзину
+    count = Column(Integer, nullable=False, default=0)
+
+    # Определяем связь с энергетиком
+    energy = relationship("Energy", back_populates="rating_buckets")
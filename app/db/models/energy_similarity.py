@@ -0,0 +1,27 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, Integer, ForeignKey, SmallInteger, Float
+# Импортируем relationship для определения связей
+from sqlalchemy.orm import relationship
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели EnergySimilarity
+# Предрасчитанные похожие энергетики, заполняется пакетной задачей build_similar_energies
+class EnergySimilarity(Base):
+    # Указываем имя таблицы
+    __tablename__ = "energy_similarities"
+
+    # Определяем поле energy_id как часть составного первичного ключа
+    energy_id = Column(Integer, ForeignKey("energetics.id", ondelete="CASCADE"), primary_key=True)
+    # Место соседа в списке похожих (1 — самый похожий), часть первичного ключа для чтения по порядку
+    rank = Column(SmallInteger, primary_key=True)
+    # Определяем поле similar_energy_id как внешний ключ на похожий энергетик
+    similar_energy_id = Column(Integer, ForeignKey("energetics.id", ondelete="CASCADE"), nullable=False)
+    # Сходство от 0 до 1
+    score = Column(Float, nullable=False)
+
+    # Определяем связь с энергетиком
+    energy = relationship("Energy", foreign_keys=[energy_id], back_populates="similarities")
+    # Определяем связь с похожим энергетиком
+    similar_energy = relationship("Energy", foreign_keys=[similar_energy_id])
@@ -0,0 +1,31 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, Numeric, Index
+# Импортируем relationship для определения связей
+from sqlalchemy.orm import relationship
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели EnergyTrendBucket
+# Счетчики отзывов и оценок энергетика за один часовой интервал, для трендов за скользящее окно
+class EnergyTrendBucket(Base):
+    # Указываем имя таблицы
+    __tablename__ = "energy_trend_buckets"
+    # Индекс для выборки окна и удаления устаревших интервалов
+    __table_args__ = (
+        Index("ix_energy_trend_buckets_bucket_start", "bucket_start"),
+    )
+
+    # Определяем поле energy_id как часть составного первичного ключа
+    energy_id = Column(Integer, ForeignKey("energetics.id", ondelete="CASCADE"), primary_key=True)
+    # Начало интервала (Unix timestamp в секундах, кратный длине интервала)
+    bucket_start = Column(BigInteger, primary_key=True)
+    # Количество отзывов за интервал
+    review_count = Column(Integer, nullable=False, default=0)
+    # Сумма оценок за интервал
+    rating_sum = Column(Numeric(12, 1), nullable=False, default=0)
+    # Количество оценок за интервал
+    rating_count = Column(Integer, nullable=False, default=0)
+
+    # Определяем связь с энергетиком
+    energy = relationship("Energy", back_populates="trend_buckets")
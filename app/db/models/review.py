@@ -25,7 +25,7 @@ class Review(Base):
     # Определяем поле created_at с текущей датой по умолчанию
     created_at = Column(BigInteger, default=lambda: int(time.time()))  # Unix timestamp в секундах
     # Поле для URL фото
-    image_url = Column(String(255), nullable=True)
+    image_url = Column(String(255), nullable=True, index=True)
 
     # Определяем связь с пользователем
     user = relationship("User", back_populates="reviews")
@@ -0,0 +1,25 @@
+# Импортируем нужное из SQLAlchemy
+from sqlalchemy import Column, String, Integer, BigInteger
+import time
+
+# Импортируем базовый класс
+from app.db.models.base import Base
+
+# Определяем класс модели StoredImage
+# Индекс загруженных фото и счетчик ссылок на них. Файлы называются по хэшу содержимого,
+# поэтому одно фото может использоваться несколькими записями (энергетик, отзыв, предложка).
+# Файл удаляется, когда на него не остается ни одной ссылки. Загруженное, но так и не
+# использованное фото остается в индексе со счетчиком 0 и удаляется очисткой
+# (app.cleanup_unnecessary_images) после периода ожидания
+class StoredImage(Base):
+    # Указываем имя таблицы
+    __tablename__ = "stored_images"
+
+    # Путь к файлу (как в image_url)
+    path = Column(String(512), primary_key=True)
+    # Количество записей, ссылающихся на файл
+    ref_count = Column(Integer, nullable=False, default=0)
+    # Размер оригинала в байтах (без вариантов)
+    size = Column(BigInteger, nullable=True)
+    # Время последней загрузки или изменения счетчика ссылок (Unix timestamp в секундах)
+    mtime = Column(BigInteger, nullable=False, default=lambda: int(time.time()), index=True)
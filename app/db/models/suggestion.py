@@ -40,7 +40,7 @@ class Suggestion(Base):
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     description = Column(Text, nullable=True)
     # URL изображения энергетика
-    image_url = Column(String(512), nullable=True)
+    image_url = Column(String(512), nullable=True, index=True)
     
     # Статус и комментарий модератора
     status = Column(Enum(SuggestionStatus), default=SuggestionStatus.pending, nullable=False)
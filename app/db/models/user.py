@@ -21,7 +21,7 @@ class User(Base):
     # Определяем поле created_at с текущей датой по умолчанию
     created_at = Column(BigInteger, default=lambda: int(time.time()))  # Unix timestamp в секундах
     # Поле для URL фото
-    image_url = Column(String(255), nullable=True)
+    image_url = Column(String(255), nullable=True, index=True)
 
     # Определяем связь один-ко-многим с отзывами
     reviews = relationship("Review", back_populates="user", cascade="all, delete-orphan")
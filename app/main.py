@@ -1,13 +1,38 @@
+# Импортируем asynccontextmanager для описания жизненного цикла приложения
+from contextlib import asynccontextmanager
 # Импортируем FastAPI для создания приложения
 from fastapi import FastAPI
 # Импортируем CORS middleware для разрешения кросс-доменных запросов
 from fastapi.middleware.cors import CORSMiddleware
 # Импортируем маршруты версии v1
 from app.api.v1.router import api_router
-# Импортируем StaticFiles для обслуживания статических файлов
-from fastapi.staticfiles import StaticFiles
+# Импортируем раздачу загруженных файлов (с диска или из S3)
+from app.core.static_files import upload_files
 
+from app.core.responses import FastJSONResponse
+from app.core.compression import CompressionMiddleware
 from app.core.config import FRONTEND_URL, UPLOAD_DIR_ENERGY, UPLOAD_DIR_REVIEW, UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_USER
+# Импортируем фоновые задачи
+from app.db.database import SessionLocal
+from app.services.top import build_chart_snapshots
+from app.services.top_snapshot import start_snapshot_builder
+
+
+def _build_chart_snapshots():
+    # Строим снимки топа в отдельной сессии БД
+    with SessionLocal() as db:
+        build_chart_snapshots(db)
+
+
+# Жизненный цикл приложения: запуск и остановка фоновых задач
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Запускаем построение снимка топа (только если задан CHART_SNAPSHOT_DIR)
+    snapshot_builder = start_snapshot_builder(_build_chart_snapshots)
+    yield
+    # Останавливаем фоновые задачи
+    if snapshot_builder is not None:
+        snapshot_builder.set()
 
 # Создаём экземпляр приложения FastAPI
 app = FastAPI(
@@ -16,7 +41,11 @@ app = FastAPI(
     # Устанавливаем описание приложения
     description="API for managing energy drinks, brands, reviews, and user profiles",
     # Устанавливаем версию API
-    version="1.0.0"
+    version="1.0.0",
+    # Устанавливаем жизненный цикл приложения
+    lifespan=lifespan,
+    # Ответы кодируются через orjson, если он установлен
+    default_response_class=FastJSONResponse
 )
 
 # Определяем список разрешённых источников для CORS
@@ -38,11 +67,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Подключаем директории для статических файлов (изображения)
-app.mount("/uploads/energy", StaticFiles(directory=UPLOAD_DIR_ENERGY), name="energy_uploads")
-app.mount("/uploads/reviews", StaticFiles(directory=UPLOAD_DIR_REVIEW), name="review_uploads")
-app.mount("/uploads/suggestion", StaticFiles(directory=UPLOAD_DIR_SUGGESTION), name="suggestion_uploads")
-app.mount("/uploads/users", StaticFiles(directory=UPLOAD_DIR_USER), name="user_uploads")
+# Сжимаем текстовые ответы (JSON) gzip или brotli
+app.add_middleware(CompressionMiddleware)
+
+# Подключаем директории для статических файлов (изображения): с диска или перенаправлением в S3
+app.mount("/uploads/energy", upload_files(UPLOAD_DIR_ENERGY), name="energy_uploads")
+app.mount("/uploads/reviews", upload_files(UPLOAD_DIR_REVIEW), name="review_uploads")
+app.mount("/uploads/suggestion", upload_files(UPLOAD_DIR_SUGGESTION), name="suggestion_uploads")
+app.mount("/uploads/users", upload_files(UPLOAD_DIR_USER), name="user_uploads")
 
 # Подключаем маршруты версии v1 с префиксом /api/v1
 app.include_router(
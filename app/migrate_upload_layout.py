@@ -0,0 +1,214 @@
+"""
+Скрипт для переноса загруженных фото в подкаталоги.
+
+Новые загрузки сохраняются в двухуровневую структуру uploads/<тип>/ab/cd/<имя>
+(см. app.core.file_utils.shard_path). Скрипт переносит файлы, загруженные
+раньше прямо в директорию, вместе с их вариантами и переписывает image_url
+в таблицах energetics, reviews, suggestions и users пачками по --batch-size строк.
+
+Фото переносится в подкаталоги той директории, где оно лежит (по image_url),
+а не директории таблицы: фото предложки, привязанное к отзыву, остается в папке предложок.
+
+Каждая пачка фиксируется отдельно, а номер последней обработанной строки
+сохраняется в файл состояния, поэтому прерванный перенос продолжается
+с того же места. Файлы пачки переносятся после фиксации пути в БД, а список
+переносов до фиксации записывается в файл состояния: при сбое следующий запуск
+сначала доводит их до конца. Повторная обработка строки безопасна: уже перенесенные
+файлы и пути пропускаются. Старые ссылки /uploads/<тип>/<имя> продолжают
+работать и после переноса.
+"""
+
+import argparse
+import json
+import os
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import DATABASE_URL, UPLOAD_DIR_ENERGY
+
+from app.core.file_utils import shard_path
+from app.core.images import variant_paths
+from app.core.storage import storage
+from app.db.models import Energy, Review, Suggestion, User, StoredImage
+from app.services.data_versions import bump_data_versions, ENERGIES, REVIEWS
+
+# Создаём движок и сессию БД
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Таблицы с фото: модель и группы данных для ETag
+TABLES = [
+    (Energy, (ENERGIES,)),
+    (Review, (REVIEWS,)),
+    (Suggestion, ()),
+    (User, (REVIEWS,)),
+]
+
+# Файл состояния по умолчанию: рядом с директориями загрузок
+DEFAULT_STATE_FILE = os.path.join(
+    os.path.dirname(os.path.normpath(UPLOAD_DIR_ENERGY)), ".upload_layout_migration.json"
+)
+
+
+def load_state(path: str) -> dict:
+    """Читает номера последних обработанных строк по таблицам."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict) -> None:
+    """Сохраняет состояние через временный файл, чтобы прерывание не испортило его."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def move_image_files(src_path: str, dst_path: str) -> None:
+    """
+    Переносит оригинал и варианты в хранилище (копия на новое место, затем удаление старого);
+    оригинал последним, чтобы прерванный перенос был виден по нему.
+    """
+    for src_variant, dst_variant in zip(variant_paths(src_path), variant_paths(dst_path)):
+        if storage.exists(src_variant):
+            storage.copy(src_variant, dst_variant)
+            storage.delete([src_variant])
+    storage.copy(src_path, dst_path)
+    storage.delete([src_path])
+
+
+def sharded_image_path(image_url: str) -> str:
+    """Путь фото в подкаталогах той же директории, где оно лежит сейчас."""
+    directory, file_name = os.path.split(os.path.normpath(image_url))
+    # Уже в подкаталогах ab/cd: путь не меняется
+    if directory.split(os.sep)[-2:] == [file_name[0:2], file_name[2:4]]:
+        return image_url
+    return shard_path(directory, file_name)
+
+
+def finish_pending_moves(state: dict, state_file: str) -> None:
+    """
+    Доводит до конца переносы файлов пачки, прерванной после записи их в состояние.
+    Перенос повторяется только для файлов, оставшихся на старом месте; если пачка не успела
+    зафиксироваться, ее строки при повторной обработке найдут файл на новом месте.
+    """
+    for src_path, dst_path in state.pop("pending", []):
+        if storage.exists(src_path):
+            move_image_files(src_path, dst_path)
+    save_state(state_file, state)
+
+
+def rename_stored_image(db: Session, old_path: str, new_path: str) -> None:
+    """Переносит счетчик ссылок на фото на новый путь (объединяя, если он уже есть)."""
+    old = db.get(StoredImage, old_path)
+    if old is None:
+        return
+    new = db.get(StoredImage, new_path)
+    if new is None:
+        db.add(StoredImage(
+            path=new_path, ref_count=old.ref_count, size=old.size, mtime=old.mtime,
+        ))
+    else:
+        new.ref_count += old.ref_count
+    db.delete(old)
+
+
+def migrate_table(db: Session, model, data_groups: tuple,
+                  state: dict, state_file: str, batch_size: int) -> tuple:
+    """Переносит фото одной таблицы пачками. Возвращает (перенесено, пропущено, не найдено)."""
+    table = model.__tablename__
+    moved = skipped = missing = 0
+    while True:
+        rows = (
+            db.query(model.id, model.image_url)
+            .filter(model.id > state.get(table, 0), model.image_url.isnot(None))
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return moved, skipped, missing
+
+        pending = []
+        for row_id, image_url in rows:
+            new_path = sharded_image_path(image_url)
+            if os.path.normpath(image_url) == os.path.normpath(new_path):
+                skipped += 1
+                continue
+            if storage.exists(image_url):
+                # Несколько строк могут ссылаться на один файл: переносим его один раз
+                if [image_url, new_path] not in pending:
+                    pending.append([image_url, new_path])
+            elif not storage.exists(new_path):
+                # Файла нет ни на старом, ни на новом месте: путь не трогаем
+                missing += 1
+                continue
+            db.query(model).filter(model.id == row_id).update(
+                {model.image_url: new_path}, synchronize_session=False
+            )
+            rename_stored_image(db, image_url, new_path)
+            moved += 1
+
+        # Новая версия данных для ETag: в ответах поменялись пути фото
+        bump_data_versions(db, *data_groups)
+        # Переносы записываются до фиксации: при сбое после нее их доведет следующий запуск
+        state["pending"] = pending
+        save_state(state_file, state)
+        db.commit()
+        state[table] = rows[-1].id
+        finish_pending_moves(state, state_file)
+        print(f"  {table}: обработано до id {rows[-1].id}")
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Перенос загруженных фото в подкаталоги с обновлением image_url"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Количество строк в одной транзакции (по умолчанию 500)"
+    )
+    parser.add_argument(
+        "--state-file",
+        default=DEFAULT_STATE_FILE,
+        help="Файл состояния для продолжения прерванного переноса"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Начать заново, не учитывая сохраненное состояние"
+    )
+    args = parser.parse_args()
+
+    state = load_state(args.state_file)
+    if args.restart:
+        # Незавершенные переносы файлов не забываем и при перезапуске
+        state = {"pending": state.get("pending", [])}
+    if state.get("pending"):
+        print("Доводим переносы прерванной пачки...")
+    finish_pending_moves(state, args.state_file)
+    with SessionLocal() as db:
+        for model, data_groups in TABLES:
+            moved, skipped, missing = migrate_table(
+                db, model, data_groups, state, args.state_file, args.batch_size
+            )
+            print(
+                f"{model.__tablename__}: перенесено {moved}, уже на месте {skipped}, "
+                f"файл не найден {missing}"
+            )
+
+    print("Перенос завершен!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Скрипт для пересчета агрегатов оценок энергетиков по критериям.
+
+Заполняет таблицы energy_criteria_stats и energy_rating_buckets из таблицы ratings,
+а при полном пересчете — и счетчики трендов energy_trend_buckets за текущее окно.
+В обычной работе агрегаты обновляются инкрементально при записи оценок,
+скрипт нужен для первичного заполнения после миграции и для восстановления
+согласованности (например, после ручных правок в БД).
+"""
+
+import argparse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import DATABASE_URL
+
+from app.services.energy_stats import rebuild_energy_stats
+from app.services.trending import rebuild_trend_buckets
+
+# Создаём движок и сессию БД
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Пересчет агрегатов оценок энергетиков по критериям"
+    )
+    parser.add_argument(
+        "--energy-id",
+        type=int,
+        default=None,
+        help="Пересчитать только указанный энергетик (по умолчанию все)"
+    )
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        rebuild_energy_stats(db, energy_id=args.energy_id)
+        if args.energy_id is None:
+            rebuild_trend_buckets(db)
+
+    print("Агрегаты пересчитаны!")
+
+
+if __name__ == "__main__":
+    main()
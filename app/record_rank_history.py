@@ -0,0 +1,48 @@
+"""
+Скрипт для сохранения дневного снимка мест энергетиков в общем топе.
+
+Добавляет в таблицу energy_rank_history место, средний рейтинг и количество отзывов
+каждого энергетика на текущую дату (UTC). Запускается раз в сутки (например, по cron),
+повторный запуск за ту же дату ничего не меняет.
+"""
+
+import argparse
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Импортируем конфигурацию
+from app.core.config import DATABASE_URL
+
+from app.services.top import record_rank_history
+
+# Создаём движок и сессию БД
+engine = create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def main() -> None:
+    """Основная функция."""
+    parser = argparse.ArgumentParser(
+        description="Сохранение дневного снимка мест энергетиков в топе"
+    )
+    parser.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        default=None,
+        help="Дата снимка в формате ГГГГ-ММ-ДД (по умолчанию сегодня по UTC)"
+    )
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        count = record_rank_history(db, snapshot_date=args.date)
+
+    print(f"Снимок мест сохранен: {count} энергетиков")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field, condecimal
-from typing import Optional, List
+from pydantic import BaseModel, Field, condecimal, computed_field
+from typing import Optional, List, Dict
+
+from app.core.images import image_variant_urls
 
 # Базовая модель для оценок, содержит общие поля
 class RatingBase(BaseModel):
@@ -69,4 +71,12 @@ class BlacklistBase(BaseModel):
     # id польвателя
     user_id: int
     # причина добавления в черный список (необязательна)
-    reason: Optional[str] = None
\ No newline at end of file
+    reason: Optional[str] = None
+
+# Примесь для схем ответов с image_url: ссылки на уменьшенные варианты изображения
+class ImageVariantsMixin(BaseModel):
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, str]]:
+        # варианты thumb, card и full в WebP, None если изображения нет
+        return image_variant_urls(self.image_url)
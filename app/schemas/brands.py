@@ -19,6 +19,13 @@ class Brand(BrandBase):
         # Указываем, что модель может быть создана из атрибутов ORM-объектов SQLAlchemy
         from_attributes = True
 
+# =============== READ BATCH ===============
+class BrandBatch(BaseModel):
+    # найденные бренды в порядке запрошенных id
+    items: List[Brand]
+    # id, для которых бренд не найден
+    missing: List[int]
+
 # =============== READ ALL ENERGIES ONE BRAND===============
 class BrandAndEnergies(BrandBase):
     # уникальный идентификатор бренда
@@ -1,32 +1,105 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, condecimal
 from typing import Optional, List
+from datetime import date
 
 from app.schemas.brands import Brand, BrandAndEnergies
 from app.schemas.categories import Category
+from app.schemas.reviews import ReviewWithRatings
 
-from app.schemas.base import EnergyBase
+from app.schemas.base import EnergyBase, ImageVariantsMixin
+
+# =============== READ ENERGY STATS ===============
+class CriteriaStat(BaseModel):
+    # идентификатор критерия
+    criteria_id: int
+    # название критерия
+    name: str
+    # средняя оценка по критерию, от 0 до 10 с 4 знаками после запятой
+    average_rating: condecimal(ge=0, le=10, decimal_places=4)
+    # количество оценок по критерию
+    rating_count: int
+    # гистограмма оценок по критерию: количество оценок в корзинах [0, 1), [1, 2), ..., [9, 10]
+    histogram: List[int]
+
+class EnergyStats(BaseModel):
+    # идентификатор энергетика
+    energy_id: int
+    # средние оценки и гистограммы по каждому критерию
+    criteria: List[CriteriaStat]
+    # суммарная гистограмма оценок по всем критериям
+    histogram: List[int]
+
+# =============== READ RANK HISTORY ===============
+class RankHistoryPoint(BaseModel):
+    # дата дневного снимка (UTC)
+    snapshot_date: date
+    # абсолютное место в общем топе на эту дату
+    absolute_rank: int
+    # средний рейтинг на эту дату, от 0 до 10 с 4 знаками после запятой
+    average_rating: condecimal(ge=0, le=10, decimal_places=4)
+    # количество отзывов на эту дату
+    review_count: int
+    class Config:
+        from_attributes = True
 
 # =============== READ ONE ===============
-class Energy(EnergyBase):
+class Energy(EnergyBase, ImageVariantsMixin):
     # уникальный идентификатор энергетика
     id: int
     # объект бренда, к которому относится энергетик
     brand: Brand
     # объект категории, необязательное, может быть None
     category: Optional[Category]
+    # статистика по критериям, заполняется только в детальном ответе
+    stats: Optional[EnergyStats] = None
     # Внутренний класс Config для настройки модели
     class Config:
         # Указываем, что модель может быть создана из атрибутов ORM-объектов SQLAlchemy
         from_attributes = True
 
+# =============== READ BATCH ===============
+class EnergyBatch(BaseModel):
+    # найденные энергетики в порядке запрошенных id
+    items: List[Energy]
+    # id, для которых энергетик не найден
+    missing: List[int]
+
+# =============== READ ENERGY PAGE ===============
+class EnergyPage(BaseModel):
+    # карточка энергетика со статистикой по критериям
+    energy: Energy
+    # первые отзывы на энергетик, сначала новые
+    reviews: List[ReviewWithRatings]
+    # общее количество отзывов на энергетик
+    review_count: int
+    # отзыв текущего пользователя, None для гостя или если отзыва нет
+    my_review: Optional[ReviewWithRatings] = None
+
+# =============== READ SIMILAR ENERGIES ===============
+class SimilarEnergy(ImageVariantsMixin):
+    # уникальный идентификатор похожего энергетика
+    id: int
+    # название энергетика
+    name: str
+    # объект бренда энергетика
+    brand: Brand
+    # объект категории, необязательное
+    category: Optional[Category] = None
+    # URL изображения энергетика, необязательное
+    image_url: Optional[str] = None
+    # сходство с исходным энергетиком, от 0 до 1
+    similarity: float
+
 # =============== READ ALL ENERGIES ONE BRAND===============
-class EnergiesByBrand(EnergyBase):
+class EnergiesByBrand(EnergyBase, ImageVariantsMixin):
     # уникальный идентификатор энергетика
     id: int
     # объект бренда без статистики, используется в списке энергетиков бренда
     brand: BrandAndEnergies
     # объект категории, необязательное
     category: Optional[Category]
+    # Оценил ли энергетик текущий пользователь (None для гостя)
+    rated_by_me: Optional[bool] = None
     # Внутренний класс Config для настройки модели
     class Config:
         # Указываем, что модель может быть создана из атрибутов ORM-объектов SQLAlchemy
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, condecimal
 from typing import Optional, List
 
-from app.schemas.base import UserBase, ReviewBase, RatingBase
+from app.schemas.base import UserBase, ReviewBase, RatingBase, ImageVariantsMixin
 
 # =============== CREATE ===============
 class ReviewCreate(ReviewBase):
@@ -9,7 +9,7 @@ class ReviewCreate(ReviewBase):
     ratings: List[RatingBase]
 
 # =============== READ ONE ===============
-class Review(ReviewBase):
+class Review(ReviewBase, ImageVariantsMixin):
     # уникальный идентификатор отзыва
     id: int
     # Информация о пользователе (его имя)
@@ -22,7 +22,7 @@ class Review(ReviewBase):
         from_attributes = True
 
 # =============== READ ALL REVIEWS ONE USER ===============
-class ReviewsUser(ReviewBase):
+class ReviewsUser(ReviewBase, ImageVariantsMixin):
     # информация о id отзыва
     id: int
     # информация об энергетике
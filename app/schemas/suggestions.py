@@ -5,6 +5,8 @@ from typing import Optional, List
 
 from pydantic import BaseModel, Field
 
+from app.schemas.base import ImageVariantsMixin
+
 
 class BrandBrief(BaseModel):
     """Краткая информация о бренде."""
@@ -15,7 +17,7 @@ class BrandBrief(BaseModel):
         orm_mode = True
 
 
-class UserBrief(BaseModel):
+class UserBrief(ImageVariantsMixin):
     """Краткая информация о пользователе."""
     id: int
     username: str
@@ -81,7 +83,7 @@ class SuggestionUpdate(BaseModel):
     ratings: Optional[List[RatingItem]] = None
 
 
-class SuggestionOut(SuggestionBase):
+class SuggestionOut(SuggestionBase, ImageVariantsMixin):
     """Схема ответа для предложки пользователя."""
     id: int
     user_id: int
@@ -98,7 +100,7 @@ class SuggestionOut(SuggestionBase):
         orm_mode = True
 
 
-class SuggestionStatusOut(BaseModel):
+class SuggestionStatusOut(ImageVariantsMixin):
     """Схема ответа для админ-панели."""
     id: int
     user_id: int
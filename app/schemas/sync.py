@@ -0,0 +1,60 @@
+from pydantic import BaseModel
+from typing import Optional, List
+
+# =============== SYNC ROWS ===============
+class SyncCategory(BaseModel):
+    # уникальный идентификатор категории
+    id: int
+    # название категории
+    name: str
+    # версия строки
+    version: int
+
+class SyncBrand(BaseModel):
+    # уникальный идентификатор бренда
+    id: int
+    # название бренда
+    name: str
+    # версия строки
+    version: int
+
+class SyncEnergy(BaseModel):
+    # уникальный идентификатор энергетика
+    id: int
+    # название энергетика
+    name: str
+    # идентификатор бренда
+    brand_id: Optional[int] = None
+    # идентификатор категории, необязательное
+    category_id: Optional[int] = None
+    # описание энергетика, необязательное
+    description: Optional[str] = None
+    # ингредиенты энергетика, необязательное
+    ingredients: Optional[str] = None
+    # URL изображения энергетика, необязательное
+    image_url: Optional[str] = None
+    # версия строки
+    version: int
+
+class SyncDeleted(BaseModel):
+    # ID удаленных категорий
+    categories: List[int]
+    # ID удаленных брендов
+    brands: List[int]
+    # ID удаленных энергетиков
+    energies: List[int]
+
+# =============== SYNC RESPONSE ===============
+class SyncResponse(BaseModel):
+    # версия, которую клиент передает как since в следующем запросе
+    version: int
+    # есть ли еще изменения после этой порции
+    has_more: bool
+    # созданные и измененные категории
+    categories: List[SyncCategory]
+    # созданные и измененные бренды
+    brands: List[SyncBrand]
+    # созданные и измененные энергетики
+    energies: List[SyncEnergy]
+    # удаленные строки
+    deleted: SyncDeleted
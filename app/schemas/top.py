@@ -1,11 +1,12 @@
 from pydantic import BaseModel, condecimal
-from typing import Optional
+from typing import Optional, List
 
 from app.schemas.brands import Brand
 from app.schemas.categories import Category
+from app.schemas.base import ImageVariantsMixin
 
 # =============== READ ENERGY CHART ===============
-class EnergyTop(BaseModel):
+class EnergyTop(ImageVariantsMixin):
     # уникальный идентификатор энергетика
     id: int
     # название энергетика
@@ -22,11 +23,75 @@ class EnergyTop(BaseModel):
     review_count: int
     # Абсолютная позиция в топе без фильтров
     absolute_rank: int
+    # Позиция в последнем дневном снимке до сегодняшнего дня, если он есть
+    previous_rank: Optional[int] = None
+    # Изменение позиции с последнего снимка (больше нуля — поднялся)
+    rank_delta: Optional[int] = None
+    # Оценил ли энергетик текущий пользователь (None для гостя)
+    rated_by_me: Optional[bool] = None
     # Внутренний класс Config для настройки модели
     class Config:
         # Указываем, что модель может быть создана из атрибутов ORM-объектов SQLAlchemy
         from_attributes = True
 
+# =============== READ ENERGY CHART FACETS ===============
+class CategoryFacet(BaseModel):
+    # идентификатор категории, None — энергетики без категории
+    id: Optional[int] = None
+    # название категории
+    name: Optional[str] = None
+    # количество энергетиков в категории при текущих фильтрах (кроме категории)
+    count: int
+
+class RatingFacet(BaseModel):
+    # номер корзины рейтинга
+    bucket: int
+    # нижняя граница рейтинга корзины (включительно)
+    min_rating: int
+    # верхняя граница рейтинга корзины (10 входит в последнюю корзину)
+    max_rating: int
+    # количество энергетиков в корзине при текущих фильтрах (кроме рейтинга)
+    count: int
+
+class EnergyFacets(BaseModel):
+    # количество энергетиков с учетом всех фильтров
+    total: int
+    # количество по категориям
+    categories: List[CategoryFacet]
+    # количество по корзинам рейтинга
+    ratings: List[RatingFacet]
+    # количество энергетиков без оценок (при текущих фильтрах, кроме рейтинга)
+    unrated: int
+
+class EnergyTopWithFacets(BaseModel):
+    # страница топа
+    items: List[EnergyTop]
+    # фасеты для панели фильтров
+    facets: EnergyFacets
+
+# =============== READ TRENDING CHART ===============
+class EnergyTrending(ImageVariantsMixin):
+    # уникальный идентификатор энергетика
+    id: int
+    # название энергетика
+    name: str
+    # средняя оценка за окно трендов, от 0 до 10 с 4 знаками после запятой
+    average_rating: condecimal(ge=0, le=10, decimal_places=4)
+    # объект бренда энергетика
+    brand: Brand
+    # объект категории, необязательное
+    category: Optional[Category] = None
+    # URL изображения энергетика, необязательное
+    image_url: Optional[str] = None
+    # количество отзывов за окно трендов
+    review_count: int
+    # позиция в топе трендов
+    trend_rank: int
+    # Оценил ли энергетик текущий пользователь (None для гостя)
+    rated_by_me: Optional[bool] = None
+    class Config:
+        from_attributes = True
+
 # =============== READ BRAND CHART ===============
 class BrandTop(BaseModel):
     # уникальный идентификатор бренда
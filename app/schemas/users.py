@@ -3,7 +3,7 @@ from typing import Optional, List
 
 from app.schemas.brands import Brand
 from app.schemas.energies import Energy
-from app.schemas.base import UserBase
+from app.schemas.base import UserBase, ImageVariantsMixin
 from app.schemas.reviews import ReviewsUser
 
 # =============== CREATE ===============
@@ -11,7 +11,7 @@ class UserCreate(UserBase):
     pass
 
 # =============== READ ONE ===============
-class User(UserBase):
+class User(UserBase, ImageVariantsMixin):
     # уникальный идентификатор пользователя
     id: int
     # флаг, указывающий, является ли пользователь премиум-пользователем
@@ -23,6 +23,13 @@ class User(UserBase):
         # Указываем, что модель может быть создана из атрибутов ORM-объектов SQLAlchemy
         from_attributes = True
 
+# =============== READ BATCH ===============
+class UserBatch(BaseModel):
+    # найденные пользователи в порядке запрошенных id
+    items: List[User]
+    # id, для которых пользователь не найден
+    missing: List[int]
+
 # =============== UPDATE ===============
 class UserUpdate(BaseModel):
     # имя пользователя, необязательное, с максимальной длиной 100 символов
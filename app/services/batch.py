@@ -0,0 +1,48 @@
+from sqlalchemy import Integer, any_, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.core.config import BATCH_MAX_IDS
+
+# =============== PARSE IDS ===============
+def parse_ids(ids: str) -> list:
+    """
+    Разбирает список id вида "3,1,2" в список чисел без повторов, сохраняя порядок.
+    """
+    result = []
+    seen = set()
+    for part in ids.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            value = int(part)
+        except ValueError:
+            raise ValueError(f"Неверный id '{part}', ожидается целое число")
+        if value in seen:
+            continue
+        seen.add(value)
+        result.append(value)
+    if not result:
+        raise ValueError("Не указаны id")
+    if len(result) > BATCH_MAX_IDS:
+        raise ValueError(f"Можно запросить не больше {BATCH_MAX_IDS} id за раз")
+    return result
+
+# =============== HELPERS ===============
+def id_any(column, ids):
+    """
+    Условие column = ANY(:ids): весь список передается одним параметром-массивом,
+    поэтому текст запроса не зависит от количества id.
+    """
+    return column == any_(literal(list(ids), ARRAY(Integer)))
+
+def order_by_ids(ids, objects) -> dict:
+    """
+    Раскладывает найденные объекты в порядке запрошенных id
+    и возвращает {"items": [...], "missing": [id, ...]}.
+    """
+    by_id = {obj.id: obj for obj in objects}
+    return {
+        "items": [by_id[id_] for id_ in ids if id_ in by_id],
+        "missing": [id_ for id_ in ids if id_ not in by_id],
+    }
@@ -1,10 +1,17 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, distinct
 
-from app.db.models import Brand, Energy, Review, Rating
+from app.db.models import Brand, Energy, Review, Rating, Suggestion
 
 from app.schemas.brands import Brand as BrandSchema, BrandCreate, BrandUpdate
 
+from app.services.top_engine import chart_engine
+from app.services.sync import record_tombstones
+from app.services.data_versions import bump_data_versions, BRANDS, ENERGIES, REVIEWS
+from app.services.stored_images import release_image
+from app.services.suggestions import suggestion_image_path
+from app.services.batch import id_any, order_by_ids
+
 # =============== READ ALL ===============
 def get_brands(db: Session, skip: int = 0, limit: int = 10):
     # Выполняем запрос к таблице Brand
@@ -34,6 +41,8 @@ def get_brand(db: Session, brand_id: int):
         db.query(
             # Выбираем brand_id
             Energy.brand_id,
+            # Выбираем id энергетика (для подсчета оцененных энергетиков)
+            Energy.id.label("energy_id"),
             # Вычисляем средний рейтинг
             func.avg(Rating.rating_value).label("energy_avg_rating")
         )
@@ -57,8 +66,8 @@ def get_brand(db: Session, brand_id: int):
             func.round(func.avg(energy_avg_subquery.c.energy_avg_rating), 4).label("average_rating"),
             # Считаем количество энергетиков
             func.count(distinct(Energy.id)).label("energy_count"),
-            # Считаем количество оцененных энергетиков
-            func.count(distinct(energy_avg_subquery.c.energy_avg_rating)).label("rated_energy_count"),
+            # Считаем количество оцененных энергетиков (по id: у разных энергетиков средние могут совпадать)
+            func.count(distinct(energy_avg_subquery.c.energy_id)).label("rated_energy_count"),
             # Считаем количество отзывов
             func.count(distinct(Review.id)).label("review_count"),
             # Считаем количество оценок
@@ -101,6 +110,66 @@ def get_brand(db: Session, brand_id: int):
     # Возвращаем None, если бренд не найден
     return None
 
+# =============== READ BATCH ===============
+def get_brands_by_ids(db: Session, brand_ids: list) -> dict:
+    """
+    Получает несколько брендов по списку id с теми же показателями, что и get_brand,
+    одним агрегирующим запросом с группировкой по бренду.
+    Возвращает {"items": [...], "missing": [...]} в порядке brand_ids.
+    """
+    # Средний рейтинг энергетиков только для брендов из списка
+    energy_avg_subquery = (
+        db.query(
+            Energy.brand_id,
+            Energy.id.label("energy_id"),
+            func.avg(Rating.rating_value).label("energy_avg_rating")
+        )
+        .join(Review, Energy.id == Review.energy_id)
+        .join(Rating, Review.id == Rating.review_id)
+        .filter(id_any(Energy.brand_id, brand_ids))
+        .group_by(Energy.id)
+        .subquery()
+    )
+    # Средний рейтинг бренда считается отдельно: соединение с отзывами размножило бы строки подзапроса
+    brand_avg_subquery = (
+        db.query(
+            energy_avg_subquery.c.brand_id,
+            func.round(func.avg(energy_avg_subquery.c.energy_avg_rating), 4).label("average_rating"),
+            # Тот же расчет, что и в get_brand
+            func.count(distinct(energy_avg_subquery.c.energy_id)).label("rated_energy_count")
+        )
+        .group_by(energy_avg_subquery.c.brand_id)
+        .subquery()
+    )
+
+    results = (
+        db.query(
+            Brand,
+            brand_avg_subquery.c.average_rating,
+            brand_avg_subquery.c.rated_energy_count,
+            func.count(distinct(Energy.id)).label("energy_count"),
+            func.count(distinct(Review.id)).label("review_count"),
+            func.count(distinct(Rating.id)).label("rating_count"),
+        )
+        .outerjoin(brand_avg_subquery, Brand.id == brand_avg_subquery.c.brand_id)
+        .outerjoin(Energy, Brand.id == Energy.brand_id)
+        .outerjoin(Review, Energy.id == Review.energy_id)
+        .outerjoin(Rating, Review.id == Rating.review_id)
+        .filter(id_any(Brand.id, brand_ids))
+        .group_by(Brand.id, brand_avg_subquery.c.average_rating, brand_avg_subquery.c.rated_energy_count)
+        .all()
+    )
+
+    brands = []
+    for brand, avg_rating, rated_energy_count, energy_count, review_count, rating_count in results:
+        brand.average_rating = round(float(avg_rating), 4) if avg_rating and rated_energy_count else 0.0
+        brand.energy_count = energy_count or 0
+        brand.rated_energy_count = rated_energy_count or 0
+        brand.review_count = review_count or 0
+        brand.rating_count = rating_count or 0
+        brands.append(brand)
+    return order_by_ids(brand_ids, brands)
+
 # =============== READ ALL ENERGIES ONE BRAND===============
 def get_energies_by_brand(db: Session, brand_id: int, skip: int = 0, limit: int = 10):
     """
@@ -176,6 +245,8 @@ def create_brand(db: Session, brand: BrandCreate):
     """
     db_brand = Brand(name=brand.name)
     db.add(db_brand)
+    # Новая версия данных для ETag
+    bump_data_versions(db, BRANDS)
     db.commit()
     db.refresh(db_brand)
     return db_brand
@@ -207,8 +278,12 @@ def update_brand(db: Session, brand_id: int, brand_update: BrandUpdate):
     if not db_brand:
         return None
     db_brand.name = brand_update.name
+    # Новая версия данных для ETag
+    bump_data_versions(db, BRANDS)
     db.commit()
     db.refresh(db_brand)
+    # Изменился каталог: топ в памяти загрузится заново
+    chart_engine.invalidate()
     return db_brand
 
 # =============== DELETE ===============
@@ -222,8 +297,24 @@ def delete_brand(db: Session, brand_id: int):
     db_brand = db.query(Brand).filter(Brand.id == brand_id).first()
     if not db_brand:
         return False
+    energy_ids = [energy.id for energy in db_brand.energies]
+    # Освобождаем фото энергетиков, их отзывов и предложок бренда (все удалятся каскадно)
+    for energy in db_brand.energies:
+        release_image(db, energy.image_url)
+    if energy_ids:
+        for (image_url,) in db.query(Review.image_url).filter(Review.energy_id.in_(energy_ids), Review.image_url.isnot(None)):
+            release_image(db, image_url)
+    for (image_url,) in db.query(Suggestion.image_url).filter(Suggestion.brand_id == brand_id, Suggestion.image_url.isnot(None)):
+        release_image(db, suggestion_image_path(image_url))
+    # Энергетики бренда удаляются каскадно, клиенты синхронизации удалят и их
+    record_tombstones(db, "energy", energy_ids)
+    record_tombstones(db, "brand", [brand_id])
     db.delete(db_brand)
+    # Новая версия данных для ETag (вместе с энергетиками удаляются и их отзывы)
+    bump_data_versions(db, BRANDS, ENERGIES, REVIEWS)
     db.commit()
+    # Изменился каталог: топ в памяти загрузится заново
+    chart_engine.invalidate()
     return True
 
 # =============== READ ALL FOR SELECT===============
@@ -4,6 +4,9 @@ from app.db.models import Category
 
 from app.schemas.categories import CategoryCreate, CategoryUpdate
 
+from app.services.top_engine import chart_engine
+from app.services.data_versions import bump_data_versions, CATEGORIES
+
 # =============== READ ALL ===============
 def get_categories(db: Session, skip: int = 0, limit: int = 10):
     # Выполняем запрос к таблице Category
@@ -24,6 +27,8 @@ def create_category(db: Session, category: CategoryCreate):
     # Добавляем в сессию
     db.add(db_category)
     # Фиксируем изменения
+    # Новая версия данных для ETag
+    bump_data_versions(db, CATEGORIES)
     db.commit()
     # Обновляем объект
     db.refresh(db_category)
@@ -59,6 +64,10 @@ def update_category(db: Session, category_id: int, category_update: CategoryUpda
         if existing_category and existing_category.id != category_id:
             raise ValueError("Категория с таким именем уже существует")
         db_category.name = category_update.name
+    # Новая версия данных для ETag
+    bump_data_versions(db, CATEGORIES)
     db.commit()
     db.refresh(db_category)
+    # Изменился каталог: топ в памяти загрузится заново
+    chart_engine.invalidate()
     return db_category
\ No newline at end of file
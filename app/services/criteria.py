@@ -4,6 +4,9 @@ from app.db.models import Criteria
 
 from app.schemas.criteria import CriteriaUpdate
 
+from app.services.top_engine import chart_engine
+from app.services.data_versions import bump_data_versions, CRITERIA
+
 # =============== READ ALL ===============
 def get_all_criteria(db: Session, skip: int = 0, limit: int = 10):
     # Выполняем запрос к таблице Criteria
@@ -39,6 +42,10 @@ def update_criteria(db: Session, criteria_id: int, criteria_update: CriteriaUpda
         if existing_criteria and existing_criteria.id != criteria_id:
             raise ValueError("Критерий с таким именем уже существует")
         db_criteria.name = criteria_update.name
+    # Новая версия данных для ETag
+    bump_data_versions(db, CRITERIA)
     db.commit()
     db.refresh(db_criteria)
+    # Названия критериев используются во взвешенном топе в памяти
+    chart_engine.invalidate()
     return db_criteria
\ No newline at end of file
@@ -0,0 +1,44 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.models import DataVersion
+
+# Группы данных, для которых ведутся счетчики версий
+ENERGIES = "energies"
+BRANDS = "brands"
+CATEGORIES = "categories"
+CRITERIA = "criteria"
+REVIEWS = "reviews"
+RANK_HISTORY = "rank_history"
+
+ALL_DATA = (ENERGIES, BRANDS, CATEGORIES, CRITERIA, REVIEWS, RANK_HISTORY)
+# Группы, из которых строится топ (движок в памяти, снимок)
+CHART_DATA = (ENERGIES, BRANDS, CATEGORIES, CRITERIA, REVIEWS)
+
+# =============== BUMP ===============
+def bump_data_versions(db: Session, *names: str) -> dict:
+    """
+    Увеличивает версии групп данных в текущей транзакции.
+    Вызывается сервисами перед фиксацией изменений, чтобы новая версия
+    стала видна вместе с самими данными. Изменения фиксирует вызывающий код.
+    Возвращает новые версии {группа: версия}.
+    """
+    if not names:
+        return {}
+    stmt = insert(DataVersion).values([{"name": name, "version": 1} for name in sorted(set(names))])
+    rows = db.execute(stmt.on_conflict_do_update(
+        index_elements=[DataVersion.name],
+        set_={"version": DataVersion.version + 1}
+    ).returning(DataVersion.name, DataVersion.version)).all()
+    return dict(rows)
+
+# =============== READ ===============
+def get_data_versions(db: Session, names) -> dict:
+    """
+    Возвращает текущие версии групп данных одним запросом по первичному ключу.
+    Группы, которые еще не менялись, имеют версию 0.
+    """
+    rows = db.query(DataVersion.name, DataVersion.version).filter(DataVersion.name.in_(names)).all()
+    versions = dict.fromkeys(names, 0)
+    versions.update(rows)
+    return versions
@@ -1,11 +1,17 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func, distinct
-import os
 
 from app.db.models import Energy, Review, Rating, Brand, Category
 
 from app.schemas.energies import EnergyCreate, EnergyUpdate
 
+from app.services.energy_stats import get_energy_stats, get_energies_stats
+from app.services.batch import id_any, order_by_ids
+from app.services.top_engine import chart_engine
+from app.services.sync import record_tombstones
+from app.services.data_versions import bump_data_versions, ENERGIES
+from app.services.stored_images import acquire_image, release_image, replace_image
+
 # =============== READ ALL ===============
 def get_energies(db: Session, skip: int = 0, limit: int = 10):
     # Выполняем запрос к таблице Energy
@@ -49,40 +55,117 @@ def get_energy(db: Session, energy_id: int):
         energy.average_rating = float(avg_rating) if avg_rating else 0.0
         # Устанавливаем количество отзывов
         energy.review_count = review_count
+        # Добавляем статистику по критериям из предагрегированных таблиц
+        energy.stats = get_energy_stats(db, energy_id)
         # Возвращаем объект энергетика
         return energy
     # Возвращаем None, если энергетик не найден
     return None
 
+# =============== READ BATCH ===============
+def get_energies_by_ids(db: Session, energy_ids: list) -> dict:
+    """
+    Получает несколько энергетиков по списку id одним агрегирующим запросом
+    (вместо get_energy на каждый id). Статистика по критериям читается
+    из предагрегированных таблиц сразу для всех энергетиков.
+    Возвращает {"items": [...], "missing": [...]} в порядке energy_ids.
+    """
+    results = (
+        db.query(
+            Energy,
+            func.coalesce(func.round(func.avg(Rating.rating_value), 4), 0).label('average_rating'),
+            func.count(distinct(Review.id)).label('review_count')
+        )
+        # Бренды и категории подгружаются отдельными запросами на весь список
+        .options(selectinload(Energy.brand), selectinload(Energy.category))
+        .outerjoin(Review, Energy.id == Review.energy_id)
+        .outerjoin(Rating, Review.id == Rating.review_id)
+        .filter(id_any(Energy.id, energy_ids))
+        .group_by(Energy.id)
+        .all()
+    )
+    energies = []
+    for energy, avg_rating, review_count in results:
+        energy.average_rating = float(avg_rating) if avg_rating else 0.0
+        energy.review_count = review_count
+        energies.append(energy)
+    stats = get_energies_stats(db, [energy.id for energy in energies])
+    for energy in energies:
+        energy.stats = stats[energy.id]
+    return order_by_ids(energy_ids, energies)
+
+# =============== CHECK EXISTS ===============
+def energy_exists(db: Session, energy_id: int) -> bool:
+    """
+    Проверяет существование энергетика без вычисления агрегатов.
+    """
+    return db.query(Energy.id).filter(Energy.id == energy_id).first() is not None
+
 # =============== READ ALL REVIEWS ONE ENERGY ===============
+def _reviews_with_average(db: Session):
+    """
+    Запрос отзывов вместе со средней оценкой каждого отзыва.
+    Пользователи и оценки подгружаются отдельными запросами сразу для всей страницы.
+    """
+    return (
+        db.query(Review, func.avg(Rating.rating_value).label('average_rating_review'))
+        .options(selectinload(Review.user), selectinload(Review.ratings))
+        .outerjoin(Rating, Review.id == Rating.review_id)
+        .group_by(Review.id)
+    )
+
+def _set_review_average(review, avg_rating):
+    """Устанавливает средний рейтинг в отзыв и возвращает отзыв."""
+    review.average_rating_review = round(float(avg_rating), 4) if avg_rating else 0.0
+    return review
+
 def get_reviews_by_energy(db: Session, energy_id: int, skip: int = 0, limit: int = 10):
-    # Выполняем запрос к таблице Review с фильтрацией и сортировкой
-    query = (
-        db.query(Review) # Выполняем запрос к таблице Review
+    """
+    Получает отзывы на энергетик (сначала новые) со средней оценкой каждого отзыва.
+    Средние считаются в том же запросе, а не отдельным запросом на каждый отзыв.
+    """
+    result = (
+        _reviews_with_average(db)
         .filter(Review.energy_id == energy_id) # Фильтруем по energy_id
-        .order_by(Review.created_at.desc())  # сортировка по убыванию (сначала новые)
+        .order_by(Review.created_at.desc(), Review.id.desc())  # сортировка по убыванию (сначала новые)
         .offset(skip) # Применяем смещение
         .limit(limit) # Ограничиваем записи
+        .all()
     )
-
-    # Получаем все результаты
-    result = query.all()
-
-    # Проверяем, есть ли результаты
-    if not result:
-        return []  
-    # Добавляем средний рейтинг к каждому отзыву
-    for review in result:   
-        # Выполняем запрос к таблице Rating для получения среднего рейтинга
-        avg_rating = (
-            db.query(func.avg(Rating.rating_value))
-            .filter(Rating.review_id == review.id)
-            .scalar()
-        )
-        # Устанавливаем средний рейтинг в отзыв
-        review.average_rating_review = round(float(avg_rating), 4) if avg_rating else 0.0
     # Возвращаем список отзывов с установленным средним рейтингом
-    return result
+    return [_set_review_average(review, avg_rating) for review, avg_rating in result]
+
+# =============== READ ENERGY PAGE ===============
+def get_energy_page(db: Session, energy_id: int, user_id: int = None, limit: int = 10):
+    """
+    Собирает все данные страницы энергетика в одной сессии:
+    карточку со статистикой, первые отзывы, их общее количество и отзыв текущего пользователя.
+    Количество отзывов берется из агрегата карточки, отзыв пользователя — из первой
+    страницы, если он в нее попал. Возвращает None, если энергетик не найден.
+    """
+    energy = get_energy(db, energy_id)
+    if energy is None:
+        return None
+    reviews = get_reviews_by_energy(db, energy_id, skip=0, limit=limit) if energy.review_count else []
+
+    my_review = None
+    if user_id is not None:
+        my_review = next((review for review in reviews if review.user_id == user_id), None)
+        if my_review is None and len(reviews) < energy.review_count:
+            row = (
+                _reviews_with_average(db)
+                .filter(Review.energy_id == energy_id, Review.user_id == user_id)
+                .first()
+            )
+            if row:
+                my_review = _set_review_average(*row)
+
+    return {
+        "energy": energy,
+        "reviews": reviews,
+        "review_count": energy.review_count,
+        "my_review": my_review,
+    }
     
 # =============== READ TOTAL REVIEWS COUNT FOR ENERGY ===============
 def get_total_reviews_by_energy(db: Session, energy_id: int):
@@ -107,8 +190,14 @@ def create_energy(db: Session, energy: EnergyCreate):
         image_url=energy.image_url
     )
     db.add(db_energy)
+    # Энергетик ссылается на фото
+    acquire_image(db, energy.image_url)
+    # Новая версия данных для ETag
+    bump_data_versions(db, ENERGIES)
     db.commit()
     db.refresh(db_energy)
+    # Изменился каталог: топ в памяти загрузится заново
+    chart_engine.invalidate()
     return db_energy
 
 # =============== READ ALL ADMIN ===============
@@ -136,11 +225,18 @@ def update_energy(db: Session, energy_id: int, energy_update: EnergyUpdate):
     db_energy = db.query(Energy).filter(Energy.id == energy_id).first()
     if not db_energy:
         return None
+    old_image_url = db_energy.image_url
     update_data = energy_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_energy, key, value)
+    # Старое фото удаляется, если на него больше никто не ссылается
+    replace_image(db, old_image_url, db_energy.image_url)
+    # Новая версия данных для ETag
+    bump_data_versions(db, ENERGIES)
     db.commit()
     db.refresh(db_energy)
+    # Изменился каталог: топ в памяти загрузится заново
+    chart_engine.invalidate()
     return db_energy
 
 # =============== DELETE ===============
@@ -151,11 +247,18 @@ def delete_energy(db: Session, energy_id: int):
     db_energy = db.query(Energy).filter(Energy.id == energy_id).first()
     if not db_energy:
         return False
-    # Удаляем фото
-    if db_energy.image_url and os.path.exists(db_energy.image_url):
-        os.remove(db_energy.image_url)  
+    # Освобождаем фото энергетика и его отзывов (отзывы удалятся каскадно)
+    release_image(db, db_energy.image_url)
+    for (image_url,) in db.query(Review.image_url).filter(Review.energy_id == energy_id, Review.image_url.isnot(None)):
+        release_image(db, image_url)
+    # Клиенты синхронизации удалят энергетик у себя
+    record_tombstones(db, "energy", [energy_id])
     db.delete(db_energy)
+    # Новая версия данных для ETag
+    bump_data_versions(db, ENERGIES)
     db.commit()
+    # Изменился каталог: топ в памяти загрузится заново
+    chart_engine.invalidate()
     return True
 
 # =============== READ TOTAL ENERGIES COUNT FOR ADMIN ===============
@@ -0,0 +1,203 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from decimal import Decimal
+
+from app.db.models import EnergyCriteriaStat, EnergyRatingBucket, Criteria, Review, Rating
+from app.services.data_versions import bump_data_versions, REVIEWS
+
+# Количество корзин гистограммы: оценки 0..10 делятся на отрезки шириной 1
+HISTOGRAM_BUCKETS = 10
+
+# =============== HELPERS ===============
+def rating_bucket(value) -> int:
+    """
+    Возвращает номер корзины гистограммы для оценки (10 попадает в последнюю корзину).
+    """
+    return min(max(int(value), 0), HISTOGRAM_BUCKETS - 1)
+
+def rating_facets(counts) -> list:
+    """
+    Преобразует количества по корзинам рейтинга в список фасетов с границами корзин.
+    """
+    return [
+        {"bucket": bucket, "min_rating": bucket, "max_rating": bucket + 1, "count": int(counts[bucket])}
+        for bucket in range(HISTOGRAM_BUCKETS)
+    ]
+
+# =============== APPLY RATINGS DELTA ===============
+def apply_ratings_delta(db: Session, energy_id: int, ratings, sign: int = 1):
+    """
+    Инкрементально обновляет агрегаты энергетика по критериям и гистограмму.
+    sign=1 — оценки добавлены, sign=-1 — оценки удалены.
+    Выполняет по одному upsert на таблицу, изменения фиксирует вызывающий код.
+    """
+    # Отзывы к предложкам не привязаны к энергетику и в статистику не попадают
+    if energy_id is None:
+        return
+
+    # Сворачиваем оценки по критериям и корзинам
+    sums = {}
+    counts = {}
+    buckets = {}
+    for rating in ratings:
+        value = Decimal(str(rating.rating_value))
+        criteria_id = rating.criteria_id
+        sums[criteria_id] = sums.get(criteria_id, Decimal(0)) + sign * value
+        counts[criteria_id] = counts.get(criteria_id, 0) + sign
+        key = (criteria_id, rating_bucket(value))
+        buckets[key] = buckets.get(key, 0) + sign
+
+    if not sums:
+        return
+
+    # Upsert агрегатов: сумма и количество складываются с существующими значениями
+    stats_stmt = insert(EnergyCriteriaStat).values([
+        {
+            "energy_id": energy_id,
+            "criteria_id": criteria_id,
+            "rating_sum": sums[criteria_id],
+            "rating_count": counts[criteria_id],
+            "rating_avg": round(sums[criteria_id] / counts[criteria_id], 4) if counts[criteria_id] > 0 else 0,
+        }
+        for criteria_id in sums
+    ])
+    new_sum = EnergyCriteriaStat.rating_sum + stats_stmt.excluded.rating_sum
+    new_count = EnergyCriteriaStat.rating_count + stats_stmt.excluded.rating_count
+    stats_stmt = stats_stmt.on_conflict_do_update(
+        index_elements=[EnergyCriteriaStat.energy_id, EnergyCriteriaStat.criteria_id],
+        set_={
+            "rating_sum": new_sum,
+            "rating_count": new_count,
+            "rating_avg": func.coalesce(func.round(new_sum / func.nullif(new_count, 0), 4), 0),
+        }
+    )
+    db.execute(stats_stmt)
+
+    # Upsert корзин гистограммы
+    buckets_stmt = insert(EnergyRatingBucket).values([
+        {
+            "energy_id": energy_id,
+            "criteria_id": criteria_id,
+            "bucket": bucket,
+            "count": count,
+        }
+        for (criteria_id, bucket), count in buckets.items()
+    ])
+    buckets_stmt = buckets_stmt.on_conflict_do_update(
+        index_elements=[EnergyRatingBucket.energy_id, EnergyRatingBucket.criteria_id, EnergyRatingBucket.bucket],
+        set_={"count": EnergyRatingBucket.count + buckets_stmt.excluded.count}
+    )
+    db.execute(buckets_stmt)
+
+# =============== READ ENERGY STATS ===============
+def get_energy_stats(db: Session, energy_id: int):
+    """
+    Возвращает средние оценки по критериям и гистограммы оценок энергетика.
+    Читает только предагрегированные строки: O(количество критериев).
+    """
+    return get_energies_stats(db, [energy_id])[energy_id]
+
+def get_energies_stats(db: Session, energy_ids) -> dict:
+    """
+    Возвращает статистику по критериям сразу для нескольких энергетиков: {energy_id: статистика}.
+    Выполняет по одному запросу на таблицу агрегатов независимо от количества энергетиков.
+    """
+    energy_ids = list(energy_ids)
+    # Агрегаты по критериям вместе с названием критерия
+    stats = (
+        db.query(EnergyCriteriaStat, Criteria.name)
+        .join(Criteria, EnergyCriteriaStat.criteria_id == Criteria.id)
+        .filter(EnergyCriteriaStat.energy_id.in_(energy_ids), EnergyCriteriaStat.rating_count > 0)
+        .order_by(EnergyCriteriaStat.energy_id, EnergyCriteriaStat.criteria_id)
+        .all()
+    )
+    # Корзины гистограммы
+    buckets = (
+        db.query(EnergyRatingBucket)
+        .filter(EnergyRatingBucket.energy_id.in_(energy_ids), EnergyRatingBucket.count > 0)
+        .all()
+    )
+
+    # Раскладываем корзины по энергетикам и критериям
+    histograms = {}
+    result = {
+        energy_id: {"energy_id": energy_id, "criteria": [], "histogram": [0] * HISTOGRAM_BUCKETS}
+        for energy_id in energy_ids
+    }
+    for bucket in buckets:
+        histogram = histograms.setdefault((bucket.energy_id, bucket.criteria_id), [0] * HISTOGRAM_BUCKETS)
+        histogram[bucket.bucket] += bucket.count
+        result[bucket.energy_id]["histogram"][bucket.bucket] += bucket.count
+
+    for stat, name in stats:
+        result[stat.energy_id]["criteria"].append({
+            "criteria_id": stat.criteria_id,
+            "name": name,
+            "average_rating": float(stat.rating_avg),
+            "rating_count": stat.rating_count,
+            "histogram": histograms.get((stat.energy_id, stat.criteria_id), [0] * HISTOGRAM_BUCKETS),
+        })
+    return result
+
+# =============== REBUILD ===============
+def rebuild_energy_stats(db: Session, energy_id: int = None):
+    """
+    Полностью пересчитывает агрегаты по критериям и гистограммы из таблицы ratings.
+    Используется для первичного заполнения и восстановления согласованности.
+    """
+    # Удаляем старые агрегаты
+    stats_query = db.query(EnergyCriteriaStat)
+    buckets_query = db.query(EnergyRatingBucket)
+    if energy_id is not None:
+        stats_query = stats_query.filter(EnergyCriteriaStat.energy_id == energy_id)
+        buckets_query = buckets_query.filter(EnergyRatingBucket.energy_id == energy_id)
+    stats_query.delete(synchronize_session=False)
+    buckets_query.delete(synchronize_session=False)
+
+    # Агрегаты по критериям одним запросом
+    stats_select = (
+        db.query(
+            Review.energy_id,
+            Rating.criteria_id,
+            func.sum(Rating.rating_value),
+            func.count(Rating.id),
+            func.round(func.avg(Rating.rating_value), 4),
+        )
+        .join(Rating, Review.id == Rating.review_id)
+        .filter(Review.energy_id.isnot(None))
+    )
+    # Корзины гистограммы одним запросом
+    bucket_expr = func.least(func.greatest(func.floor(Rating.rating_value), 0), HISTOGRAM_BUCKETS - 1)
+    buckets_select = (
+        db.query(
+            Review.energy_id,
+            Rating.criteria_id,
+            bucket_expr,
+            func.count(Rating.id),
+        )
+        .join(Rating, Review.id == Rating.review_id)
+        .filter(Review.energy_id.isnot(None))
+    )
+    if energy_id is not None:
+        stats_select = stats_select.filter(Review.energy_id == energy_id)
+        buckets_select = buckets_select.filter(Review.energy_id == energy_id)
+    stats_select = stats_select.group_by(Review.energy_id, Rating.criteria_id)
+    buckets_select = buckets_select.group_by(Review.energy_id, Rating.criteria_id, bucket_expr)
+
+    # INSERT ... SELECT без выгрузки строк в Python
+    db.execute(
+        insert(EnergyCriteriaStat).from_select(
+            ["energy_id", "criteria_id", "rating_sum", "rating_count", "rating_avg"],
+            stats_select.statement
+        )
+    )
+    db.execute(
+        insert(EnergyRatingBucket).from_select(
+            ["energy_id", "criteria_id", "bucket", "count"],
+            buckets_select.statement
+        )
+    )
+    # Топ в памяти и ETag перечитают пересчитанные агрегаты
+    bump_data_versions(db, REVIEWS)
+    db.commit()
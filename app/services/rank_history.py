@@ -0,0 +1,106 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timezone, timedelta
+
+from app.db.models import EnergyRankHistory
+from app.services.data_versions import bump_data_versions, get_data_versions, RANK_HISTORY
+
+# Размер пачки при записи снимка
+INSERT_BATCH_SIZE = 5000
+
+# Места из последнего снимка до сегодняшнего дня для всех энергетиков:
+# ((сегодня, версия RANK_HISTORY), {energy_id: место}). Снимки пишутся раз в сутки,
+# поэтому карта загружается один раз на дату и версию истории в каждом процессе
+_previous_ranks = (None, {})
+
+# =============== HELPERS ===============
+def today():
+    """Текущая дата по UTC — дата дневного снимка."""
+    return datetime.now(timezone.utc).date()
+
+# =============== SAVE SNAPSHOT ===============
+def save_rank_snapshot(db: Session, chart, snapshot_date=None) -> int:
+    """
+    Добавляет в историю места всех энергетиков из переданного топа на дату снимка.
+    Повторный запуск за ту же дату ничего не перезаписывает. Возвращает количество строк.
+    """
+    snapshot_date = snapshot_date or today()
+    rows = [
+        {
+            "energy_id": energy["id"],
+            "snapshot_date": snapshot_date,
+            "absolute_rank": energy["absolute_rank"],
+            "average_rating": energy["average_rating"],
+            "review_count": energy["review_count"],
+        }
+        for energy in chart
+    ]
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        stmt = insert(EnergyRankHistory).values(rows[start:start + INSERT_BATCH_SIZE])
+        db.execute(stmt.on_conflict_do_nothing(
+            index_elements=[EnergyRankHistory.energy_id, EnergyRankHistory.snapshot_date]
+        ))
+    # Новая версия данных для ETag
+    bump_data_versions(db, RANK_HISTORY)
+    db.commit()
+    return len(rows)
+
+# =============== READ HISTORY ===============
+def get_rank_history(db: Session, energy_id: int, days: int = 90):
+    """
+    Возвращает историю мест энергетика за последние days дней, от старых к новым.
+    """
+    return (
+        db.query(EnergyRankHistory)
+        .filter(
+            EnergyRankHistory.energy_id == energy_id,
+            EnergyRankHistory.snapshot_date > today() - timedelta(days=days)
+        )
+        .order_by(EnergyRankHistory.snapshot_date)
+        .all()
+    )
+
+# =============== RANK DELTAS ===============
+def get_previous_ranks(db: Session, version: int = None) -> dict:
+    """
+    Места всех энергетиков из последнего снимка до сегодняшнего дня.
+    Карта кэшируется в процессе и перечитывается при смене даты или версии
+    RANK_HISTORY (version, если уже прочитана вызывающим кодом).
+    """
+    global _previous_ranks
+    if version is None:
+        version = get_data_versions(db, [RANK_HISTORY])[RANK_HISTORY]
+    key = (today(), version)
+    cached_key, previous_ranks = _previous_ranks
+    if cached_key == key:
+        return previous_ranks
+    previous_date = (
+        db.query(func.max(EnergyRankHistory.snapshot_date))
+        .filter(EnergyRankHistory.snapshot_date < key[0])
+        .scalar()
+    )
+    previous_ranks = {}
+    if previous_date is not None:
+        previous_ranks = dict(
+            db.query(EnergyRankHistory.energy_id, EnergyRankHistory.absolute_rank)
+            .filter(EnergyRankHistory.snapshot_date == previous_date)
+            .all()
+        )
+    _previous_ranks = (key, previous_ranks)
+    return previous_ranks
+
+def annotate_rank_deltas(db: Session, energies, version: int = None):
+    """
+    Добавляет к энергетикам топа место из последнего снимка до сегодняшнего дня
+    (previous_rank) и изменение места (rank_delta > 0 — поднялся).
+    Места берутся из карты в памяти процесса (get_previous_ranks).
+    """
+    if not energies:
+        return energies
+    previous_ranks = get_previous_ranks(db, version)
+    for energy in energies:
+        previous_rank = previous_ranks.get(energy["id"])
+        energy["previous_rank"] = previous_rank
+        energy["rank_delta"] = previous_rank - energy["absolute_rank"] if previous_rank is not None else None
+    return energies
@@ -0,0 +1,108 @@
+"""
+Кэш "какие энергетики оценил пользователь" в виде битовой карты.
+
+Для каждого пользователя хранится bytearray, где бит с номером energy_id
+установлен, если у пользователя есть отзыв на этот энергетик. Тысяча
+энергетиков занимает 125 байт, проверка — одна операция над байтом,
+поэтому топ и списки энергетиков отмечают rated_by_me без запросов к БД.
+
+Создание отзыва сразу ставит бит (write-through), удаление отзыва
+сбрасывает карту пользователя, и она перечитывается одним запросом.
+Каждый процесс uvicorn держит свой кэш, поэтому карты также
+перечитываются раз в RATED_CACHE_TTL секунд, а количество пользователей
+в кэше ограничено RATED_CACHE_SIZE (вытесняются давно не использованные).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+
+from app.core.config import RATED_CACHE_SIZE, RATED_CACHE_TTL
+from app.db.models import Review
+
+
+class RatedBitmap:
+    """Множество id энергетиков в виде битовой карты."""
+
+    __slots__ = ("bits", "loaded_at")
+
+    def __init__(self, energy_ids=()):
+        energy_ids = list(energy_ids)
+        self.bits = bytearray((max(energy_ids) >> 3) + 1 if energy_ids else 0)
+        for energy_id in energy_ids:
+            self.bits[energy_id >> 3] |= 1 << (energy_id & 7)
+        self.loaded_at = time.monotonic()
+
+    def add(self, energy_id: int):
+        index = energy_id >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(index + 1 - len(self.bits)))
+        self.bits[index] |= 1 << (energy_id & 7)
+
+    def __contains__(self, energy_id) -> bool:
+        index = energy_id >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << (energy_id & 7)))
+
+
+class RatedCache:
+    """LRU-кэш битовых карт по пользователям."""
+
+    def __init__(self, max_size: int = RATED_CACHE_SIZE, ttl: int = RATED_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._bitmaps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> RatedBitmap:
+        """Возвращает карту пользователя, при необходимости читая ее из БД."""
+        with self._lock:
+            bitmap = self._bitmaps.get(user_id)
+            if bitmap is not None and time.monotonic() - bitmap.loaded_at < self.ttl:
+                self._bitmaps.move_to_end(user_id)
+                return bitmap
+        energy_ids = (
+            db.query(Review.energy_id)
+            .filter(Review.user_id == user_id, Review.energy_id.isnot(None))
+            .distinct()
+        )
+        bitmap = RatedBitmap(energy_id for energy_id, in energy_ids)
+        with self._lock:
+            self._bitmaps[user_id] = bitmap
+            self._bitmaps.move_to_end(user_id)
+            while len(self._bitmaps) > self.max_size:
+                self._bitmaps.popitem(last=False)
+        return bitmap
+
+    # =============== WRITE-THROUGH ===============
+    def add(self, user_id: int, energy_id: int):
+        """Отмечает новый отзыв пользователя в карте, если она уже в кэше."""
+        if energy_id is None:
+            return
+        with self._lock:
+            bitmap = self._bitmaps.get(user_id)
+            if bitmap is not None:
+                bitmap.add(energy_id)
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает карту пользователя (удален отзыв или сам пользователь)."""
+        with self._lock:
+            self._bitmaps.pop(user_id, None)
+
+
+# Единственный экземпляр кэша на процесс
+rated_cache = RatedCache()
+
+
+# =============== ANNOTATE ===============
+def annotate_rated_by_me(db: Session, user_id, energies):
+    """
+    Добавляет к энергетикам (словарям с ключом "id") признак rated_by_me.
+    Для гостя (user_id=None) признак остается пустым.
+    """
+    if user_id is None:
+        return energies
+    bitmap = rated_cache.get(db, user_id)
+    for energy in energies:
+        energy["rated_by_me"] = energy["id"] in bitmap
+    return energies
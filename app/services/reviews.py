@@ -1,12 +1,18 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, distinct
-import os
 import time
 
 from app.db.models import Review, Rating, Energy, Brand, User
 
 from app.schemas.reviews import ReviewCreate, ReviewUpdate
 
+from app.services.energy_stats import apply_ratings_delta
+from app.services.trending import apply_trend_delta
+from app.services.top_engine import chart_engine
+from app.services.rated_cache import rated_cache
+from app.services.data_versions import bump_data_versions, REVIEWS
+from app.services.stored_images import acquire_image, release_image, replace_image
+
 # =============== CREATE ===============
 def create_review_with_ratings(db: Session, review: ReviewCreate):
     # Создаём объект Review
@@ -24,6 +30,8 @@ def create_review_with_ratings(db: Session, review: ReviewCreate):
     )
     # Добавляем отзыв в сессию
     db.add(db_review)
+    # Отзыв ссылается на фото
+    acquire_image(db, review.image_url)
     # Фиксируем изменения
     db.commit()
     # Обновляем объект
@@ -42,9 +50,19 @@ def create_review_with_ratings(db: Session, review: ReviewCreate):
         )
         # Добавляем оценку в сессию
         db.add(db_rating)
+    # Обновляем агрегаты энергетика по критериям
+    apply_ratings_delta(db, db_review.energy_id, review.ratings)
+    # Учитываем отзыв в счетчиках трендов текущего часа
+    apply_trend_delta(db, db_review.energy_id, db_review.created_at, review.ratings)
     
     # Фиксируем изменения
+    # Новая версия данных для ETag
+    versions = bump_data_versions(db, REVIEWS)
     db.commit()
+    # Энергетик перечитается в топе в памяти при следующем запросе
+    chart_engine.mark_dirty(db_review.energy_id, versions[REVIEWS])
+    # Отмечаем энергетик как оцененный пользователем
+    rated_cache.add(db_review.user_id, db_review.energy_id)
     # Возвращаем отзыв
     return db_review
 
@@ -63,14 +81,21 @@ def update_review(db: Session, review_id: int, review_update: ReviewUpdate):
     db_review = db.query(Review).filter(Review.id == review_id).first()
     if not db_review:
         return None
+    old_image_url = db_review.image_url
     # Получаем только переданные поля
     update_data = review_update.dict(exclude_unset=True)
     # Обновляем текст отзыва и image_url, если они переданы
     for key, value in update_data.items():
         if key != "ratings":  # Обрабатываем ratings отдельно
             setattr(db_review, key, value)
+    # Старое фото удаляется, если на него больше никто не ссылается
+    replace_image(db, old_image_url, db_review.image_url)
     # Обновляем оценки, если предоставлены
     if "ratings" in update_data and review_update.ratings:
+        # Вычитаем старые оценки из агрегатов энергетика
+        old_ratings = db.query(Rating).filter(Rating.review_id == review_id).all()
+        apply_ratings_delta(db, db_review.energy_id, old_ratings, sign=-1)
+        apply_trend_delta(db, db_review.energy_id, db_review.created_at, old_ratings, sign=-1, review_delta=0)
         # Удаляем существующие оценки
         db.query(Rating).filter(Rating.review_id == review_id).delete()
         # Добавляем новые оценки
@@ -81,10 +106,17 @@ def update_review(db: Session, review_id: int, review_update: ReviewUpdate):
                 rating_value=rating.rating_value
             )
             db.add(db_rating)
+        # Добавляем новые оценки в агрегаты энергетика
+        apply_ratings_delta(db, db_review.energy_id, review_update.ratings)
+        apply_trend_delta(db, db_review.energy_id, db_review.created_at, review_update.ratings, review_delta=0)
     # Фиксируем изменения
+    # Новая версия данных для ETag
+    versions = bump_data_versions(db, REVIEWS)
     db.commit()
     # Обновляем объект
     db.refresh(db_review)
+    # Энергетик перечитается в топе в памяти при следующем запросе
+    chart_engine.mark_dirty(db_review.energy_id, versions[REVIEWS])
     # Вычисляем средний рейтинг
     avg_rating = (
         db.query(func.avg(Rating.rating_value))
@@ -100,14 +132,28 @@ def delete_review(db: Session, review_id: int):
     db_review = db.query(Review).filter(Review.id == review_id).first()
     if not db_review:
         return False
-    if db_review.image_url and os.path.exists(db_review.image_url):
-        os.remove(db_review.image_url)  # Удаляем файл
+    # Освобождаем фото (файл удаляется, если на него больше никто не ссылается)
+    release_image(db, db_review.image_url)
+    # Вычитаем оценки отзыва из агрегатов энергетика
+    old_ratings = db.query(Rating).filter(Rating.review_id == review_id).all()
+    apply_ratings_delta(db, db_review.energy_id, old_ratings, sign=-1)
+    # Вычитаем отзыв из счетчиков трендов (если его час еще в окне)
+    apply_trend_delta(db, db_review.energy_id, db_review.created_at, old_ratings, sign=-1)
     # Удаляем связанные оценки
     db.query(Rating).filter(Rating.review_id == review_id).delete()
+    # Запоминаем энергетик и автора до удаления отзыва
+    energy_id = db_review.energy_id
+    user_id = db_review.user_id
     # Удаляем отзыв
     db.delete(db_review)
     # Фиксируем изменения
+    # Новая версия данных для ETag
+    versions = bump_data_versions(db, REVIEWS)
     db.commit()
+    # Энергетик перечитается в топе в памяти при следующем запросе
+    chart_engine.mark_dirty(energy_id, versions[REVIEWS])
+    # Карта оцененных энергетиков автора перечитается при следующем запросе
+    rated_cache.invalidate(user_id)
     return True
 
 # =============== ONLY ADMINS ===============
@@ -0,0 +1,173 @@
+"""
+Похожие энергетики.
+
+Пакетная задача строит для каждого энергетика вектор средних оценок по критериям
+(из energy_criteria_stats) и вектор "кто из пользователей оставил отзыв" (reviews.user_id),
+считает векторизованное косинусное сходство по обоим сигналам, смешивает их
+с весом SIMILAR_CORATING_WEIGHT и сохраняет SIMILAR_TOP_K лучших соседей
+в таблицу energy_similarities. Эндпоинт читает готовый список по ключу.
+
+Матрица сходства занимает O(N²) памяти по числу энергетиков, что для каталога
+в несколько тысяч позиций — десятки мегабайт в пакетной задаче.
+"""
+
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import insert
+
+from app.core.config import SIMILAR_TOP_K, SIMILAR_CORATING_WEIGHT
+from app.db.models import Energy, Review, Criteria, EnergyCriteriaStat, EnergySimilarity
+
+try:
+    import numpy as np
+except ImportError:  # NumPy нужен только пакетной задаче
+    np = None
+
+# Сколько пользователей обрабатывать за раз при подсчете совместных отзывов
+USER_BLOCK_SIZE = 4096
+# Размер пачки при вставке соседей
+INSERT_BATCH_SIZE = 5000
+
+# =============== HELPERS ===============
+def _normalize_rows(matrix):
+    """Делит строки на их норму, нулевые строки остаются нулевыми."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def _criteria_similarity(db: Session, index: dict):
+    """
+    Косинусное сходство векторов средних оценок по критериям.
+    Оценки центрируются по среднему критерия, иначе все векторы из 0..10
+    смотрят примерно в одну сторону и сходство близко к 1 для любой пары.
+    """
+    criteria_ids = [criteria_id for criteria_id, in db.query(Criteria.id).order_by(Criteria.id)]
+    columns = {criteria_id: j for j, criteria_id in enumerate(criteria_ids)}
+    means = np.zeros((len(index), len(criteria_ids)), dtype=np.float32)
+    rated = np.zeros((len(index), len(criteria_ids)), dtype=bool)
+    rows = (
+        db.query(EnergyCriteriaStat.energy_id, EnergyCriteriaStat.criteria_id, EnergyCriteriaStat.rating_avg)
+        .filter(EnergyCriteriaStat.rating_count > 0)
+    )
+    for energy_id, criteria_id, rating_avg in rows:
+        i = index.get(energy_id)
+        j = columns.get(criteria_id)
+        if i is not None and j is not None:
+            means[i, j] = float(rating_avg)
+            rated[i, j] = True
+
+    # Среднее по каждому критерию среди энергетиков с оценками
+    column_means = means.sum(axis=0) / np.maximum(rated.sum(axis=0), 1)
+    centered = np.where(rated, means - column_means, 0).astype(np.float32)
+    vectors = _normalize_rows(centered)
+    return vectors @ vectors.T
+
+def _corating_similarity(db: Session, index: dict):
+    """
+    Косинусное сходство энергетиков по множествам пользователей, оставивших отзыв:
+    число общих пользователей / sqrt(число пользователей у каждого).
+    Матрица "пользователь × энергетик" собирается блоками, чтобы не держать ее целиком.
+    """
+    n = len(index)
+    pairs = (
+        db.query(Review.user_id, Review.energy_id)
+        .filter(Review.energy_id.isnot(None))
+        .distinct()
+        .all()
+    )
+    co_counts = np.zeros((n, n), dtype=np.float32)
+    if not pairs:
+        return co_counts
+    user_ids = np.array([user_id for user_id, _ in pairs], dtype=np.int64)
+    energy_index = np.array([index.get(energy_id, -1) for _, energy_id in pairs], dtype=np.int64)
+    known = energy_index >= 0
+    users, user_index = np.unique(user_ids[known], return_inverse=True)
+    energy_index = energy_index[known]
+    # Сортируем по пользователю, чтобы каждый блок был непрерывным отрезком
+    order = np.argsort(user_index, kind="stable")
+    user_index = user_index[order]
+    energy_index = energy_index[order]
+
+    for start in range(0, len(users), USER_BLOCK_SIZE):
+        stop = min(start + USER_BLOCK_SIZE, len(users))
+        lo, hi = np.searchsorted(user_index, [start, stop])
+        block = np.zeros((stop - start, n), dtype=np.float32)
+        block[user_index[lo:hi] - start, energy_index[lo:hi]] = 1
+        co_counts += block.T @ block
+
+    counts = np.sqrt(np.diag(co_counts))
+    norms = np.outer(counts, counts)
+    return np.divide(co_counts, norms, out=np.zeros_like(co_counts), where=norms > 0)
+
+# =============== BUILD ===============
+def build_similar_energies(db: Session, top_k: int = SIMILAR_TOP_K, corating_weight: float = SIMILAR_CORATING_WEIGHT) -> int:
+    """
+    Пересчитывает таблицу energy_similarities для всех энергетиков.
+    Возвращает количество сохраненных пар.
+    """
+    if np is None:
+        raise RuntimeError("Для расчета похожих энергетиков нужен NumPy")
+
+    energy_ids = [energy_id for energy_id, in db.query(Energy.id).order_by(Energy.id)]
+    index = {energy_id: i for i, energy_id in enumerate(energy_ids)}
+    rows = []
+    k = min(top_k, len(energy_ids) - 1)
+    if k > 0:
+        similarity = (
+            (1 - corating_weight) * _criteria_similarity(db, index)
+            + corating_weight * _corating_similarity(db, index)
+        )
+        # Энергетик не должен попасть в похожие сам на себя
+        np.fill_diagonal(similarity, -np.inf)
+
+        # Частичная сортировка: k лучших соседей в каждой строке, затем порядок внутри них
+        neighbours = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarity, neighbours, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        neighbours = np.take_along_axis(neighbours, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+
+        for i, energy_id in enumerate(energy_ids):
+            rank = 0
+            for j, score in zip(neighbours[i], scores[i]):
+                # Несвязанные и непохожие энергетики не сохраняем
+                if score <= 0:
+                    break
+                rank += 1
+                rows.append({
+                    "energy_id": energy_id,
+                    "rank": rank,
+                    "similar_energy_id": energy_ids[j],
+                    "score": round(float(min(score, 1.0)), 6),
+                })
+
+    # Заменяем таблицу целиком в одной транзакции: читатели видят старый или новый список
+    db.query(EnergySimilarity).delete(synchronize_session=False)
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.execute(insert(EnergySimilarity), rows[start:start + INSERT_BATCH_SIZE])
+    db.commit()
+    return len(rows)
+
+# =============== READ SIMILAR ===============
+def get_similar_energies(db: Session, energy_id: int, limit: int = 10):
+    """
+    Возвращает предрасчитанные похожие энергетики по порядку сходства.
+    """
+    results = (
+        db.query(EnergySimilarity.score, Energy)
+        .join(Energy, EnergySimilarity.similar_energy_id == Energy.id)
+        .options(joinedload(Energy.brand), joinedload(Energy.category))
+        .filter(EnergySimilarity.energy_id == energy_id)
+        .order_by(EnergySimilarity.rank)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "id": energy.id,
+            "name": energy.name,
+            "brand": energy.brand,
+            "category": energy.category,
+            "image_url": energy.image_url,
+            "similarity": score,
+        }
+        for score, energy in results
+    ]
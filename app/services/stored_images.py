@@ -0,0 +1,183 @@
+import logging
+import time
+
+from sqlalchemy import update, delete, select, exists, or_, event, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.file_utils import delete_image
+from app.core.storage import storage
+
+from app.db.models import StoredImage, Energy, Review, Suggestion, User
+
+# Модели со ссылками на фото (image_url). Фото из директории одной таблицы может
+# использоваться записью другой (фото предложки в отзыве), поэтому проверяются все
+IMAGE_OWNERS = (Energy, Review, Suggestion, User)
+
+# Ключ в session.info: фото, которые нужно удалить после фиксации транзакции
+RELEASED_IMAGES = "released_images"
+
+logger = logging.getLogger(__name__)
+
+# =============== REGISTER ===============
+def register_upload(db: Session, path: str) -> bool:
+    """
+    Добавляет загруженное фото в индекс (со счетчиком 0, пока на него не сошлется запись)
+    или обновляет время загрузки, если такое фото уже есть: очистка не удаляет его,
+    пока клиент не успел создать запись.
+    Возвращает False, если файла после этого нет: загрузка того же фото не записала его,
+    потому что файл еще был, а очистка удалила его, пока строка индекса была заблокирована.
+    После фиксации очистка файл уже не тронет, поэтому его достаточно записать заново.
+    """
+    stat = storage.stat(path)
+    now = int(time.time())
+    stmt = insert(StoredImage).values(
+        path=path,
+        ref_count=0,
+        size=stat[0] if stat else None,
+        mtime=now,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[StoredImage.path],
+        set_={"size": stmt.excluded.size, "mtime": now}
+    ))
+    db.commit()
+    return storage.exists(path)
+
+# =============== ACQUIRE ===============
+def acquire_image(db: Session, path: str):
+    """
+    Увеличивает счетчик ссылок на фото, когда запись начинает его использовать.
+    Изменения фиксирует вызывающий код.
+    """
+    if not path:
+        return
+    now = int(time.time())
+    stmt = insert(StoredImage).values(path=path, ref_count=1, mtime=now)
+    # Новое время блокирует строку до фиксации: очистка не удалит фото, на которое ссылаются сейчас
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[StoredImage.path],
+        set_={"ref_count": StoredImage.ref_count + 1, "mtime": now}
+    ))
+
+# =============== RELEASE ===============
+def release_image(db: Session, path: str):
+    """
+    Уменьшает счетчик ссылок на фото. Когда ссылок не осталось, файл с вариантами
+    удаляется после фиксации транзакции (при откате остается на месте).
+    Фото без счетчика (загруженные до хранения по хэшу) принадлежали одной записи
+    и удаляются так же. Изменения фиксирует вызывающий код.
+    """
+    if not path:
+        return
+    # Время изменения счетчика: очистка проверит строку заново и выждет период ожидания
+    remaining = db.execute(
+        update(StoredImage)
+        .where(StoredImage.path == path)
+        .values(ref_count=StoredImage.ref_count - 1, mtime=int(time.time()))
+        .returning(StoredImage.ref_count)
+    ).scalar()
+    if remaining is not None and remaining > 0:
+        return
+    db.info.setdefault(RELEASED_IMAGES, []).append((path, remaining is None))
+
+def _delete_released_image(db: Session, path: str, legacy: bool):
+    """
+    Удаляет строку индекса и файл фото, если на него так и не появилось новых ссылок.
+    Строка удаляется первой и остается заблокированной до фиксации, поэтому новая
+    ссылка или загрузка того же фото дождется удаления файла.
+    """
+    if not legacy:
+        deleted = db.execute(
+            delete(StoredImage)
+            .where(StoredImage.path == path, StoredImage.ref_count <= 0)
+            .returning(StoredImage.path)
+        ).scalar()
+        if deleted is None:
+            return
+    delete_image(path)
+
+@event.listens_for(Session, "after_commit")
+def _delete_released_images(session: Session):
+    """Удаляет фото, освобожденные зафиксированной транзакцией (release_image)."""
+    released = session.info.pop(RELEASED_IMAGES, None)
+    if not released:
+        return
+    # В after_commit сессия не может выполнять запросы: удаляем в отдельной
+    with Session(bind=session.get_bind()) as db:
+        for path, legacy in released:
+            try:
+                _delete_released_image(db, path, legacy)
+                db.commit()
+            except Exception:
+                # Строка со счетчиком 0 останется в индексе, фото удалит очистка
+                db.rollback()
+                logger.exception("Не удалось удалить фото %s", path)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_released_images(session: Session):
+    """Откаченные освобождения фото не применяются."""
+    session.info.pop(RELEASED_IMAGES, None)
+
+# =============== REPLACE ===============
+def replace_image(db: Session, old_path: str, new_path: str):
+    """Переносит ссылку записи со старого фото на новое (при изменении image_url)."""
+    if old_path == new_path:
+        return
+    acquire_image(db, new_path)
+    release_image(db, old_path)
+
+# =============== ORPHANS ===============
+def _normalized_path(column):
+    """
+    Путь без повторных "/" и сегментов "./" (как Path в Python): старые записи хранят
+    пути вида uploads/reviews//<имя>.jpg или ./uploads/..., а индекс — нормализованные.
+    """
+    column = func.regexp_replace(column, "/{2,}", "/", "g")
+    return func.regexp_replace(column, r"(^|/)(\./)+", r"\1", "g")
+
+def _is_referenced():
+    """Условие "на фото ссылается хотя бы одна запись" для строки индекса (пути сравниваются нормализованными)."""
+    path = _normalized_path(StoredImage.path)
+    return or_(*(exists().where(_normalized_path(model.image_url) == path) for model in IMAGE_OWNERS))
+
+def _orphan_conditions(cutoff: int, after: str = None, since: int = None) -> list:
+    conditions = [StoredImage.mtime < cutoff, ~_is_referenced()]
+    if after is not None:
+        conditions.append(StoredImage.path > after)
+    if since is not None:
+        conditions.append(StoredImage.mtime >= since)
+    return conditions
+
+def find_orphan_images(db: Session, cutoff: int, after: str = None, since: int = None, limit: int = 500) -> list:
+    """
+    Пачка фото из индекса, на которые не ссылается ни одна запись и которые не менялись
+    с момента cutoff, в порядке путей после after: [(путь, размер)].
+    since — рассматривать только фото, у которых не раньше этого времени была загрузка
+    или изменение счетчика ссылок (в том числе освобождение последней ссылки).
+    """
+    return db.execute(
+        select(StoredImage.path, StoredImage.size)
+        .where(*_orphan_conditions(cutoff, after, since))
+        .order_by(StoredImage.path)
+        .limit(limit)
+    ).all()
+
+def delete_orphan_images(db: Session, cutoff: int, after: str = None, since: int = None, limit: int = 500) -> list:
+    """
+    Удаляет из индекса пачку фото без ссылок (см. find_orphan_images) и возвращает [(путь, размер)].
+    Строки, которые сейчас меняет другая транзакция, пропускаются. Файлы удаляет
+    и изменения фиксирует вызывающий код: до фиксации прерванная очистка ничего не теряет.
+    """
+    batch = (
+        select(StoredImage.path)
+        .where(*_orphan_conditions(cutoff, after, since))
+        .order_by(StoredImage.path)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return db.execute(
+        delete(StoredImage)
+        .where(StoredImage.path.in_(batch))
+        .returning(StoredImage.path, StoredImage.size)
+    ).all()
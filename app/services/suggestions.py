@@ -1,8 +1,6 @@
 """Сервисный слой для работы с предложками энергетиков."""
 
 import os
-import shutil
-import uuid
 from datetime import datetime
 from sqlalchemy.orm import Session, joinedload
 
@@ -14,41 +12,49 @@ from app.db.models.energy import Energy
 from app.db.models.review import Review
 from app.db.models.rating import Rating
 from app.core.config import UPLOAD_DIR_SUGGESTION, UPLOAD_DIR_REVIEW
+from app.core.file_utils import find_image, link_image, shard_path
+from app.core.storage import storage
+from app.services.energy_stats import apply_ratings_delta
+from app.services.trending import apply_trend_delta
+from app.services.top_engine import chart_engine
+from app.services.rated_cache import rated_cache
+from app.services.data_versions import bump_data_versions, BRANDS, ENERGIES, REVIEWS
+from app.services.stored_images import acquire_image, release_image, replace_image
+
+
+def suggestion_image_path(image_url: str | None) -> str | None:
+    """Путь фото предложки в папке предложок (по имени файла, если image_url указывает не туда)."""
+    if not image_url:
+        return None
+    if os.path.normpath(image_url).startswith(os.path.normpath(UPLOAD_DIR_SUGGESTION) + os.sep):
+        return image_url
+    return os.path.join(UPLOAD_DIR_SUGGESTION, os.path.basename(image_url))
 
 
 def copy_suggestion_image_to_review(image_url: str | None) -> str | None:
-    """Копирует фото предложки в папку отзывов и возвращает новый путь.
+    """Делает фото предложки доступным в папке отзывов и возвращает новый путь.
+    
+    Байты не проходят через приложение: в папке отзывов создается жесткая ссылка
+    на тот же файл (в S3 — копия на стороне хранилища) с тем же именем (хэшем содержимого).
     
     Args:
         image_url: Путь к фото в папке предложок
         
     Returns:
-        Путь к скопированному фото в папке отзывов или None
+        Путь к фото в папке отзывов или None
     """
-    if not image_url:
+    src_path = suggestion_image_path(image_url)
+    if not src_path or not storage.exists(src_path):
         return None
     
-    src_path = os.path.join(UPLOAD_DIR_SUGGESTION, os.path.basename(image_url))
-    if not os.path.exists(src_path):
-        return None
-    
-    # Генерируем уникальное имя файла
-    ext = os.path.splitext(src_path)[1]
-    new_filename = f"{uuid.uuid4()}{ext}"
-    dst_path = os.path.join(UPLOAD_DIR_REVIEW, new_filename)
-    
-    shutil.copy2(src_path, dst_path)
-    os.remove(src_path)  # Удаляем оригинал
+    file_name = os.path.basename(src_path)
+    dst_path = find_image(UPLOAD_DIR_REVIEW, file_name)
+    if dst_path is None:
+        dst_path = shard_path(UPLOAD_DIR_REVIEW, file_name)
+        # Ссылка на фото вместе с вариантами
+        link_image(src_path, dst_path)
     
-    return f"{UPLOAD_DIR_REVIEW}/{new_filename}"
-
-
-def _delete_suggestion_image(image_url: str | None):
-    """Удаляет фото предложки если существует."""
-    if image_url:
-        filepath = os.path.join(UPLOAD_DIR_SUGGESTION, os.path.basename(image_url))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+    return dst_path
 
 
 def create_suggestion(db: Session, user_id: int, payload: SuggestionCreate):
@@ -75,6 +81,8 @@ def create_suggestion(db: Session, user_id: int, payload: SuggestionCreate):
     )
     db.add(suggestion)
     db.flush()
+    # Предложка ссылается на фото
+    acquire_image(db, suggestion_image_path(payload.image_url))
     
     # Создаем отзыв если есть оценки (даже без текста)
     if payload.ratings:
@@ -176,6 +184,8 @@ def update_suggestion(db: Session, user_id: int, suggestion_id: int, payload: Su
     if payload.category_id is not None:
         suggestion.category_id = payload.category_id
     if payload.image_url is not None:
+        # Старое фото удаляется, если на него больше никто не ссылается
+        replace_image(db, suggestion_image_path(suggestion.image_url), suggestion_image_path(payload.image_url))
         suggestion.image_url = payload.image_url
     
     # Обновляем отзыв если существует
@@ -249,16 +259,31 @@ def approve_suggestion(db: Session, suggestion_id: int):
     db.flush()
 
     # Обновляем отзыв: устанавливаем energy_id и копируем фото
+    review_user_id = None
     if suggestion.review:
+        review_user_id = suggestion.review.user_id
         suggestion.review.energy_id = energy.id
+        # Оценки отзыва начинают учитываться в агрегатах нового энергетика
+        apply_ratings_delta(db, energy.id, suggestion.review.ratings)
+        apply_trend_delta(db, energy.id, suggestion.review.created_at, suggestion.review.ratings)
         review_image_url = copy_suggestion_image_to_review(suggestion.image_url)
         if review_image_url:
+            replace_image(db, suggestion.review.image_url, review_image_url)
             suggestion.review.image_url = review_image_url
 
     # Обновляем статус предложки
     suggestion.status = SuggestionStatus.approved
+    # Предложка удаляется: ее ссылка на фото освобождается (у отзыва своя ссылка)
+    release_image(db, suggestion_image_path(suggestion.image_url))
     db.delete(suggestion)
+    # Новая версия данных для ETag
+    bump_data_versions(db, ENERGIES, BRANDS, REVIEWS)
     db.commit()
+    # Новый энергетик в каталоге: топ в памяти загрузится заново
+    chart_engine.invalidate()
+    # Отзыв автора предложки теперь относится к новому энергетику
+    if review_user_id is not None:
+        rated_cache.add(review_user_id, energy.id)
     return energy
 
 
@@ -305,8 +330,8 @@ def delete_suggestion(db: Session, user_id: int, suggestion_id: int):
     if suggestion.status not in (SuggestionStatus.pending, SuggestionStatus.rejected):
         return None
     
-    # Удаляем связанное фото
-    _delete_suggestion_image(suggestion.image_url)
+    # Освобождаем связанное фото (файл удаляется, если на него больше никто не ссылается)
+    release_image(db, suggestion_image_path(suggestion.image_url))
     
     db.delete(suggestion)
     db.commit()
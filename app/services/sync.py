@@ -0,0 +1,116 @@
+from sqlalchemy.orm import Session
+import time
+
+from app.core.config import SYNC_SAFETY_LAG
+from app.db.models import Energy, Brand, Category, CatalogTombstone
+
+# Сущности каталога в порядке, в котором клиенту удобно их применять
+SYNC_ENTITIES = {
+    "category": Category,
+    "brand": Brand,
+    "energy": Energy,
+}
+
+# =============== TOMBSTONES ===============
+def record_tombstones(db: Session, entity: str, entity_ids):
+    """
+    Записывает удаление строк каталога, чтобы клиенты синхронизации удалили их у себя.
+    Вызывается до удаления в той же транзакции, изменения фиксирует вызывающий код.
+    """
+    db.add_all(CatalogTombstone(entity=entity, entity_id=entity_id) for entity_id in entity_ids)
+
+# =============== SERIALIZE ===============
+def _category_row(category: Category) -> dict:
+    return {"id": category.id, "name": category.name, "version": category.version}
+
+def _brand_row(brand: Brand) -> dict:
+    return {"id": brand.id, "name": brand.name, "version": brand.version}
+
+def _energy_row(energy: Energy) -> dict:
+    return {
+        "id": energy.id,
+        "name": energy.name,
+        "brand_id": energy.brand_id,
+        "category_id": energy.category_id,
+        "description": energy.description,
+        "ingredients": energy.ingredients,
+        "image_url": energy.image_url,
+        "version": energy.version,
+    }
+
+_SERIALIZERS = {
+    "category": _category_row,
+    "brand": _brand_row,
+    "energy": _energy_row,
+}
+
+# =============== READ CHANGES ===============
+def get_catalog_changes(db: Session, since: int = 0, limit: int = 1000):
+    """
+    Возвращает изменения каталога с версией больше since: созданные и измененные
+    категории, бренды и энергетики, а также удаления (tombstones).
+    Все сущности используют одну последовательность версий, поэтому изменения
+    сливаются по версии, и за один ответ отдается не больше limit самых ранних.
+    Клиент сохраняет полученную version и передает ее в следующем запросе;
+    пока has_more=true, нужно запрашивать следующую порцию.
+
+    Версия выдается строке при записи, а видимой строка становится при фиксации:
+    транзакция с меньшей версией может зафиксироваться позже транзакции с большей.
+    Поэтому изменения отдаются только до первого, записанного меньше SYNC_SAFETY_LAG
+    секунд назад: к этому времени все транзакции с меньшими версиями уже
+    зафиксированы, и курсор клиента не перескочит через них.
+    """
+    cutoff = int(time.time()) - SYNC_SAFETY_LAG
+    # Из каждой таблицы достаточно limit + 1 самых ранних изменений (по индексу version)
+    changes = []
+    for entity, model in SYNC_ENTITIES.items():
+        rows = (
+            db.query(model)
+            .filter(model.version > since)
+            .order_by(model.version)
+            .limit(limit + 1)
+            .all()
+        )
+        changes.extend((row.version, entity, row) for row in rows)
+    # При первой синхронизации у клиента нет данных, удаления ему не нужны
+    if since > 0:
+        tombstones = (
+            db.query(CatalogTombstone)
+            .filter(CatalogTombstone.version > since)
+            .order_by(CatalogTombstone.version)
+            .limit(limit + 1)
+            .all()
+        )
+        changes.extend((tombstone.version, "deleted", tombstone) for tombstone in tombstones)
+
+    changes.sort(key=lambda change: change[0])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    # Свежие изменения (и все после них) отдаются в следующих запросах
+    for i, (_, kind, row) in enumerate(changes):
+        if (_changed_at(kind, row) or 0) > cutoff:
+            changes = changes[:i]
+            has_more = False
+            break
+
+    result = {
+        "version": changes[-1][0] if changes else since,
+        "has_more": has_more,
+        "categories": [],
+        "brands": [],
+        "energies": [],
+        "deleted": {"categories": [], "brands": [], "energies": []},
+    }
+    for _, kind, row in changes:
+        if kind == "deleted":
+            result["deleted"][_plural(row.entity)].append(row.entity_id)
+        else:
+            result[_plural(kind)].append(_SERIALIZERS[kind](row))
+    return result
+
+def _changed_at(kind: str, row):
+    """Время записи изменения (у строк, записанных до появления поля, — None)."""
+    return row.deleted_at if kind == "deleted" else row.updated_at
+
+def _plural(entity: str) -> str:
+    return {"category": "categories", "brand": "brands", "energy": "energies"}[entity]
@@ -1,9 +1,99 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, distinct, or_
+from sqlalchemy import func, desc, distinct, or_, and_, true, tuple_
 from sqlalchemy.sql.expression import func as sql_func
 
-from app.db.models import Energy, Review, Rating, Brand
+from app.db.models import Energy, Review, Rating, Brand, Category, EnergyCriteriaStat
 from app.schemas.top import EnergyTop, BrandTop
+from app.services.top_engine import (
+    chart_engine,
+    is_enabled as chart_engine_enabled,
+    is_available as chart_engine_available,
+)
+from app.services.energy_stats import HISTOGRAM_BUCKETS, rating_facets
+from app.services.rank_history import annotate_rank_deltas, save_rank_snapshot
+from app.services.top_snapshot import (
+    is_enabled as chart_snapshot_enabled,
+    energy_chart_snapshot,
+    brand_chart_snapshot,
+    write_energy_snapshot,
+    write_brand_snapshot,
+)
+from app.services.data_versions import get_data_versions, CHART_DATA, RANK_HISTORY
+
+# =============== HELPERS ===============
+def _avg_rating_subquery(db: Session, criteria_id: int = None):
+    """
+    Подзапрос со средним рейтингом энергетиков (energy_id, avg_rating).
+    Без criteria_id считает общий средний по всем оценкам,
+    с criteria_id берет готовое среднее по критерию из energy_criteria_stats (по индексу).
+    """
+    if criteria_id is not None:
+        return (
+            db.query(
+                EnergyCriteriaStat.energy_id,
+                EnergyCriteriaStat.rating_avg.label('avg_rating')
+            )
+            .filter(EnergyCriteriaStat.criteria_id == criteria_id, EnergyCriteriaStat.rating_count > 0)
+            .subquery()
+        )
+    return (
+        db.query(
+            Review.energy_id,
+            func.round(func.avg(Rating.rating_value), 4).label('avg_rating')
+        )
+        .join(Rating)
+        .group_by(Review.energy_id)
+        .subquery()
+    )
+
+def parse_weights(weights: str) -> dict:
+    """
+    Разбирает веса критериев вида "taste:2,price:1" в {критерий: вес}.
+    Критерий задается названием или id, вес — неотрицательное число.
+    """
+    result = {}
+    for part in weights.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        key, sep, value = part.rpartition(":")
+        key = key.strip()
+        if not sep or not key:
+            raise ValueError(f"Неверный формат веса '{part}', ожидается критерий:вес")
+        try:
+            weight = float(value)
+        except ValueError:
+            raise ValueError(f"Вес критерия '{key}' должен быть числом")
+        if not 0 <= weight <= 1000:
+            raise ValueError(f"Вес критерия '{key}' должен быть от 0 до 1000")
+        result[key] = weight
+    if not result:
+        raise ValueError("Не указаны веса критериев")
+    return result
+
+def _current_snapshot(db: Session, reader, versions: dict = None):
+    """
+    Снимок топа, построенный не раньше текущих версий данных, или None.
+    Версии читаются, только если снимки включены.
+    """
+    if not chart_snapshot_enabled():
+        return None
+    return reader.current(versions or get_data_versions(db, CHART_DATA))
+
+def _contains_pattern(term: str) -> str:
+    """
+    Шаблон LIKE "содержит term" (с escape="\\"): % и _ из поискового запроса ищутся буквально,
+    как в движке в памяти и снимке топа.
+    """
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _check_weights(criteria_id: int = None):
+    """Проверяет, что взвешенный топ можно построить с переданными параметрами."""
+    if criteria_id is not None:
+        raise ValueError("Параметры weights и criteria_id нельзя использовать вместе")
+    if not chart_engine_available():
+        raise ValueError("Взвешенный топ недоступен: не установлен NumPy")
 
 # =============== READ ENERGY CHART ===============
 def get_top_energies(
@@ -13,18 +103,86 @@ def get_top_energies(
     search_query: str = None,
     min_rating: float = None,
     max_rating: float = None,
-    category_id: int = None
+    category_id: int = None,
+    criteria_id: int = None,
+    weights: str = None
 ):
-    # Подзапрос для среднего рейтинга
-    avg_rating_subquery = (
-        db.query(
-            Review.energy_id,
-            func.round(func.avg(Rating.rating_value), 4).label('avg_rating')
+    """
+    Топ энергетиков. Если передан criteria_id, рейтинг, фильтры по рейтингу
+    и абсолютная позиция считаются по средней оценке выбранного критерия.
+    С weights ("taste:2,price:1") — по взвешенному среднему критериев из матрицы в памяти.
+    Общий топ отдается из снимка (CHART_SNAPSHOT_DIR) или движка в памяти, если они включены,
+    и дополняется изменением места с последнего дневного снимка истории.
+    """
+    if weights:
+        _check_weights(criteria_id)
+        return chart_engine.top_weighted_energies(
+            db,
+            parse_weights(weights),
+            limit=limit,
+            offset=offset,
+            search_query=search_query,
+            min_rating=min_rating,
+            max_rating=max_rating,
+            category_id=category_id
         )
-        .join(Rating)
-        .group_by(Review.energy_id)
-        .subquery()
-    )
+    if criteria_id is not None:
+        return get_top_energies_sql(
+            db,
+            limit=limit,
+            offset=offset,
+            search_query=search_query,
+            min_rating=min_rating,
+            max_rating=max_rating,
+            category_id=category_id,
+            criteria_id=criteria_id
+        )
+
+    # Версии данных читаются один раз: для снимка и для истории мест
+    versions = get_data_versions(db, CHART_DATA + (RANK_HISTORY,))
+    # Общий снимок топа, разделяемый процессами через mmap
+    snapshot = _current_snapshot(db, energy_chart_snapshot, versions)
+    if snapshot is not None:
+        results = snapshot.top(limit, offset, search_query, min_rating, max_rating, category_id)
+    # Движок в памяти процесса
+    elif chart_engine_enabled():
+        results = chart_engine.top_energies(
+            db,
+            limit=limit,
+            offset=offset,
+            search_query=search_query,
+            min_rating=min_rating,
+            max_rating=max_rating,
+            category_id=category_id
+        )
+    else:
+        results = get_top_energies_sql(
+            db,
+            limit=limit,
+            offset=offset,
+            search_query=search_query,
+            min_rating=min_rating,
+            max_rating=max_rating,
+            category_id=category_id
+        )
+    # История мест ведется только для общего топа
+    return annotate_rank_deltas(db, results, versions[RANK_HISTORY])
+
+def get_top_energies_sql(
+    db: Session,
+    limit: int = 10,
+    offset: int = 0,
+    search_query: str = None,
+    min_rating: float = None,
+    max_rating: float = None,
+    category_id: int = None,
+    criteria_id: int = None
+):
+    """
+    Топ энергетиков напрямую из PostgreSQL (limit=None — весь топ).
+    """
+    # Подзапрос для среднего рейтинга (общего или по критерию)
+    avg_rating_subquery = _avg_rating_subquery(db, criteria_id)
 
     # Подзапрос для количества отзывов
     review_count_subquery = (
@@ -45,7 +203,8 @@ def get_top_energies(
                     desc(func.coalesce(avg_rating_subquery.c.avg_rating, 0)),
                     desc(func.coalesce(review_count_subquery.c.review_count, 0)),
                     Brand.name,
-                    Energy.name
+                    Energy.name,
+                    Energy.id  # Стабильный порядок при полном совпадении
                 ]
             ).label('absolute_rank')
         )
@@ -74,11 +233,11 @@ def get_top_energies(
     if search_query:
         search_terms = search_query.lower().split()
         for term in search_terms:
-            search_pattern = f"%{term}%"
+            search_pattern = _contains_pattern(term)
             query = query.filter(
                 or_(
-                    func.lower(Energy.name).like(search_pattern),
-                    func.lower(Brand.name).like(search_pattern)
+                    func.lower(Energy.name).like(search_pattern, escape="\\"),
+                    func.lower(Brand.name).like(search_pattern, escape="\\")
                 )
             )
 
@@ -100,7 +259,8 @@ def get_top_energies(
                 review_count_subquery.c.review_count, 0
             )),  # Сортировка по числовому значению количества отзывов
             Brand.name,
-            Energy.name
+            Energy.name,
+            Energy.id  # Стабильный порядок при полном совпадении
         )
         .offset(offset)
         .limit(limit)
@@ -127,6 +287,32 @@ def get_top_brands(
     min_rating: float = None,
     max_rating: float = None
 ):
+    """
+    Топ брендов. Отдается из снимка (CHART_SNAPSHOT_DIR), если он включен.
+    """
+    snapshot = _current_snapshot(db, brand_chart_snapshot)
+    if snapshot is not None:
+        return snapshot.top(limit, offset, search_query, min_rating, max_rating)
+    return get_top_brands_sql(
+        db,
+        limit=limit,
+        offset=offset,
+        search_query=search_query,
+        min_rating=min_rating,
+        max_rating=max_rating
+    )
+
+def get_top_brands_sql(
+    db: Session,
+    limit: int = 10,
+    offset: int = 0,
+    search_query: str = None,
+    min_rating: float = None,
+    max_rating: float = None
+):
+    """
+    Топ брендов напрямую из PostgreSQL (limit=None — весь топ).
+    """
     # Подзапрос для среднего рейтинга энергетиков бренда
     energy_avg_subquery = (
         db.query(
@@ -186,8 +372,8 @@ def get_top_brands(
     if search_query:
         search_terms = search_query.lower().split()
         for term in search_terms:
-            search_pattern = f"%{term}%"
-            query = query.filter(func.lower(Brand.name).like(search_pattern))
+            search_pattern = _contains_pattern(term)
+            query = query.filter(func.lower(Brand.name).like(search_pattern, escape="\\"))
 
     # Фильтр по среднему рейтингу бренда (average_rating)
     if min_rating is not None:
@@ -234,16 +420,20 @@ def get_top_brands(
     ]
 
 # =============== READ TOTAL ENERGY COUNT ===============
-def get_total_energies(db: Session, search_query: str = None, min_rating: float = None, max_rating: float = None, category_id: int = None):
-    avg_rating_subquery = (
-        db.query(
-            Review.energy_id,
-            func.round(func.avg(Rating.rating_value), 4).label('avg_rating')
+def get_total_energies(db: Session, search_query: str = None, min_rating: float = None, max_rating: float = None, category_id: int = None, criteria_id: int = None, weights: str = None):
+    if weights:
+        _check_weights(criteria_id)
+        return chart_engine.total_weighted_energies(
+            db, parse_weights(weights), search_query, min_rating, max_rating, category_id
         )
-        .join(Rating)
-        .group_by(Review.energy_id)
-        .subquery()
-    )
+    if criteria_id is None:
+        snapshot = _current_snapshot(db, energy_chart_snapshot)
+        if snapshot is not None:
+            return snapshot.total(search_query, min_rating, max_rating, category_id)
+        if chart_engine_enabled():
+            return chart_engine.total_energies(db, search_query, min_rating, max_rating, category_id)
+
+    avg_rating_subquery = _avg_rating_subquery(db, criteria_id)
 
     query = (
         db.query(Energy)
@@ -254,11 +444,11 @@ def get_total_energies(db: Session, search_query: str = None, min_rating: float
     if search_query:
         search_terms = search_query.lower().split()
         for term in search_terms:
-            search_pattern = f"%{term}%"
+            search_pattern = _contains_pattern(term)
             query = query.filter(
                 or_(
-                    func.lower(Energy.name).like(search_pattern),
-                    func.lower(Brand.name).like(search_pattern)
+                    func.lower(Energy.name).like(search_pattern, escape="\\"),
+                    func.lower(Brand.name).like(search_pattern, escape="\\")
                 )
             )
 
@@ -271,8 +461,119 @@ def get_total_energies(db: Session, search_query: str = None, min_rating: float
 
     return query.count()
 
+# =============== READ ENERGY CHART FACETS ===============
+def get_energy_facets(db: Session, search_query: str = None, min_rating: float = None, max_rating: float = None, category_id: int = None, criteria_id: int = None, weights: str = None):
+    """
+    Фасеты топа энергетиков для панели фильтров: общее количество, количество
+    по категориям (без учета фильтра категории) и по корзинам рейтинга
+    (без учета фильтра рейтинга) при текущем поиске.
+    Считаются из того же источника, что и страница топа (снимок, движок или SQL),
+    чтобы количество совпадало со списком.
+    """
+    snapshot = _current_snapshot(db, energy_chart_snapshot) if not weights and criteria_id is None else None
+    if weights:
+        _check_weights(criteria_id)
+        facets = chart_engine.facets(db, search_query, min_rating, max_rating, category_id, parse_weights(weights))
+    elif snapshot is not None:
+        facets = snapshot.facets(search_query, min_rating, max_rating, category_id)
+    elif criteria_id is None and chart_engine_enabled():
+        facets = chart_engine.facets(db, search_query, min_rating, max_rating, category_id)
+    else:
+        facets = get_energy_facets_sql(db, search_query, min_rating, max_rating, category_id, criteria_id)
+    # Сначала самые многочисленные категории, энергетики без категории — в конце
+    facets["categories"].sort(key=lambda c: (c["id"] is None, -c["count"], c["name"] or ""))
+    return facets
+
+def get_energy_facets_sql(db: Session, search_query: str = None, min_rating: float = None, max_rating: float = None, category_id: int = None, criteria_id: int = None):
+    """
+    Все фасеты одним запросом GROUPING SETS. Фильтр рейтинга и фильтр категории
+    не отсекают строки в WHERE, а вычисляются как флаги, и каждый набор группировки
+    считает count(*) FILTER по флагам, которые к нему относятся.
+    """
+    avg_rating_subquery = _avg_rating_subquery(db, criteria_id)
+    avg_rating = avg_rating_subquery.c.avg_rating
+
+    rating_conditions = []
+    if min_rating is not None:
+        rating_conditions.append(avg_rating >= min_rating)
+    if max_rating is not None:
+        rating_conditions.append(avg_rating <= max_rating)
+    category_condition = Energy.category_id == category_id if category_id is not None else true()
+
+    # Энергетики под текущим поиском с корзиной рейтинга и флагами фильтров
+    base_query = (
+        db.query(
+            Energy.id,
+            Category.id.label('category_id'),
+            Category.name.label('category_name'),
+            func.coalesce(
+                func.least(func.greatest(func.floor(avg_rating), 0), HISTOGRAM_BUCKETS - 1), -1
+            ).label('bucket'),
+            and_(true(), *rating_conditions).label('rating_ok'),
+            category_condition.label('category_ok'),
+        )
+        .join(Brand)
+        .outerjoin(Category, Energy.category_id == Category.id)
+        .outerjoin(avg_rating_subquery, Energy.id == avg_rating_subquery.c.energy_id)
+    )
+    if search_query:
+        for term in search_query.lower().split():
+            search_pattern = _contains_pattern(term)
+            base_query = base_query.filter(
+                or_(
+                    func.lower(Energy.name).like(search_pattern, escape="\\"),
+                    func.lower(Brand.name).like(search_pattern, escape="\\")
+                )
+            )
+    base = base_query.subquery()
+
+    rows = (
+        db.query(
+            base.c.category_id,
+            base.c.category_name,
+            base.c.bucket,
+            func.grouping(base.c.category_id).label('no_category'),
+            func.grouping(base.c.bucket).label('no_bucket'),
+            func.count().filter(base.c.rating_ok).label('category_count'),
+            func.count().filter(base.c.category_ok).label('bucket_count'),
+            func.count().filter(and_(base.c.rating_ok, base.c.category_ok)).label('total'),
+        )
+        .group_by(func.grouping_sets(
+            tuple_(base.c.category_id, base.c.category_name),
+            base.c.bucket,
+            tuple_()
+        ))
+        .all()
+    )
+
+    total = 0
+    unrated = 0
+    categories = []
+    bucket_counts = [0] * HISTOGRAM_BUCKETS
+    for row in rows:
+        if row.no_category and row.no_bucket:
+            total = row.total
+        elif row.no_bucket:
+            if row.category_count:
+                categories.append({"id": row.category_id, "name": row.category_name, "count": row.category_count})
+        elif row.bucket < 0:
+            unrated = row.bucket_count
+        else:
+            bucket_counts[int(row.bucket)] = row.bucket_count
+
+    return {
+        "total": total,
+        "categories": categories,
+        "ratings": rating_facets(bucket_counts),
+        "unrated": unrated,
+    }
+
 # =============== READ TOTAL BRAND COUNT ===============
 def get_total_brands(db: Session, search_query: str = None, min_rating: float = None, max_rating: float = None):
+    snapshot = _current_snapshot(db, brand_chart_snapshot)
+    if snapshot is not None:
+        return snapshot.total(search_query, min_rating, max_rating)
+
     energy_avg_subquery = (
         db.query(
             Energy.brand_id,
@@ -293,8 +594,8 @@ def get_total_brands(db: Session, search_query: str = None, min_rating: float =
     if search_query:
         search_terms = search_query.lower().split()
         for term in search_terms:
-            search_pattern = f"%{term}%"
-            query = query.filter(func.lower(Brand.name).like(search_pattern))
+            search_pattern = _contains_pattern(term)
+            query = query.filter(func.lower(Brand.name).like(search_pattern, escape="\\"))
 
     # Фильтр по среднему рейтингу бренда для подсчета
     if min_rating is not None:
@@ -310,4 +611,28 @@ def get_total_brands(db: Session, search_query: str = None, min_rating: float =
             ) <= max_rating
         )
 
-    return query.group_by(Brand.id).count()
\ No newline at end of file
+    return query.group_by(Brand.id).count()
+
+# =============== BUILD CHART SNAPSHOTS ===============
+def build_chart_snapshots(db: Session) -> bool:
+    """
+    Строит полные топы энергетиков и брендов из PostgreSQL и записывает их в снимки,
+    которые читают все процессы через mmap. Если снимки уже построены на текущих
+    версиях данных, ничего не делает. Возвращает True, если снимки записаны.
+    """
+    # Версии читаются до данных: топ в снимке не старше записанных в него версий
+    versions = get_data_versions(db, CHART_DATA)
+    if energy_chart_snapshot.file_versions() == versions and brand_chart_snapshot.file_versions() == versions:
+        return False
+    rated_ids = {energy_id for energy_id, in db.query(distinct(Review.energy_id)).join(Rating)}
+    write_energy_snapshot(get_top_energies_sql(db, limit=None), rated_ids, versions)
+    write_brand_snapshot(get_top_brands_sql(db, limit=None), versions)
+    return True
+
+# =============== RECORD RANK HISTORY ===============
+def record_rank_history(db: Session, snapshot_date=None) -> int:
+    """
+    Сохраняет места всех энергетиков общего топа в дневную историю.
+    Запускается раз в сутки, повторный запуск за ту же дату ничего не меняет.
+    """
+    return save_rank_snapshot(db, get_top_energies_sql(db, limit=None), snapshot_date)
@@ -0,0 +1,460 @@
+"""Векторизованный движок топа энергетиков в памяти (NumPy).
+
+Загружает агрегаты по энергетикам (средний рейтинг, количество отзывов, бренд,
+категория, порядок по названию) в массивы NumPy и отвечает на запросы топа
+(фильтры по рейтингу, категории и поиску, ранжирование, пагинация)
+векторными операциями без обращения к PostgreSQL.
+
+Включается переменной окружения CHART_ENGINE=numpy. Состояние помнит версии
+данных (data_versions), на которых оно загружено, и каждое чтение сверяет их
+с текущими одним запросом по первичному ключу: топ никогда не отстает от версий,
+по которым строится ETag, в том числе после записей других процессов uvicorn.
+Если с момента загрузки изменились только отзывы и все новые версии отзывов
+записаны этим процессом, перечитываются агрегаты только помеченных энергетиков,
+иначе состояние загружается целиком.
+
+Вместе с агрегатами держится матрица средних оценок "энергетик × критерий"
+из energy_criteria_stats. Взвешенный топ (weights=) считается одним
+матрично-векторным произведением и частичной сортировкой argpartition,
+поэтому работает при наличии NumPy независимо от CHART_ENGINE.
+"""
+
+import threading
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+
+from app.core.config import CHART_ENGINE
+from app.db.models import Energy, Review, Rating, Brand, Category, Criteria, EnergyCriteriaStat
+from app.services.energy_stats import HISTOGRAM_BUCKETS, rating_facets
+from app.services.data_versions import get_data_versions, CHART_DATA, REVIEWS
+
+try:
+    import numpy as np
+except ImportError:  # движок необязательный, без NumPy используется SQL
+    np = None
+
+
+def is_enabled() -> bool:
+    """Включен ли движок в памяти."""
+    return CHART_ENGINE == "numpy" and np is not None
+
+
+def is_available() -> bool:
+    """Можно ли строить взвешенный топ (нужен только NumPy)."""
+    return np is not None
+
+
+# Сколько помеченных версий отзывов держать между чтениями, дальше — полная загрузка
+MAX_DIRTY_VERSIONS = 10000
+
+
+def _covers(loaded: dict, current: dict) -> bool:
+    """Загружено ли состояние на версиях не старше текущих."""
+    return all(loaded[name] >= current[name] for name in CHART_DATA)
+
+
+class _ChartState:
+    """Неизменяемый снимок массивов топа. Обновление создает новый снимок."""
+
+    def __init__(self, versions, ids, ratings, rated, review_counts, category_ids, name_keys, search_text, payloads,
+                 criteria, criteria_means, criteria_rated):
+        # Версии данных, на которых загружено состояние (данные могут быть и новее)
+        self.versions = versions
+        self.ids = ids
+        self.ratings = ratings
+        self.rated = rated
+        self.review_counts = review_counts
+        self.category_ids = category_ids
+        self.name_keys = name_keys
+        self.search_text = search_text
+        self.payloads = payloads
+        # Критерии по порядку столбцов матрицы: [(id, name), ...]
+        self.criteria = criteria
+        self.criteria_columns = {criteria_id: j for j, (criteria_id, _) in enumerate(criteria)}
+        # Матрица средних оценок (энергетик × критерий) и маска наличия оценок
+        self.criteria_means = criteria_means
+        self.criteria_rated = criteria_rated
+        self.index = {int(energy_id): i for i, energy_id in enumerate(ids)}
+        # Порядок топа: рейтинг ↓, количество отзывов ↓, бренд и название ↑
+        self.ranked = np.lexsort((name_keys, -review_counts, -ratings))
+        # Абсолютная позиция каждого энергетика без фильтров
+        self.absolute_ranks = np.empty(len(ids), dtype=np.int64)
+        self.absolute_ranks[self.ranked] = np.arange(1, len(ids) + 1)
+
+    def with_updates(self, versions: dict, updates: dict, criteria_rows):
+        """Возвращает новый снимок с обновленными рейтингами, количеством отзывов и строками матрицы."""
+        ratings = self.ratings.copy()
+        rated = self.rated.copy()
+        review_counts = self.review_counts.copy()
+        criteria_means = self.criteria_means.copy()
+        criteria_rated = self.criteria_rated.copy()
+        for energy_id, (avg_rating, review_count) in updates.items():
+            i = self.index[energy_id]
+            ratings[i] = float(avg_rating) if avg_rating is not None else 0.0
+            rated[i] = avg_rating is not None
+            review_counts[i] = review_count
+            criteria_means[i] = 0.0
+            criteria_rated[i] = False
+        for energy_id, criteria_id, rating_avg in criteria_rows:
+            i = self.index[energy_id]
+            j = self.criteria_columns[criteria_id]
+            criteria_means[i, j] = float(rating_avg)
+            criteria_rated[i, j] = True
+        return _ChartState(
+            versions, self.ids, ratings, rated, review_counts,
+            self.category_ids, self.name_keys, self.search_text, self.payloads,
+            self.criteria, criteria_means, criteria_rated
+        )
+
+
+def _load_rows(db: Session, energy_ids=None):
+    """
+    Читает агрегаты энергетиков тем же расчетом, что и SQL-топ.
+    Строки упорядочены по бренду и названию — позиция строки служит ключом сортировки,
+    поэтому порядок при равенстве совпадает с collation базы.
+    """
+    avg_rating_query = (
+        db.query(
+            Review.energy_id,
+            func.round(func.avg(Rating.rating_value), 4).label('avg_rating')
+        )
+        .join(Rating)
+    )
+    review_count_query = db.query(
+        Review.energy_id,
+        func.count(Review.id).label('review_count')
+    )
+    query = db.query(
+        Energy.id,
+        Energy.name,
+        Energy.image_url,
+        Brand.id,
+        Brand.name,
+        Category.id,
+        Category.name,
+    )
+    if energy_ids is not None:
+        avg_rating_query = avg_rating_query.filter(Review.energy_id.in_(energy_ids))
+        review_count_query = review_count_query.filter(Review.energy_id.in_(energy_ids))
+        query = query.filter(Energy.id.in_(energy_ids))
+    avg_rating_subquery = avg_rating_query.group_by(Review.energy_id).subquery()
+    review_count_subquery = review_count_query.group_by(Review.energy_id).subquery()
+
+    return (
+        query
+        .add_columns(
+            avg_rating_subquery.c.avg_rating,
+            func.coalesce(review_count_subquery.c.review_count, 0)
+        )
+        .join(Brand, Energy.brand_id == Brand.id)
+        .outerjoin(Category, Energy.category_id == Category.id)
+        .outerjoin(avg_rating_subquery, Energy.id == avg_rating_subquery.c.energy_id)
+        .outerjoin(review_count_subquery, Energy.id == review_count_subquery.c.energy_id)
+        .order_by(Brand.name, Energy.name, Energy.id)
+        .all()
+    )
+
+
+def _load_criteria_rows(db: Session, energy_ids=None):
+    """Читает средние оценки по критериям (energy_id, criteria_id, rating_avg) из предагрегатов."""
+    query = (
+        db.query(EnergyCriteriaStat.energy_id, EnergyCriteriaStat.criteria_id, EnergyCriteriaStat.rating_avg)
+        .filter(EnergyCriteriaStat.rating_count > 0)
+    )
+    if energy_ids is not None:
+        query = query.filter(EnergyCriteriaStat.energy_id.in_(energy_ids))
+    return query.all()
+
+
+class ChartEngine:
+    """Топ энергетиков в памяти процесса."""
+
+    def __init__(self):
+        self._state = None
+        # Версия отзывов -> энергетик, чьи оценки изменила запись с этой версией
+        self._dirty = {}
+        # Блокировка только для обновления состояния, чтение работает со снимком без блокировок
+        self._lock = threading.Lock()
+
+    # =============== INVALIDATION ===============
+    def mark_dirty(self, energy_id: int, version: int):
+        """
+        Помечает энергетик, у которого изменились оценки или отзывы.
+        version — версия REVIEWS, выданная записи (bump_data_versions).
+        """
+        if not is_available() or energy_id is None:
+            return
+        with self._lock:
+            # Без загруженного состояния пометки не нужны: следующее чтение загрузит все
+            if self._state is None or version <= self._state.versions[REVIEWS]:
+                return
+            if len(self._dirty) >= MAX_DIRTY_VERSIONS:
+                self._dirty.clear()
+            self._dirty[version] = energy_id
+
+    def invalidate(self):
+        """Сбрасывает состояние целиком (изменился каталог)."""
+        with self._lock:
+            self._state = None
+            self._dirty.clear()
+
+    # =============== LOADING ===============
+    def _full_load(self, db: Session, versions: dict):
+        rows = _load_rows(db)
+        n = len(rows)
+        ids = np.empty(n, dtype=np.int64)
+        ratings = np.zeros(n, dtype=np.float64)
+        rated = np.zeros(n, dtype=bool)
+        review_counts = np.zeros(n, dtype=np.int64)
+        category_ids = np.zeros(n, dtype=np.int64)
+        search_text = []
+        payloads = []
+        for i, (energy_id, name, image_url, brand_id, brand_name, category_id, category_name, avg_rating, review_count) in enumerate(rows):
+            ids[i] = energy_id
+            if avg_rating is not None:
+                ratings[i] = float(avg_rating)
+                rated[i] = True
+            review_counts[i] = review_count
+            category_ids[i] = category_id or 0
+            # Название энергетика и бренда через разделитель, чтобы подстрока не склеивала их
+            search_text.append(f"{name.lower()}\n{brand_name.lower()}")
+            payloads.append({
+                "id": energy_id,
+                "name": name,
+                "brand": {"id": brand_id, "name": brand_name},
+                "category": {"id": category_id, "name": category_name} if category_id is not None else None,
+                "image_url": image_url,
+            })
+        # Матрица средних по критериям: столбцы в порядке id критерия
+        criteria = [(criteria_id, name) for criteria_id, name in db.query(Criteria.id, Criteria.name).order_by(Criteria.id)]
+        columns = {criteria_id: j for j, (criteria_id, _) in enumerate(criteria)}
+        index = {int(energy_id): i for i, energy_id in enumerate(ids)}
+        criteria_means = np.zeros((n, len(criteria)), dtype=np.float64)
+        criteria_rated = np.zeros((n, len(criteria)), dtype=bool)
+        for energy_id, criteria_id, rating_avg in _load_criteria_rows(db):
+            i = index.get(energy_id)
+            j = columns.get(criteria_id)
+            if i is None or j is None:
+                continue
+            criteria_means[i, j] = float(rating_avg)
+            criteria_rated[i, j] = True
+        return _ChartState(
+            versions, ids, ratings, rated, review_counts, category_ids,
+            np.arange(n, dtype=np.int64),
+            np.array(search_text, dtype=str),
+            payloads,
+            criteria, criteria_means, criteria_rated
+        )
+
+    def _dirty_energies(self, state, versions: dict):
+        """
+        Энергетики, которые нужно перечитать, чтобы догнать текущие версии,
+        или None, если нужна полная загрузка: изменилось что-то кроме отзывов
+        или часть новых версий отзывов записана другим процессом.
+        """
+        if any(state.versions[name] != versions[name] for name in CHART_DATA if name != REVIEWS):
+            return None
+        missing = range(state.versions[REVIEWS] + 1, versions[REVIEWS] + 1)
+        if any(version not in self._dirty for version in missing):
+            return None
+        return list({self._dirty[version] for version in missing})
+
+    def _ensure_fresh(self, db: Session) -> "_ChartState":
+        # Версии читаются до данных: загруженные данные не старше этих версий
+        versions = get_data_versions(db, CHART_DATA)
+        state = self._state
+        if state is not None and _covers(state.versions, versions):
+            return state
+        with self._lock:
+            state = self._state
+            if state is not None and _covers(state.versions, versions):
+                return state
+            dirty = self._dirty_energies(state, versions) if state is not None else None
+            if dirty is None:
+                state = self._full_load(db, versions)
+            else:
+                rows = _load_rows(db, dirty)
+                criteria_rows = _load_criteria_rows(db, dirty)
+                # Новый или удаленный энергетик либо новый критерий — нужна полная загрузка
+                if (
+                    len(rows) != len(dirty)
+                    or any(row[0] not in state.index for row in rows)
+                    or any(row[1] not in state.criteria_columns for row in criteria_rows)
+                ):
+                    state = self._full_load(db, versions)
+                else:
+                    state = state.with_updates(versions, {row[0]: (row[7], row[8]) for row in rows}, criteria_rows)
+            # Пометки до загруженной версии больше не нужны
+            self._dirty = {
+                version: energy_id for version, energy_id in self._dirty.items()
+                if version > versions[REVIEWS]
+            }
+            self._state = state
+            return state
+
+    # =============== QUERY ===============
+    def _filter_mask(self, state, search_query, min_rating, max_rating, category_id, ratings=None, rated=None):
+        # По умолчанию фильтр по общему рейтингу, для взвешенного топа передаются свои баллы
+        if ratings is None:
+            ratings, rated = state.ratings, state.rated
+        mask = np.ones(len(state.ids), dtype=bool)
+        if search_query:
+            for term in search_query.lower().split():
+                mask &= np.char.find(state.search_text, term) >= 0
+        # Как и в SQL, энергетики без оценок не проходят фильтры по рейтингу
+        if min_rating is not None:
+            mask &= rated & (ratings >= min_rating)
+        if max_rating is not None:
+            mask &= rated & (ratings <= max_rating)
+        if category_id is not None:
+            mask &= state.category_ids == category_id
+        return mask
+
+    def top_energies(self, db: Session, limit: int = 10, offset: int = 0, search_query: str = None,
+                     min_rating: float = None, max_rating: float = None, category_id: int = None):
+        """Страница топа энергетиков в том же формате, что и get_top_energies."""
+        state = self._ensure_fresh(db)
+        mask = self._filter_mask(state, search_query, min_rating, max_rating, category_id)
+        page = state.ranked[mask[state.ranked]][offset:offset + limit]
+        return [
+            {
+                **state.payloads[i],
+                "average_rating": float(state.ratings[i]),
+                "review_count": int(state.review_counts[i]),
+                "absolute_rank": int(state.absolute_ranks[i]),
+            }
+            for i in page
+        ]
+
+    def total_energies(self, db: Session, search_query: str = None, min_rating: float = None,
+                       max_rating: float = None, category_id: int = None) -> int:
+        """Количество энергетиков с учетом фильтров."""
+        state = self._ensure_fresh(db)
+        return int(self._filter_mask(state, search_query, min_rating, max_rating, category_id).sum())
+
+
+    # =============== WEIGHTED CHART ===============
+    def _weight_vector(self, state, weights: dict):
+        """Переводит {критерий: вес} в вектор по столбцам матрицы. Критерий задается id или названием."""
+        by_name = {name.lower(): criteria_id for criteria_id, name in state.criteria}
+        vector = np.zeros(len(state.criteria), dtype=np.float64)
+        for key, weight in weights.items():
+            criteria_id = int(key) if key.isdigit() else by_name.get(key.lower())
+            j = state.criteria_columns.get(criteria_id)
+            if j is None:
+                raise ValueError(f"Критерий '{key}' не найден")
+            vector[j] = weight
+        if not vector.any():
+            raise ValueError("Хотя бы один вес должен быть больше нуля")
+        return vector
+
+    def _weighted_scores(self, state, weights: dict):
+        """
+        Взвешенный балл каждого энергетика: сумма вес × среднее по критерию,
+        деленная на сумму весов критериев, по которым у энергетика есть оценки.
+        """
+        vector = self._weight_vector(state, weights)
+        weight_sums = state.criteria_rated @ vector
+        rated = weight_sums > 0
+        scores = np.zeros(len(state.ids), dtype=np.float64)
+        np.divide(state.criteria_means @ vector, weight_sums, out=scores, where=rated)
+        # Округляем как SQL-топ, чтобы равенство баллов не зависело от погрешности
+        return np.round(scores, 4), rated
+
+    def _weighted_rank(self, state, scores, i) -> int:
+        """Абсолютная позиция энергетика во взвешенном топе без фильтров."""
+        review_count = state.review_counts[i]
+        ahead = (scores > scores[i]) | (
+            (scores == scores[i]) & (
+                (state.review_counts > review_count)
+                | ((state.review_counts == review_count) & (state.name_keys < state.name_keys[i]))
+            )
+        )
+        return int(ahead.sum()) + 1
+
+    def top_weighted_energies(self, db: Session, weights: dict, limit: int = 10, offset: int = 0,
+                              search_query: str = None, min_rating: float = None, max_rating: float = None,
+                              category_id: int = None):
+        """
+        Топ энергетиков по взвешенному баллу критериев. Полная сортировка не нужна:
+        argpartition отбирает offset + limit лучших за O(n), сортируются только они.
+        """
+        state = self._ensure_fresh(db)
+        scores, rated = self._weighted_scores(state, weights)
+        mask = self._filter_mask(state, search_query, min_rating, max_rating, category_id, scores, rated)
+        candidates = np.flatnonzero(mask)
+        k = offset + limit
+        if k < len(candidates):
+            candidate_scores = scores[candidates]
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            # Добираем всех с баллом, равным k-му, чтобы порядок при равенстве был детерминированным
+            candidates = candidates[candidate_scores >= candidate_scores[top].min()]
+        order = np.lexsort((
+            state.name_keys[candidates],
+            -state.review_counts[candidates],
+            -scores[candidates],
+        ))
+        page = candidates[order][offset:k]
+        return [
+            {
+                **state.payloads[i],
+                "average_rating": float(scores[i]),
+                "review_count": int(state.review_counts[i]),
+                "absolute_rank": self._weighted_rank(state, scores, i),
+            }
+            for i in page
+        ]
+
+    def total_weighted_energies(self, db: Session, weights: dict, search_query: str = None,
+                                min_rating: float = None, max_rating: float = None, category_id: int = None) -> int:
+        """Количество энергетиков во взвешенном топе с учетом фильтров."""
+        state = self._ensure_fresh(db)
+        scores, rated = self._weighted_scores(state, weights)
+        return int(self._filter_mask(state, search_query, min_rating, max_rating, category_id, scores, rated).sum())
+
+
+    # =============== FACETS ===============
+    def facets(self, db: Session, search_query: str = None, min_rating: float = None, max_rating: float = None,
+               category_id: int = None, weights: dict = None):
+        """
+        Фасеты топа по маскам в памяти: количество по категориям (с учетом всех фильтров,
+        кроме категории) и по корзинам рейтинга (с учетом всех фильтров, кроме рейтинга).
+        """
+        state = self._ensure_fresh(db)
+        if weights:
+            ratings, rated = self._weighted_scores(state, weights)
+        else:
+            ratings, rated = state.ratings, state.rated
+        search_mask = self._filter_mask(state, search_query, None, None, None)
+        rating_ok = self._filter_mask(state, None, min_rating, max_rating, None, ratings, rated)
+        category_ok = self._filter_mask(state, None, None, None, category_id)
+
+        # Категории: np.unique дает и количество, и первую позицию для названия
+        in_categories = np.flatnonzero(search_mask & rating_ok)
+        _, first, counts = np.unique(state.category_ids[in_categories], return_index=True, return_counts=True)
+        categories = [
+            {
+                "id": category["id"] if category else None,
+                "name": category["name"] if category else None,
+                "count": int(count),
+            }
+            for category, count in (
+                (state.payloads[in_categories[i]]["category"], count) for i, count in zip(first, counts)
+            )
+        ]
+
+        # Корзины рейтинга: одна гистограмма bincount
+        in_ratings = search_mask & category_ok
+        buckets = np.clip(np.floor(ratings), 0, HISTOGRAM_BUCKETS - 1).astype(np.int64)
+        bucket_counts = np.bincount(buckets[in_ratings & rated], minlength=HISTOGRAM_BUCKETS)
+
+        return {
+            "total": int((search_mask & rating_ok & category_ok).sum()),
+            "categories": categories,
+            "ratings": rating_facets(bucket_counts),
+            "unrated": int((in_ratings & ~rated).sum()),
+        }
+
+
+# Единственный экземпляр движка на процесс
+chart_engine = ChartEngine()
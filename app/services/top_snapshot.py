@@ -0,0 +1,442 @@
+"""Снимок топа энергетиков и брендов в бинарном файле, общий для всех процессов.
+
+Один процесс (лидер, выбранный через flock) периодически строит топ из PostgreSQL
+и записывает его в компактный файл фиксированной ширины, затем атомарно подменяет
+старый файл через os.replace. Остальные процессы читают файл через mmap без
+копирования: числовые поля — представление NumPy поверх mmap, строки декодируются
+только для строк текущей страницы.
+
+Снимок помнит версии данных (data_versions), на которых он построен, и отдается
+только запросам, чьи версии он покрывает: иначе топ берется из движка или БД,
+и тело ответа никогда не старше версий, по которым строится ETag.
+
+Формат файла (little-endian):
+    заголовок 72 байта: magic, версия формата, вид снимка, поколение,
+                        время создания, количество записей, размер кучи строк,
+                        версии групп данных CHART_DATA
+    записи фиксированной ширины (ENERGY_DTYPE / BRAND_DTYPE) в порядке топа
+    куча строк UTF-8, записи ссылаются на нее парами (смещение, длина)
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import logging
+
+from app.core.config import CHART_SNAPSHOT_DIR, CHART_SNAPSHOT_INTERVAL
+from app.services.energy_stats import HISTOGRAM_BUCKETS, rating_facets
+from app.services.data_versions import CHART_DATA
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy снимок не используется
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Заголовок: magic, версия формата, вид, поколение, время создания, количество записей, размер кучи,
+# версии групп CHART_DATA
+HEADER = struct.Struct(f"<4sHHQdII{len(CHART_DATA)}Q")
+MAGIC = b"ECHS"
+FORMAT_VERSION = 2
+KIND_ENERGIES = 1
+KIND_BRANDS = 2
+
+ENERGY_FILE = "energies.chart"
+BRAND_FILE = "brands.chart"
+
+if np is not None:
+    # Запись топа энергетиков
+    ENERGY_DTYPE = np.dtype([
+        ("id", "<i4"),
+        ("absolute_rank", "<i4"),
+        ("average_rating", "<f8"),
+        ("review_count", "<i4"),
+        ("brand_id", "<i4"),
+        ("category_id", "<i4"),  # 0 — без категории
+        ("rated", "u1"),  # 1 — есть хотя бы одна оценка
+        ("name_off", "<u4"), ("name_len", "<u2"),
+        ("brand_name_off", "<u4"), ("brand_name_len", "<u2"),
+        ("category_name_off", "<u4"), ("category_name_len", "<u2"),
+        ("image_url_off", "<u4"), ("image_url_len", "<u2"),
+    ])
+    # Запись топа брендов
+    BRAND_DTYPE = np.dtype([
+        ("id", "<i4"),
+        ("absolute_rank", "<i4"),
+        ("average_rating", "<f8"),
+        ("energy_count", "<i4"),
+        ("review_count", "<i4"),
+        ("rating_count", "<i4"),
+        ("name_off", "<u4"), ("name_len", "<u2"),
+    ])
+
+
+def is_enabled() -> bool:
+    """Включены ли снимки топа."""
+    return bool(CHART_SNAPSHOT_DIR) and np is not None
+
+
+# =============== WRITE ===============
+class _StringHeap:
+    """Куча строк UTF-8 с дедупликацией (названия брендов и категорий повторяются)."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = {}
+
+    def add(self, value):
+        if value is None:
+            return 0, 0
+        if value not in self._offsets:
+            encoded = value.encode("utf-8")[:0xFFFF]
+            self._offsets[value] = (len(self._buffer), len(encoded))
+            self._buffer += encoded
+        return self._offsets[value]
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
+
+
+def _write_file(path: str, kind: int, records, heap: bytes, versions: dict):
+    """Пишет снимок во временный файл и атомарно подменяет им текущий."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, kind, time.time_ns(), time.time(), len(records), len(heap),
+        *(versions[name] for name in CHART_DATA)
+    )
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(records.tobytes())
+        f.write(heap)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_energy_snapshot(energies: list, rated_ids: set, versions: dict, directory: str = None):
+    """
+    Записывает топ энергетиков (результат get_top_energies) в снимок.
+    rated_ids — энергетики с оценками (остальные не проходят фильтры по рейтингу, как в SQL).
+    versions — версии CHART_DATA, прочитанные до построения топа.
+    """
+    heap = _StringHeap()
+    records = np.zeros(len(energies), dtype=ENERGY_DTYPE)
+    for i, energy in enumerate(energies):
+        brand = energy["brand"]
+        category = energy["category"]
+        record = records[i]
+        record["id"] = energy["id"]
+        record["absolute_rank"] = energy["absolute_rank"]
+        record["average_rating"] = float(energy["average_rating"])
+        record["review_count"] = energy["review_count"]
+        record["brand_id"] = brand.id
+        record["category_id"] = category.id if category is not None else 0
+        record["rated"] = energy["id"] in rated_ids
+        record["name_off"], record["name_len"] = heap.add(energy["name"])
+        record["brand_name_off"], record["brand_name_len"] = heap.add(brand.name)
+        record["category_name_off"], record["category_name_len"] = heap.add(category.name if category is not None else None)
+        record["image_url_off"], record["image_url_len"] = heap.add(energy["image_url"])
+    _write_file(os.path.join(directory or CHART_SNAPSHOT_DIR, ENERGY_FILE), KIND_ENERGIES, records, heap.getvalue(), versions)
+
+
+def write_brand_snapshot(brands: list, versions: dict, directory: str = None):
+    """Записывает топ брендов (результат get_top_brands) в снимок на версиях данных versions."""
+    heap = _StringHeap()
+    records = np.zeros(len(brands), dtype=BRAND_DTYPE)
+    for i, brand in enumerate(brands):
+        record = records[i]
+        record["id"] = brand["id"]
+        record["absolute_rank"] = brand["absolute_rank"]
+        record["average_rating"] = float(brand["average_rating"])
+        record["energy_count"] = brand["energy_count"]
+        record["review_count"] = brand["review_count"]
+        record["rating_count"] = brand["rating_count"]
+        record["name_off"], record["name_len"] = heap.add(brand["name"])
+    _write_file(os.path.join(directory or CHART_SNAPSHOT_DIR, BRAND_FILE), KIND_BRANDS, records, heap.getvalue(), versions)
+
+
+# =============== READ ===============
+def _unpack_header(buffer, path: str, kind: int):
+    """Разбирает заголовок снимка: (поколение, время создания, записей, размер кучи, версии)."""
+    magic, version, file_kind, generation, created_at, count, heap_size, *versions = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION or file_kind != kind:
+        raise ValueError(f"Неподдерживаемый снимок топа: {path}")
+    return generation, created_at, count, heap_size, dict(zip(CHART_DATA, versions))
+
+
+class _Snapshot:
+    """Открытый снимок: mmap файла и представления NumPy поверх него."""
+
+    def __init__(self, path: str, kind: int, dtype):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.generation, self.created_at, count, heap_size, self.versions = _unpack_header(self._mmap, path, kind)
+        # Представление без копирования
+        self.records = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=HEADER.size)
+        self._heap_offset = HEADER.size + count * dtype.itemsize
+        self._search_text = None
+
+    def _string(self, offset, length):
+        if not length:
+            return None
+        start = self._heap_offset + int(offset)
+        return self._mmap[start:start + int(length)].decode("utf-8")
+
+    def _page(self, mask, limit, offset):
+        # Без фильтров страница — срез представления без копирования
+        if mask is None:
+            return self.records[offset:offset + limit]
+        return self.records[mask][offset:offset + limit]
+
+    def _count(self, mask) -> int:
+        return len(self.records) if mask is None else int(mask.sum())
+
+    def _rating_mask(self, mask, min_rating, max_rating):
+        if min_rating is not None:
+            mask &= self.records["average_rating"] >= min_rating
+        if max_rating is not None:
+            mask &= self.records["average_rating"] <= max_rating
+        return mask
+
+    def _search_mask(self, mask, search_query):
+        if not search_query:
+            return mask
+        # Строки для поиска декодируются один раз на снимок
+        if self._search_text is None:
+            self._search_text = self._build_search_text()
+        for term in search_query.lower().split():
+            mask &= np.char.find(self._search_text, term) >= 0
+        return mask
+
+
+class EnergySnapshot(_Snapshot):
+    """Снимок топа энергетиков."""
+
+    def __init__(self, path: str):
+        super().__init__(path, KIND_ENERGIES, ENERGY_DTYPE)
+
+    def _build_search_text(self):
+        return np.array([
+            f"{self._string(r['name_off'], r['name_len']).lower()}\n"
+            f"{self._string(r['brand_name_off'], r['brand_name_len']).lower()}"
+            for r in self.records
+        ], dtype=str)
+
+    def _mask(self, search_query, min_rating, max_rating, category_id):
+        if not search_query and min_rating is None and max_rating is None and category_id is None:
+            return None
+        mask = np.ones(len(self.records), dtype=bool)
+        mask = self._rating_mask(mask, min_rating, max_rating)
+        if min_rating is not None or max_rating is not None:
+            # Как и в SQL, энергетики без оценок не проходят фильтры по рейтингу
+            mask &= self.records["rated"] == 1
+        if category_id is not None:
+            mask &= self.records["category_id"] == category_id
+        return self._search_mask(mask, search_query)
+
+    def top(self, limit, offset, search_query=None, min_rating=None, max_rating=None, category_id=None):
+        page = self._page(self._mask(search_query, min_rating, max_rating, category_id), limit, offset)
+        return [
+            {
+                "id": int(r["id"]),
+                "name": self._string(r["name_off"], r["name_len"]),
+                "average_rating": float(r["average_rating"]),
+                "brand": {"id": int(r["brand_id"]), "name": self._string(r["brand_name_off"], r["brand_name_len"])},
+                "category": (
+                    {"id": int(r["category_id"]), "name": self._string(r["category_name_off"], r["category_name_len"])}
+                    if r["category_id"] else None
+                ),
+                "image_url": self._string(r["image_url_off"], r["image_url_len"]),
+                "review_count": int(r["review_count"]),
+                "absolute_rank": int(r["absolute_rank"]),
+            }
+            for r in page
+        ]
+
+    def total(self, search_query=None, min_rating=None, max_rating=None, category_id=None) -> int:
+        return self._count(self._mask(search_query, min_rating, max_rating, category_id))
+
+    def facets(self, search_query=None, min_rating=None, max_rating=None, category_id=None):
+        """
+        Фасеты по тем же записям, из которых отдается страница топа: количество по категориям
+        (без учета фильтра категории) и по корзинам рейтинга (без учета фильтра рейтинга).
+        """
+        records = self.records
+        rated = records["rated"] == 1
+        search_mask = self._search_mask(np.ones(len(records), dtype=bool), search_query)
+        rating_ok = np.ones(len(records), dtype=bool)
+        if min_rating is not None or max_rating is not None:
+            rating_ok = self._rating_mask(rating_ok, min_rating, max_rating) & rated
+        category_ok = np.ones(len(records), dtype=bool)
+        if category_id is not None:
+            category_ok = records["category_id"] == category_id
+
+        # Категории: np.unique дает и количество, и первую запись для названия
+        in_categories = np.flatnonzero(search_mask & rating_ok)
+        _, first, counts = np.unique(records["category_id"][in_categories], return_index=True, return_counts=True)
+        categories = []
+        for i, count in zip(first, counts):
+            r = records[in_categories[i]]
+            categories.append({
+                "id": int(r["category_id"]) if r["category_id"] else None,
+                "name": self._string(r["category_name_off"], r["category_name_len"]),
+                "count": int(count),
+            })
+
+        # Корзины рейтинга: одна гистограмма bincount
+        in_ratings = search_mask & category_ok
+        buckets = np.clip(np.floor(records["average_rating"]), 0, HISTOGRAM_BUCKETS - 1).astype(np.int64)
+        bucket_counts = np.bincount(buckets[in_ratings & rated], minlength=HISTOGRAM_BUCKETS)
+
+        return {
+            "total": int((search_mask & rating_ok & category_ok).sum()),
+            "categories": categories,
+            "ratings": rating_facets(bucket_counts),
+            "unrated": int((in_ratings & ~rated).sum()),
+        }
+
+
+class BrandSnapshot(_Snapshot):
+    """Снимок топа брендов."""
+
+    def __init__(self, path: str):
+        super().__init__(path, KIND_BRANDS, BRAND_DTYPE)
+
+    def _build_search_text(self):
+        return np.array([self._string(r["name_off"], r["name_len"]).lower() for r in self.records], dtype=str)
+
+    def _mask(self, search_query, min_rating, max_rating):
+        if not search_query and min_rating is None and max_rating is None:
+            return None
+        mask = np.ones(len(self.records), dtype=bool)
+        mask = self._rating_mask(mask, min_rating, max_rating)
+        return self._search_mask(mask, search_query)
+
+    def top(self, limit, offset, search_query=None, min_rating=None, max_rating=None):
+        page = self._page(self._mask(search_query, min_rating, max_rating), limit, offset)
+        return [
+            {
+                "id": int(r["id"]),
+                "name": self._string(r["name_off"], r["name_len"]),
+                "average_rating": float(r["average_rating"]),
+                "energy_count": int(r["energy_count"]),
+                "review_count": int(r["review_count"]),
+                "rating_count": int(r["rating_count"]),
+                "absolute_rank": int(r["absolute_rank"]),
+            }
+            for r in page
+        ]
+
+    def total(self, search_query=None, min_rating=None, max_rating=None) -> int:
+        return self._count(self._mask(search_query, min_rating, max_rating))
+
+
+class SnapshotReader:
+    """Следит за файлом снимка и переоткрывает его после атомарной подмены."""
+
+    # Как часто проверять файл (stat), в секундах
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, file_name: str, kind: int, snapshot_class):
+        self._file_name = file_name
+        self._kind = kind
+        self._snapshot_class = snapshot_class
+        self._snapshot = None
+        self._file_id = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, versions: dict):
+        """
+        Возвращает снимок, построенный на версиях данных не старше versions,
+        или None (снимки выключены, файла нет или он отстает от данных).
+        """
+        if not is_enabled():
+            return None
+        snapshot = self._snapshot
+        now = time.monotonic()
+        # Отстающий снимок мог быть уже подменен лидером: проверяем файл сразу
+        if now - self._checked_at >= self.CHECK_INTERVAL or not _covers(snapshot, versions):
+            with self._lock:
+                self._reload()
+                self._checked_at = now
+            snapshot = self._snapshot
+        return snapshot if _covers(snapshot, versions) else None
+
+    def file_versions(self):
+        """Версии данных снимка в файле (без открытия mmap) или None, если файла нет или он другого формата."""
+        path = os.path.join(CHART_SNAPSHOT_DIR, self._file_name)
+        try:
+            with open(path, "rb") as f:
+                return _unpack_header(f.read(HEADER.size), path, self._kind)[4]
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def _reload(self):
+        path = os.path.join(CHART_SNAPSHOT_DIR, self._file_name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._snapshot, self._file_id = None, None
+            return
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return
+        try:
+            # Старый mmap закроется, когда на него не останется ссылок у текущих запросов
+            self._snapshot = self._snapshot_class(path)
+            self._file_id = file_id
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось открыть снимок топа %s: %s", path, e)
+
+
+def _covers(snapshot, versions: dict) -> bool:
+    """Построен ли снимок на версиях данных не старше versions."""
+    return snapshot is not None and all(snapshot.versions[name] >= versions[name] for name in CHART_DATA)
+
+
+# Читатели снимков, по одному на процесс
+energy_chart_snapshot = SnapshotReader(ENERGY_FILE, KIND_ENERGIES, EnergySnapshot)
+brand_chart_snapshot = SnapshotReader(BRAND_FILE, KIND_BRANDS, BrandSnapshot)
+
+
+# =============== BUILDER ===============
+def start_snapshot_builder(build):
+    """
+    Запускает фоновый поток, который раз в CHART_SNAPSHOT_INTERVAL секунд строит снимки,
+    если данные изменились.
+    Строит только процесс, захвативший flock на файл блокировки, остальные ждут
+    и подхватывают лидерство, если лидер завершится.
+    build — функция без аргументов, записывающая снимки.
+    """
+    if not is_enabled():
+        return None
+    os.makedirs(CHART_SNAPSHOT_DIR, exist_ok=True)
+    stop = threading.Event()
+
+    def run():
+        lock_file = open(os.path.join(CHART_SNAPSHOT_DIR, ".build.lock"), "w")
+        is_leader = False
+        while not stop.is_set():
+            if not is_leader:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    is_leader = True
+                except BlockingIOError:
+                    pass
+            if is_leader:
+                try:
+                    build()
+                except Exception:
+                    logger.exception("Ошибка построения снимка топа")
+            stop.wait(CHART_SNAPSHOT_INTERVAL)
+        lock_file.close()
+
+    thread = threading.Thread(target=run, name="chart-snapshot-builder", daemon=True)
+    thread.start()
+    return stop
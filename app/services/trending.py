@@ -0,0 +1,223 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, desc
+from sqlalchemy.dialects.postgresql import insert
+from decimal import Decimal
+import time
+
+from app.core.config import TRENDING_WINDOW_HOURS
+from app.db.models import EnergyTrendBucket, Energy, Brand, Review, Rating
+
+# Длина одного интервала счетчиков, в секундах
+BUCKET_SECONDS = 3600
+
+# Последний интервал, в котором процесс удалял устаревшие счетчики
+_last_expired_bucket = None
+
+# =============== HELPERS ===============
+def bucket_start(timestamp: int) -> int:
+    """Возвращает начало часового интервала для Unix timestamp."""
+    return int(timestamp) // BUCKET_SECONDS * BUCKET_SECONDS
+
+def _window_start(now: int = None, hours: int = TRENDING_WINDOW_HOURS) -> int:
+    """Начало окна трендов: первый интервал, который еще учитывается."""
+    now = int(time.time()) if now is None else now
+    return bucket_start(now) - (hours - 1) * BUCKET_SECONDS
+
+def _upsert_buckets(db: Session, deltas: dict):
+    """
+    Складывает приращения {(energy_id, bucket_start): [отзывы, сумма оценок, количество оценок]}
+    с существующими счетчиками одним upsert. Изменения фиксирует вызывающий код.
+    """
+    global _last_expired_bucket
+    window_start = _window_start()
+    # Интервалы за пределами окна уже не влияют на тренды, их не трогаем
+    rows = [
+        {
+            "energy_id": energy_id,
+            "bucket_start": start,
+            "review_count": review_count,
+            "rating_sum": rating_sum,
+            "rating_count": rating_count,
+        }
+        for (energy_id, start), (review_count, rating_sum, rating_count) in deltas.items()
+        if start >= window_start
+    ]
+    if rows:
+        stmt = insert(EnergyTrendBucket).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EnergyTrendBucket.energy_id, EnergyTrendBucket.bucket_start],
+            set_={
+                "review_count": EnergyTrendBucket.review_count + stmt.excluded.review_count,
+                "rating_sum": EnergyTrendBucket.rating_sum + stmt.excluded.rating_sum,
+                "rating_count": EnergyTrendBucket.rating_count + stmt.excluded.rating_count,
+            }
+        )
+        db.execute(stmt)
+
+    # Раз в интервал удаляем счетчики, выпавшие из окна
+    current_bucket = bucket_start(time.time())
+    if _last_expired_bucket != current_bucket:
+        _last_expired_bucket = current_bucket
+        expire_trend_buckets(db, window_start)
+
+# =============== APPLY TREND DELTA ===============
+def apply_trend_delta(db: Session, energy_id: int, created_at: int, ratings, sign: int = 1, review_delta: int = None):
+    """
+    Обновляет счетчики трендов для одного отзыва в интервале его создания.
+    sign=1 — отзыв (или его оценки) добавлен, sign=-1 — удален.
+    review_delta по умолчанию равен sign; при замене оценок отзыва передается 0.
+    """
+    # Отзывы к предложкам не привязаны к энергетику и в тренды не попадают
+    if energy_id is None or created_at is None:
+        return
+    rating_sum = Decimal(0)
+    rating_count = 0
+    for rating in ratings:
+        rating_sum += Decimal(str(rating.rating_value))
+        rating_count += 1
+    _upsert_buckets(db, {
+        (energy_id, bucket_start(created_at)): [
+            sign if review_delta is None else review_delta,
+            sign * rating_sum,
+            sign * rating_count,
+        ]
+    })
+
+def remove_reviews_from_trend(db: Session, reviews):
+    """
+    Вычитает из счетчиков трендов набор отзывов (например, всех отзывов удаляемого пользователя).
+    Приращения сворачиваются по интервалам, чтобы уложиться в один upsert.
+    """
+    deltas = {}
+    for review in reviews:
+        if review.energy_id is None or review.created_at is None:
+            continue
+        delta = deltas.setdefault((review.energy_id, bucket_start(review.created_at)), [0, Decimal(0), 0])
+        delta[0] -= 1
+        for rating in review.ratings:
+            delta[1] -= Decimal(str(rating.rating_value))
+            delta[2] -= 1
+    if deltas:
+        _upsert_buckets(db, deltas)
+
+# =============== EXPIRE ===============
+def expire_trend_buckets(db: Session, window_start: int = None):
+    """
+    Удаляет счетчики интервалов, выпавших из окна (по индексу bucket_start).
+    """
+    window_start = _window_start() if window_start is None else window_start
+    return (
+        db.query(EnergyTrendBucket)
+        .filter(EnergyTrendBucket.bucket_start < window_start)
+        .delete(synchronize_session=False)
+    )
+
+# =============== READ TRENDING CHART ===============
+def _trending_subquery(db: Session, hours: int):
+    """Суммы счетчиков энергетиков за последние hours часов."""
+    return (
+        db.query(
+            EnergyTrendBucket.energy_id,
+            func.sum(EnergyTrendBucket.review_count).label('review_count'),
+            func.round(
+                func.sum(EnergyTrendBucket.rating_sum) / func.nullif(func.sum(EnergyTrendBucket.rating_count), 0), 4
+            ).label('avg_rating')
+        )
+        .filter(EnergyTrendBucket.bucket_start >= _window_start(hours=hours))
+        .group_by(EnergyTrendBucket.energy_id)
+        .having(func.sum(EnergyTrendBucket.review_count) > 0)
+        .subquery()
+    )
+
+def get_trending_energies(db: Session, limit: int = 10, offset: int = 0, hours: int = TRENDING_WINDOW_HOURS, category_id: int = None):
+    """
+    Топ трендов: энергетики с наибольшим числом отзывов за последние hours часов,
+    при равенстве — с лучшей средней оценкой за то же окно.
+    Читает только часовые счетчики окна, а не отзывы.
+    """
+    trending_subquery = _trending_subquery(db, hours)
+    avg_rating = func.coalesce(trending_subquery.c.avg_rating, 0)
+
+    query = (
+        db.query(Energy, avg_rating, trending_subquery.c.review_count)
+        .join(trending_subquery, Energy.id == trending_subquery.c.energy_id)
+        .join(Brand)
+    )
+    if category_id is not None:
+        query = query.filter(Energy.category_id == category_id)
+
+    energies = (
+        query
+        .order_by(
+            desc(trending_subquery.c.review_count),
+            desc(avg_rating),
+            Brand.name,
+            Energy.name,
+            Energy.id  # Стабильный порядок при полном совпадении
+        )
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+
+    return [{
+        "id": energy.id,
+        "name": energy.name,
+        "average_rating": float(avg_rating),
+        "brand": energy.brand,
+        "category": energy.category,
+        "image_url": energy.image_url,
+        "review_count": int(review_count),
+        "trend_rank": offset + position,
+    } for position, (energy, avg_rating, review_count) in enumerate(energies, start=1)]
+
+def get_total_trending_energies(db: Session, hours: int = TRENDING_WINDOW_HOURS, category_id: int = None):
+    """
+    Количество энергетиков с отзывами за последние hours часов.
+    """
+    trending_subquery = _trending_subquery(db, hours)
+    query = db.query(Energy).join(trending_subquery, Energy.id == trending_subquery.c.energy_id)
+    if category_id is not None:
+        query = query.filter(Energy.category_id == category_id)
+    return query.count()
+
+# =============== REBUILD ===============
+def rebuild_trend_buckets(db: Session):
+    """
+    Пересчитывает счетчики трендов за окно из таблиц reviews и ratings.
+    Используется для первичного заполнения и восстановления согласованности.
+    """
+    db.query(EnergyTrendBucket).delete(synchronize_session=False)
+
+    window_start = _window_start()
+    bucket_expr = Review.created_at // BUCKET_SECONDS * BUCKET_SECONDS
+    # Оценки считаются по отзывам, количество отзывов — отдельно, чтобы не размножать их по оценкам
+    ratings_subquery = (
+        db.query(
+            Rating.review_id,
+            func.sum(Rating.rating_value).label('rating_sum'),
+            func.count(Rating.id).label('rating_count')
+        )
+        .group_by(Rating.review_id)
+        .subquery()
+    )
+    buckets_select = (
+        db.query(
+            Review.energy_id,
+            bucket_expr,
+            func.count(Review.id),
+            func.coalesce(func.sum(ratings_subquery.c.rating_sum), 0),
+            func.coalesce(func.sum(ratings_subquery.c.rating_count), 0),
+        )
+        .outerjoin(ratings_subquery, Review.id == ratings_subquery.c.review_id)
+        .filter(Review.energy_id.isnot(None), Review.created_at >= window_start)
+        .group_by(Review.energy_id, bucket_expr)
+    )
+    # INSERT ... SELECT без выгрузки строк в Python
+    db.execute(
+        insert(EnergyTrendBucket).from_select(
+            ["energy_id", "bucket_start", "review_count", "rating_sum", "rating_count"],
+            buckets_select.statement
+        )
+    )
+    db.commit()
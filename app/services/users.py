@@ -1,16 +1,24 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from typing import Dict, Any
 from sqlalchemy.exc import DataError
 from fastapi import HTTPException
 import time
-import os
 
 from app.core.config import TG_ADMIN_IDS
 
-from app.db.models import User, Review, Rating, Energy, Brand, Criteria, Role, UserRole
+from app.db.models import User, Review, Rating, Energy, Brand, Criteria, Role, UserRole, Suggestion
 
 from app.schemas.users import User as UserSchema, UserCreate, UserUpdate
 
+from app.services.energy_stats import apply_ratings_delta
+from app.services.trending import remove_reviews_from_trend
+from app.services.top_engine import chart_engine
+from app.services.rated_cache import rated_cache
+from app.services.data_versions import bump_data_versions, REVIEWS
+from app.services.batch import id_any, order_by_ids
+from app.services.stored_images import release_image, replace_image
+from app.services.suggestions import suggestion_image_path
+
 # =============== CREATE ===============
 def create_user(db: Session, user: UserCreate, telegram_id: int):
     try:
@@ -48,6 +56,15 @@ def get_user(db: Session, user_id: int):
     # Получаем первый результат
     return query.first()
 
+# =============== READ BATCH ===============
+def get_users_by_ids(db: Session, user_ids: list) -> dict:
+    """
+    Получает несколько пользователей по списку id одним запросом.
+    Возвращает {"items": [...], "missing": [...]} в порядке user_ids.
+    """
+    users = db.query(User).filter(id_any(User.id, user_ids)).all()
+    return order_by_ids(user_ids, users)
+
 # =============== UPDATE ===============
 def update_user(db: Session, user_id: int, user_update: UserUpdate):
     # Получаем пользователя по ID
@@ -59,6 +76,8 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate):
         db_user.username = user_update.username
     # Обновляем фото, если оно предоставлено
     if user_update.image_url:
+        # Старое фото удаляется, если на него больше никто не ссылается
+        replace_image(db, db_user.image_url, user_update.image_url)
         db_user.image_url = user_update.image_url
     # Фиксируем изменения
     db.commit()
@@ -220,14 +239,43 @@ def delete_user(db: Session, user_id: int):
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         return False
+    # Вычитаем оценки пользователя из агрегатов энергетиков (отзывы удалятся каскадно)
+    user_ratings = (
+        db.query(Review.energy_id, Rating)
+        .join(Rating, Review.id == Rating.review_id)
+        .filter(Review.user_id == user_id, Review.energy_id.isnot(None))
+        .all()
+    )
+    ratings_by_energy = {}
+    for energy_id, rating in user_ratings:
+        ratings_by_energy.setdefault(energy_id, []).append(rating)
+    for energy_id, ratings in ratings_by_energy.items():
+        apply_ratings_delta(db, energy_id, ratings, sign=-1)
+    # Вычитаем отзывы пользователя из счетчиков трендов
+    remove_reviews_from_trend(
+        db,
+        db.query(Review)
+        .options(selectinload(Review.ratings))
+        .filter(Review.user_id == user_id, Review.energy_id.isnot(None))
+        .all()
+    )
     # Удаляем связанные записи в таблице user_roles
     db.query(UserRole).filter(UserRole.user_id == user_id).delete()
-    # Удаляем фото
-    if db_user.image_url and os.path.exists(db_user.image_url):
-        os.remove(db_user.image_url)
+    # Освобождаем фото пользователя, его отзывов и предложок (они удалятся каскадно)
+    release_image(db, db_user.image_url)
+    for (image_url,) in db.query(Review.image_url).filter(Review.user_id == user_id, Review.image_url.isnot(None)):
+        release_image(db, image_url)
+    # Фото предложек учитываются по пути в папке предложек, как при их создании
+    for (image_url,) in db.query(Suggestion.image_url).filter(Suggestion.user_id == user_id, Suggestion.image_url.isnot(None)):
+        release_image(db, suggestion_image_path(image_url))
     # Удаляем пользователя
     db.delete(db_user)
+    # Новая версия данных для ETag
+    bump_data_versions(db, REVIEWS)
     db.commit()
+    # Отзывы пользователя удалены: топ в памяти загрузится заново
+    chart_engine.invalidate()
+    rated_cache.invalidate(user_id)
     return True
 
 # =============== READ TOTAL USERS COUNT FOR ADMIN ===============
@@ -11,7 +11,12 @@ from alembic import command
 from decimal import Decimal, ROUND_HALF_UP #для округления
 
 from app.db.models import *  # Импорт моделей SQLAlchemy
+from app.db.models.catalog_version import catalog_version_seq
 from app.core.config import DATABASE_URL, GENERIC_USER_ID
+from app.services.energy_stats import rebuild_energy_stats
+from app.services.trending import rebuild_trend_buckets
+from app.services.similar import build_similar_energies
+from app.services.data_versions import bump_data_versions, ALL_DATA
 
 # Конфигурация
 engine = create_engine(DATABASE_URL)
@@ -60,6 +65,10 @@ def clean_and_apply_migrations():
         command.revision(alembic_cfg, autogenerate=True, message="Initial")
         print("🔄 Миграция успешно сгенерирована")
 
+        # Autogenerate не создает отдельные последовательности, а столбцы version ссылаются на нее
+        with engine.begin() as conn:
+            catalog_version_seq.create(conn, checkfirst=True)
+
         # Применение миграций
         command.upgrade(alembic_cfg, "head")
         print("🔄 Миграции успешно применены")
@@ -180,6 +189,15 @@ def seed_data():
                 db.add_all(ratings)
                 db.commit()
 
+        # Оценки добавлены напрямую, минуя сервисы, поэтому пересчитываем агрегаты
+        rebuild_energy_stats(db)
+        rebuild_trend_buckets(db)
+        # Похожие энергетики строятся по пересчитанным агрегатам
+        build_similar_energies(db)
+        # Сбрасываем ETag у клиентов, кешировавших ответы до загрузки
+        bump_data_versions(db, *ALL_DATA)
+        db.commit()
+
         print("✅ Данные успешно загружены!")
 
     except Exception as e: